@@ -0,0 +1,94 @@
+"""Benchmark media_utils.compose() against the sequential Image.alpha_composite chain.
+
+Also times a one-pass premultiplied float32 NumPy compositor (one accumulator, each layer
+blended over its bbox). It matches to within 1-2 levels but is several times slower than
+Pillow's own compositor, which is why compose() trims layers instead.
+
+Run from the repo root:  python benchmarks/bench_compose.py [repeats]
+"""
+from __future__ import annotations
+
+import sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from PIL import Image
+
+from components.media_utils import compose, trimmed
+from components import style_studio as ss
+
+
+def pil_chain(base, layers):
+    out = base
+    for layer in layers:
+        out = Image.alpha_composite(out, layer)
+    return out
+
+def premultiplied(base, layers):
+    acc = np.array(base, dtype=np.float32)
+    acc[..., :3] *= acc[..., 3:] / 255.0
+    for layer in layers:
+        box = layer.getbbox()
+        if box is None:
+            continue
+        src = np.asarray(layer.crop(box), dtype=np.float32)
+        a = src[..., 3:] / 255.0
+        dst = acc[box[1]:box[3], box[0]:box[2]]
+        dst *= 1.0 - a
+        dst[..., :3] += src[..., :3] * a
+        dst[..., 3:] += src[..., 3:]
+    alpha = acc[..., 3:]
+    np.divide(acc[..., :3] * 255.0, alpha, out=acc[..., :3], where=alpha > 0)
+    return Image.fromarray(np.clip(np.rint(acc), 0, 255).astype(np.uint8), "RGBA")
+
+def max_diff(a, b):
+    return int(np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max())
+
+def best_of(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        t = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t)
+    return best
+
+def style_studio_stack():
+    """The seven Style Studio layers over its soft background (cached, so built once)."""
+    palette = {"primary": "#ff4fb7", "secondary": "#ffe6f3", "accent": "#ffffff"}
+    doll = {"skin": "#f0d5c4", "hair": "#4a2f2a", "eyes": "#1b1b1b", "lips": "#ff6b9a", "brows": "#3b2a26",
+            "highlight": "#ffffff", "hair_style": "Waves", "head_scale": 0.95, "hairline": 16, "volume": 40,
+            "brow_thick": 10, "eye_size": 12, "blush": True, "shoes": "#2b2b2b", "glasses": True,
+            "necklace": True, "earrings": True}
+    opts = {"pattern": "Polka", "angle": 30, "scale": 22, "glitter": 30, "gloss": True, "neckline": "Sweetheart",
+            "sleeve": "Puff", "skirt_cut": "A-Line", "flare": 6, "belt": True, "bow": True, "monogram": "BB"}
+    hs = doll["head_scale"]
+    hair_back, hair_front = ss.hair_layers(doll["hair"], doll["highlight"], doll["hair_style"], hs, doll["hairline"], doll["volume"])
+    layers = [hair_back, ss.draw_body(doll["skin"], hs), ss.draw_dress(hs, palette, opts), ss.draw_shoes(hs, doll["shoes"]),
+              ss.draw_face(doll["eyes"], doll["brows"], doll["lips"], hs, doll["brow_thick"], doll["eye_size"], doll["blush"]),
+              ss.draw_accessories(hs, "#ffffff", True, True, True), hair_front]
+    return ss.soft_bg("#f6eff6"), layers
+
+def random_stack(size, n, seed=0):
+    """n full-canvas layers with soft random alpha everywhere (worst case: no bbox to skip)."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = Image.fromarray(rng.integers(0, 256, (h, w, 4), dtype=np.uint8), "RGBA")
+    base.putalpha(255)
+    return base, [Image.fromarray(rng.integers(0, 256, (h, w, 4), dtype=np.uint8), "RGBA") for _ in range(n)]
+
+
+def main(repeats=5):
+    cases = [("style studio (7 layers, 900x1200)", style_studio_stack()),
+             ("random full-cover (3 layers, 900x1200)", random_stack((900, 1200), 3)),
+             ("random full-cover (7 layers, 1400x900)", random_stack((1400, 900), 7))]
+    print(f"{'case':40s} {'PIL chain':>10s} {'compose':>10s} {'trimmed':>10s} {'numpy pm':>10s}  max diff")
+    for name, (base, layers) in cases:
+        sprites = [trimmed(layer) for layer in layers]   # built once; Style Studio caches these
+        ref = pil_chain(base, layers)
+        diff = max(max_diff(ref, compose(base, sprites)), max_diff(ref, premultiplied(base, layers)))
+        times = [best_of(lambda: fn(base, arg), repeats) for fn, arg in
+                 ((pil_chain, layers), (compose, layers), (compose, sprites), (premultiplied, layers))]
+        print(f"{name:40s} " + " ".join(f"{t*1e3:8.1f}ms" for t in times) + f"  {diff:8d}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
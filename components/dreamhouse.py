@@ -0,0 +1,798 @@
+"""
+Dreamhouse Designer render pipeline.
+Sprite generators are deterministic (their randomness is seeded from their
+arguments), so each item's sprite, rotation and drop shadow are memoized in a
+bounded, process-wide LRU keyed by (kind, w, h, c1, c2, extra, rot). Cached
+images are shared: treat them as read-only.
+"""
+from __future__ import annotations
+
+import math, os, random
+from collections import defaultdict, deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, wraps
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from components.media_utils import Sprite, compose, composite_sprites, self_pasted
+
+Box = Tuple[int,int,int,int]   # x0, y0, x1, y1, exclusive
+
+CANVAS_W, CANVAS_H = 1400, 900
+GRID = 20
+SPRITE_CACHE_SIZE = 256   # per function; a 700×400 RGBA sprite is ~1 MB
+SHADOW_REDUCE = 4         # drop shadows are blurred at 1/4 size, then upscaled
+SHADOW_OFFSET = (16, 10)  # drop shadow centre relative to the item's
+INDEX_CELL = 128          # ItemIndex grid cell, px
+SPRITE_WORKERS = min(8, os.cpu_count() or 1)
+
+# one pool for every session, so concurrent cold renders share SPRITE_WORKERS threads
+_sprite_pool = ThreadPoolExecutor(max_workers=SPRITE_WORKERS, thread_name_prefix="dh-sprites")
+
+
+def try_font(size: int):
+    for cand in ("arial.ttf", "DejaVuSans.ttf"):
+        try: return ImageFont.truetype(cand, size)
+        except Exception: pass
+    return ImageFont.load_default()
+
+def hex_to_rgb(h: str) -> Tuple[int,int,int]:
+    s = h.strip().lstrip("#")
+    if len(s)==3: s = "".join(c*2 for c in s)
+    return int(s[0:2],16), int(s[2:4],16), int(s[4:6],16)
+
+def clamp(v,a,b): return max(a, min(b, v))
+
+def blank(size=(CANVAS_W, CANVAS_H), color=(0,0,0,0)) -> Image.Image:
+    return Image.new("RGBA", size, color)
+
+def rr(draw: ImageDraw.ImageDraw, box, radius: int, fill=None, outline=None, width: int = 1):
+    try: draw.rounded_rectangle(box, radius=radius, fill=fill, outline=outline, width=width)
+    except Exception: draw.rectangle(box, fill=fill, outline=outline, width=width)
+
+def seeded(*parts) -> random.Random:
+    """A private RNG seeded from parts (str-seeded, so stable across processes and reruns)."""
+    return random.Random(":".join(map(str, parts)))
+
+def snap(val: int, enabled: bool) -> int:
+    return (val//GRID)*GRID if enabled else val
+
+
+# Floor and wall patterns are periodic: one period is drawn (on a 3×3-period
+# canvas, cropped to the middle one, so shapes crossing its edge wrap exactly) and
+# the surface is filled by tiling it.
+FLOOR_PERIODS = {"Herringbone": (120, 80), "Checker": (180, 180), "Planks": (260, 140)}
+WALL_PERIODS = {"Wainscot": (180, None), "Stripes": (120, None), "Panel": (200, 140)}   # None: full height
+WALL_INSETS = {"Panel": 40}          # margin of plain wall round the panels
+TERRAZZO_TILE = 360
+WALL_MODES = ("Wainscot", "Panel", "Stripes", "Plain")
+FLOOR_MODES = ("Herringbone", "Checker", "Terrazzo", "Planks")
+
+def tiled(tile: Image.Image, size: Tuple[int,int], origin: Tuple[int,int] = (0, 0)) -> Image.Image:
+    """The size window at origin of a plane covered with tile, starting at the plane's top-left corner."""
+    w,h = size
+    a = np.asarray(tile)
+    th, tw = a.shape[:2]
+    ox, oy = origin[0] % tw, origin[1] % th
+    a = np.tile(a, (-(-(h+oy)//th), -(-(w+ox)//tw), 1))[oy:oy+h, ox:ox+w]
+    return Image.fromarray(np.ascontiguousarray(a), tile.mode)
+
+def _terrazzo_tile(c1: str, c2: str) -> Image.Image:
+    base = Image.new("RGBA", (TERRAZZO_TILE, TERRAZZO_TILE), c2)
+    _terrazzo_chips(ImageDraw.Draw(base, "RGBA"), c1)
+    return base
+
+def _terrazzo_chips(d: ImageDraw.ImageDraw, c1: str):
+    t = TERRAZZO_TILE
+    rng = seeded("terrazzo", t)
+    chips = int((t*t)/12000)
+    options = [
+        (*hex_to_rgb(c1), 255),
+        (*hex_to_rgb("#ffd1dc"), 255),
+        (*hex_to_rgb("#c1fff4"), 255),
+        (*hex_to_rgb("#ffe28a"), 255),
+    ]
+    for _ in range(chips):
+        rx,ry = rng.randint(0,t), rng.randint(0,t)
+        rw,rh = rng.randint(10,40), rng.randint(10,40)
+        col = options[rng.randint(0,len(options)-1)]
+        for ox in (0, -t):        # chips hanging off the right/bottom edge wrap around
+            for oy in (0, -t):
+                x, y = rx+ox, ry+oy
+                d.polygon([(x,y),(x+rw,y+rh//3),(x+rw//2,y+rh)], fill=col)
+
+def _floor_periods(size: Tuple[int,int], mode: str, c1: str, c2: str) -> Image.Image:
+    img = Image.new("RGBA", size, c2)
+    _floor_shapes(ImageDraw.Draw(img), size, mode, c1, c2)
+    return img
+
+def _floor_shapes(d: ImageDraw.ImageDraw, size: Tuple[int,int], mode: str, c1: str, c2: str):
+    w,h = size
+    if mode == "Herringbone":
+        tile_w, tile_h = 120, 40
+        for y in range(-tile_h, h+tile_h, tile_h):
+            for x in range(-tile_w, w+tile_w, tile_w):
+                xo = x + (0 if (y//tile_h)%2==0 else tile_w//2)
+                pts = [(xo, y),(xo+tile_w, y),(xo+tile_w-tile_h, y+tile_h),(xo-tile_h, y+tile_h)]
+                d.polygon(pts, fill=c1)
+    elif mode == "Checker":
+        sz = 90
+        for yy in range(0,h,sz):
+            for xx in range(0,w,sz):
+                if ((xx//sz)+(yy//sz))%2==0:
+                    d.rectangle((xx,yy,xx+sz,yy+sz), fill=c1)
+    else:
+        # Wood planks
+        plank_h = 70
+        for i,y in enumerate(range(0,h,plank_h)):
+            d.rectangle((0,y,w,y+plank_h), fill=c2 if i%2 else c1)
+            for x in range(0,w,260):
+                d.line((x,y,x,y+plank_h), fill=(0,0,0,30), width=2)
+
+@lru_cache(maxsize=8)
+def floor_tile(mode: str, c1: str, c2: str, yscale: float = 1.0) -> Image.Image:
+    """One seamless period of a floor pattern, optionally squashed vertically by yscale."""
+    if mode == "Terrazzo":
+        pw = ph = TERRAZZO_TILE
+        col = tiled(_terrazzo_tile(c1, c2), (pw, 3*ph))
+    else:
+        pw, ph = FLOOR_PERIODS.get(mode, FLOOR_PERIODS["Planks"])
+        col = _floor_periods((3*pw, 3*ph), mode, c1, c2).crop((pw, 0, 2*pw, 3*ph))
+    if yscale != 1.0:
+        # squash three periods so the resampling filter wraps across the tile's edges too
+        ph = max(1, round(ph*yscale))
+        col = col.resize((pw, 3*ph))
+    return col.crop((0, ph, pw, 2*ph))
+
+def _wall_periods(size: Tuple[int,int], mode: str, c: str) -> Image.Image:
+    img = Image.new("RGBA", size, c)
+    _wall_shapes(ImageDraw.Draw(img, "RGBA"), size, mode)
+    return img
+
+def _wall_shapes(d: ImageDraw.ImageDraw, size: Tuple[int,int], mode: str):
+    w,h = size
+    if mode == "Wainscot":
+        d.rectangle((0, int(h*0.55), w, h), fill=(255,255,255,80), outline=None)
+        for x in range(40, w, 180):
+            rr(d, (x, int(h*0.55)+20, x+120, h-30), 12, fill=(255,255,255,50), outline=(255,255,255,140), width=2)
+    elif mode == "Panel":
+        for y in range(40, h-40, 140):
+            for x in range(40, w-40, 200):
+                rr(d, (x,y,x+160,y+100), 12, fill=None, outline=(255,255,255,160), width=2)
+    elif mode == "Stripes":
+        for x in range(0,w,60):
+            col = (255,255,255,40) if (x//60)%2==0 else (255,255,255,0)
+            d.rectangle((x,0,x+60,h), fill=col)
+
+@lru_cache(maxsize=8)
+def wall_tile(mode: str, c: str, h: int) -> Image.Image:
+    """One seamless period of an h-tall wall pattern."""
+    if mode not in WALL_PERIODS:
+        return Image.new("RGBA", (1, h), c)
+    pw, ph = WALL_PERIODS[mode]
+    i = WALL_INSETS.get(mode, 0)
+    if ph is None:
+        return _wall_periods((3*pw, h), mode, c).crop((pw+i, 0, 2*pw+i, h))
+    return _wall_periods((3*pw, 3*ph), mode, c).crop((pw+i, ph+i, 2*pw+i, 2*ph+i))
+
+def wall_area(mode: str, w: int, h: int) -> Box:
+    """The part of a w x h wall that wall_tile covers, tiled from its corner; the rest is plain wall."""
+    i = WALL_INSETS.get(mode)
+    if i is None:
+        return (0, 0, w, h)
+    # _wall_shapes starts a panel every period from the inset until it is within the inset of the far edge
+    pw, ph = WALL_PERIODS[mode]
+    return (i, i, min(w, i + pw*len(range(i, w-i, pw))), min(h, i + ph*len(range(i, h-i, ph))))
+
+def _intersect(a: Box, b: Box) -> Box | None:
+    x0, y0, x1, y1 = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+    return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+def room_region(bg_hex: str, wall_hex: str, wall_mode: str, floor_mode: str, floor_c1: str, floor_c2: str,
+                skirting_hex: str, size: Tuple[int,int], box: Box) -> Image.Image:
+    """The box part of the room base of a size canvas: background, wall, floor, horizon shadow and skirting."""
+    W, H = size
+    x0, y0, x1, y1 = box
+    region = blank((x1-x0, y1-y0), (*hex_to_rgb(bg_hex), 255))
+    floor_y = int(H * 0.55)
+    layers = []
+
+    #  WALL (W, 0.62 H): a periodic texture tiled from the corner of its area, plain wall round it
+    wall_h = int(H * 0.62)
+    b = _intersect(box, (0, 0, W, wall_h))
+    if b:
+        area = wall_area(wall_mode, W, wall_h)
+        a = _intersect(b, area)
+        tex = tiled(wall_tile(wall_mode, wall_hex, wall_h), (a[2]-a[0], a[3]-a[1]), (a[0]-area[0], a[1]-area[1])) if a else None
+        if a != b:
+            plain = Image.new("RGBA", (b[2]-b[0], b[3]-b[1]), wall_hex)
+            if a:
+                plain.paste(tex, (a[0]-b[0], a[1]-b[1]))
+            tex, a = plain, b
+        layers.append(Sprite(tex, a[0]-x0, a[1]-y0, masked=True))
+
+    #  FLOOR (W, 0.45 H, squashed to 90%): a periodic texture tiled from its corner
+    b = _intersect(box, (0, floor_y, W, floor_y + int(H * 0.45)))
+    if b:
+        tex = tiled(floor_tile(floor_mode, floor_c1, floor_c2, 0.9), (b[2]-b[0], b[3]-b[1]), (b[0], b[1]-floor_y))
+        layers.append(Sprite(tex, b[0]-x0, b[1]-y0, masked=True))
+
+    #  Horizon shadow: the 80px band above the floor line darkens towards it
+    b = _intersect(box, (0, floor_y - 80, W, floor_y))
+    if b:
+        span = 80
+        v = (120 * (np.arange(b[1], b[3]) - (floor_y - 80)) / span).astype(np.uint8)
+        band = Image.fromarray(v[:, None]).resize((b[2]-b[0], b[3]-b[1]), Image.NEAREST)
+        layers.append(Sprite(Image.merge("RGBA", (band, band, band, band)), b[0]-x0, b[1]-y0))
+
+    composite_sprites(region, layers, in_place=True)
+
+    # skirting board
+    d = ImageDraw.Draw(region, "RGBA")
+    d.rectangle((-x0, floor_y - 6 - y0, W - x0, floor_y - y0), fill=(*hex_to_rgb(skirting_hex), 255))
+    return region
+
+@lru_cache(maxsize=4)
+def render_room(bg_hex: str, wall_hex: str, wall_mode: str, floor_mode: str,
+                floor_c1: str, floor_c2: str, skirting_hex: str) -> Image.Image:
+    return room_region(bg_hex, wall_hex, wall_mode, floor_mode, floor_c1, floor_c2, skirting_hex,
+                       (CANVAS_W, CANVAS_H), (0, 0, CANVAS_W, CANVAS_H))
+
+
+
+# Furniture and décor are drawn by functions fn(d, w, h, ...) on an ImageDraw-like d;
+# @drawn makes them return a fresh (w, h) RGBA image, or draw on draw= if given, so the
+# same code also feeds vector export (see components/dreamhouse_svg.py).
+def drawn(fn):
+    @wraps(fn)
+    def paint(w: int, h: int, *args, draw=None, **kw):
+        if draw is not None:
+            fn(draw, w, h, *args, **kw)
+            return draw
+        img = blank((w,h))
+        fn(ImageDraw.Draw(img, "RGBA"), w, h, *args, **kw)
+        return img
+    return paint
+
+@drawn
+def draw_window(d: ImageDraw.ImageDraw, w: int, h: int, mullions: int, frame_hex: str, glass_tint: str):
+    rr(d, (0,0,w,h), 14, fill=(*hex_to_rgb(glass_tint),160), outline=(*hex_to_rgb(frame_hex),255), width=6)
+    # mullions
+    for i in range(1, mullions):
+        x = int(w * i/mullions)
+        d.line((x,8,x,h-8), fill=(*hex_to_rgb(frame_hex),200), width=4)
+    d.line((8,h//2,w-8,h//2), fill=(*hex_to_rgb(frame_hex),200), width=4)
+    # simple light streak
+    d.polygon([(8,8),(int(w*0.45),8),(8,int(h*0.22))], fill=(255,255,255,70))
+
+@drawn
+def draw_door(d: ImageDraw.ImageDraw, w: int, h: int, hex_color: str):
+    rr(d, (0,0,w,h), 10, fill=hex_to_rgb(hex_color)+(255,), outline=(0,0,0,40), width=3)
+    rr(d, (10,12,w-10,h-12), 10, fill=None, outline=(255,255,255,160), width=2)
+    # handle
+    d.rounded_rectangle((w-26,h//2-4,w-12,h//2+4), 3, fill=(230,230,230,255))
+
+@drawn
+def draw_wall_art(d: ImageDraw.ImageDraw, w: int, h: int, hex_frame: str, hex_art1: str, hex_art2: str, style: str="Abstract", seed: int = 0):
+    rr(d, (0,0,w,h), 14, fill=(255,255,255,240), outline=(*hex_to_rgb(hex_frame),255), width=6)
+    if style == "Abstract":
+        rng = seeded("wall_art", seed, w, h)
+        for _ in range(7):
+            x1,y1 = rng.randint(10,w-10), rng.randint(10,h-10)
+            x2,y2 = rng.randint(10,w-10), rng.randint(10,h-10)
+            col = hex_to_rgb(hex_art1) if rng.random()<0.5 else hex_to_rgb(hex_art2)
+            d.line((x1,y1,x2,y2), fill=col+(200,), width=rng.randint(4,12))
+    else:
+        # geometric
+        d.rectangle((10,10,w-10,h-10), outline=hex_to_rgb(hex_art1)+(200,), width=6)
+        d.ellipse((w*0.25,h*0.25,w*0.75,h*0.75), outline=hex_to_rgb(hex_art2)+(220,), width=10)
+
+
+@drawn
+def f_sofa(d: ImageDraw.ImageDraw, w: int, h: int, base_hex: str, cushion_hex: str):
+    rr(d, (0,int(h*0.25),w,h), 26, fill=hex_to_rgb(base_hex)+(255,), outline=(0,0,0,40), width=3)
+    rr(d, (0,0,int(w*0.3),int(h*0.5)), 22, fill=hex_to_rgb(base_hex)+(255,))
+    rr(d, (int(w*0.7),0,w,int(h*0.5)), 22, fill=hex_to_rgb(base_hex)+(255,))
+    # cushions
+    for i in range(2):
+        rr(d, (int(w*0.25)+i*int(w*0.24), int(h*0.28), int(w*0.45)+i*int(w*0.24), int(h*0.6)), 16, fill=hex_to_rgb(cushion_hex)+(255,))
+    # feet
+    for x in (int(w*0.08), int(w*0.88)):
+        d.rectangle((x-12,h-6,x+12,h), fill=(60,60,60,180))
+
+@drawn
+def f_armchair(d: ImageDraw.ImageDraw, w: int, h: int, hex_color: str):
+    rr(d, (0,int(h*0.25),w,h), 26, fill=hex_to_rgb(hex_color)+(255,), outline=(0,0,0,40), width=3)
+    rr(d, (0,0,int(w*0.32),int(h*0.52)), 22, fill=hex_to_rgb(hex_color)+(255,))
+    rr(d, (int(w*0.68),0,w,int(h*0.52)), 22, fill=hex_to_rgb(hex_color)+(255,))
+    d.rectangle((w*0.48,h-6,w*0.52,h), fill=(60,60,60,180))
+
+@drawn
+def f_table(d: ImageDraw.ImageDraw, w: int, h: int, top_hex: str, leg_hex: str):
+    rr(d, (0,int(h*0.15),w,int(h*0.5)), 18, fill=hex_to_rgb(top_hex)+(255,), outline=(0,0,0,30), width=2)
+    d.rectangle((w*0.48,int(h*0.5),w*0.52,h), fill=hex_to_rgb(leg_hex)+(255,))
+
+@drawn
+def f_plant(d: ImageDraw.ImageDraw, w: int, h: int, pot_hex: str, leaf_hex: str, seed: int = 0):
+    rng = seeded("plant", seed, w, h)
+    # pot
+    rr(d, (int(w*0.3), int(h*0.7), int(w*0.7), h), 10, fill=hex_to_rgb(pot_hex)+(255,), outline=(0,0,0,40), width=2)
+    # stems & leaves
+    for i in range(6):
+        cx = int(w*0.5)
+        x = cx + int((i-3)*10)
+        d.line((cx,int(h*0.7), x, int(h*0.25)), fill=(60,120,60,150), width=3)
+        for t in range(3):
+            ex = x + rng.randint(-30,30); ey = int(h*0.25)+rng.randint(-20,20)
+            rr(d, (ex-18, ey-8, ex+18, ey+8), 8, fill=hex_to_rgb(leaf_hex)+(220,))
+
+@drawn
+def f_bed(d: ImageDraw.ImageDraw, w: int, h: int, frame_hex: str, sheet_hex: str, pillow_hex: str):
+    rr(d, (0,int(h*0.4),w,h), 18, fill=hex_to_rgb(sheet_hex)+(255,), outline=(0,0,0,40), width=2)
+    rr(d, (0,0,w,int(h*0.45)), 14, fill=hex_to_rgb(frame_hex)+(255,))
+    # pillows
+    rr(d, (int(w*0.18), int(h*0.1), int(w*0.42), int(h*0.28)), 10, fill=hex_to_rgb(pillow_hex)+(255,))
+    rr(d, (int(w*0.58), int(h*0.1), int(w*0.82), int(h*0.28)), 10, fill=hex_to_rgb(pillow_hex)+(255,))
+
+@drawn
+def f_rug(d: ImageDraw.ImageDraw, w: int, h: int, hex_color: str, pattern: str):
+    rr(d, (0,0,w,h), 24, fill=hex_to_rgb(hex_color)+(220,))
+    if pattern == "Stripes":
+        for x in range(10,w,40): d.line((x,10,x,h-10), fill=(255,255,255,90), width=6)
+    elif pattern == "Check":
+        for y in range(10,h,40):
+            for x in range(10,w,40):
+                if ((x//40)+(y//40))%2==0: d.rectangle((x,y,x+28,y+28), fill=(255,255,255,90))
+    elif pattern == "Dots":
+        for y in range(20,h,40):
+            for x in range(20,w,40):
+                d.ellipse((x-6,y-6,x+6,y+6), fill=(255,255,255,120))
+
+@drawn
+def f_lamp(d: ImageDraw.ImageDraw, w: int, h: int, shade_hex: str, pole_hex: str):
+    rr(d, (int(w*0.45), int(h*0.2), int(w*0.55), int(h*0.9)), 6, fill=hex_to_rgb(pole_hex)+(255,))
+    rr(d, (int(w*0.25), 0, int(w*0.75), int(h*0.25)), 16, fill=hex_to_rgb(shade_hex)+(255,))
+
+@drawn
+def f_shelf(d: ImageDraw.ImageDraw, w: int, h: int, hex_color: str):
+    for i,y in enumerate((int(h*0.15), int(h*0.45), int(h*0.75))):
+        rr(d, (int(w*0.1), y, int(w*0.9), y+18), 6, fill=hex_to_rgb(hex_color)+(255,))
+
+CATALOG = {
+    "Sofa": lambda a,b,c1,c2,**kw: f_sofa(a,b,c1,c2,**kw),
+    "Armchair": lambda a,b,c1,c2,**kw: f_armchair(a,b,c1,**kw),
+    "Coffee Table": lambda a,b,c1,c2,**kw: f_table(a,b,c1,c2,**kw),
+    "Plant": lambda a,b,c1,c2,**kw: f_plant(a,b,c2,c1,**kw),
+    "Bed": lambda a,b,c1,c2,**kw: f_bed(a,b,c2,c1,"#ffffff",**kw),
+    "Rug": lambda a,b,c1,c2,**kw: f_rug(a,b,c1,c2,**kw),
+    "Lamp": lambda a,b,c1,c2,**kw: f_lamp(a,b,c1,c2,**kw),
+    "Shelf": lambda a,b,c1,c2,**kw: f_shelf(a,b,c1,**kw),
+    "Wall Art": lambda a,b,c1,c2,**kw: draw_wall_art(a,b,"#222222",c1,c2,"Abstract",**kw),
+    "Window": lambda a,b,c1,c2,**kw: draw_window(a,b,4,"#ffffff",c2,**kw),
+    "Door": lambda a,b,c1,c2,**kw: draw_door(a,b,c1,**kw),
+}
+
+DEFAULT_COLORS = {
+    "Sofa": ("#ff7aa9","#ffe6f3"),
+    "Armchair": ("#9b5de5","#f7d6ff"),
+    "Coffee Table": ("#c8a27e","#6e4f3a"),
+    "Plant": ("#78d380","#5b8a5b"),
+    "Bed": ("#e7e7e7","#ff4fb7"),
+    "Rug": ("#ffe6f3","Stripes"),
+    "Lamp": ("#fff2a8","#6e6e6e"),
+    "Shelf": ("#d9d9d9","#d9d9d9"),
+    "Wall Art": ("#ff4fb7","#00d1ff"),
+    "Window": ("#ccccff","#aee3ff"),
+    "Door": ("#b57a4a","#b57a4a"),
+}
+
+
+@dataclass
+class Item:
+    kind: str
+    x: int
+    y: int
+    w: int
+    h: int
+    rot: float
+    c1: str
+    c2: str
+    extra: str = ""
+
+
+
+# item sprites (cached by their full visual key)
+RUG_PATTERNS = ("Stripes", "Check", "Dots")
+
+def draw_item(kind: str, w: int, h: int, c1: str, c2: str, extra: str = "", draw=None):
+    """The item drawn at (w, h): a fresh RGBA image, or draw (an ImageDraw-like) drawn on."""
+    if kind == "Rug":
+        return f_rug(w,h,c1,extra if extra in RUG_PATTERNS else "Plain", draw=draw)
+    return CATALOG[kind](w,h,c1,c2, draw=draw)
+
+@lru_cache(maxsize=SPRITE_CACHE_SIZE)
+def item_sprite(kind: str, w: int, h: int, c1: str, c2: str, extra: str = "") -> Image.Image:
+    return draw_item(kind, w, h, c1, c2, extra)
+
+def drop_shadow(sprite: Image.Image, rot: float) -> Image.Image:
+    """
+    Soft grey shadow of a sprite (0.6× its luminance, blurred 8px), built at
+    1/SHADOW_REDUCE size: the blur hides the lost detail. Returned already pasted
+    through its own alpha, like every cached item layer.
+    """
+    k = SHADOW_REDUCE
+    small = sprite.reduce(k).convert("L").point(lambda p:int(p*0.6))
+    small = small.rotate(rot, expand=True).filter(ImageFilter.GaussianBlur(8/k)).point(lambda p: p*p//255)
+    v = small.resize((small.width*k, small.height*k), Image.BILINEAR)
+    return Image.merge("RGBA", (v, v, v, v))
+
+@lru_cache(maxsize=SPRITE_CACHE_SIZE)
+def item_layers(kind: str, w: int, h: int, c1: str, c2: str, extra: str, rot: float) -> Tuple[Image.Image, Image.Image]:
+    """(rotated soft drop shadow, rotated sprite) for one item, already pasted through their own alpha."""
+    sprite = item_sprite(kind, w, h, c1, c2, extra)
+    return drop_shadow(sprite, rot), self_pasted(sprite.rotate(rot, expand=True))
+
+def item_key(it: Dict) -> Tuple:
+    return it["kind"], int(it["w"]), int(it["h"]), it["c1"], it["c2"], it.get("extra",""), float(it["rot"])
+
+def _sprite_group(keys: List[Tuple]) -> List[Tuple[Image.Image, Image.Image]]:
+    # keys share one sprite (they differ only in rot): draw it once, then rotate and shadow each
+    return [item_layers(*k) for k in keys]
+
+def prepare_layers(keys: Iterable[Tuple], pool: Executor | None = None) -> Dict[Tuple, Tuple[Image.Image, Image.Image]]:
+    """
+    item_layers for each distinct key, the sprites drawn, shadowed and rotated on pool
+    (default: the shared sprite pool) when there is more than one to make. Pillow
+    releases the GIL while it blurs, rotates and resamples, so the threads overlap.
+    """
+    groups: Dict[Tuple, List[Tuple]] = defaultdict(list)
+    for k in dict.fromkeys(keys):
+        groups[k[:6]].append(k)
+    pool = pool or _sprite_pool
+    if len(groups) < 2 or pool is _sprite_pool and SPRITE_WORKERS == 1:
+        done = map(_sprite_group, groups.values())
+    else:
+        done = pool.map(_sprite_group, groups.values())
+    return {k: layers for ks, made in zip(groups.values(), done) for k, layers in zip(ks, made)}
+
+def item_sprites(it: Dict, layers: Tuple[Image.Image, Image.Image] | None = None) -> List[Sprite]:
+    """The item's shadow and body (its item_layers unless given), placed on the canvas (shadow offset down-right)."""
+    shadow, sprite = layers or item_layers(*item_key(it))
+    x, y = it["x"], it["y"]
+    return [Sprite.centered(shadow, (x+SHADOW_OFFSET[0], y+SHADOW_OFFSET[1])), Sprite.centered(sprite, (x, y))]
+
+
+# overlays
+def spot_cone(red: int, power: float, rad: int, box: Box | None = None) -> Image.Image:
+    """
+    The box part (default: all) of one ceiling spotlight, a 2·rad square, already
+    pasted through its own alpha. The falloff is linear in the distance from the
+    centre, so the cone brightens towards its rim.
+    """
+    x0, y0, x1, y1 = box or (0, 0, 2*rad, 2*rad)
+    yy, xx = np.ogrid[y0:y1, x0:x1]
+    d = np.hypot(np.float32(np.abs(xx - rad + 0.5)), np.float32(np.abs(yy - rad + 0.5)))
+    v = (np.minimum(d, rad + 1) * np.float32(power*200/rad)).astype(np.uint8)
+    v[d > rad] = 0
+    full = Image.fromarray(v)
+    tint = full.point([round(red*i/255) for i in range(256)])
+    return Image.merge("RGBA", (tint, tint, tint, full.point([round(i*i/255) for i in range(256)])))
+
+def ambient_region(ambient_hex: str, power: float, spot_lights: int, size: Tuple[int,int], box: Box) -> Image.Image:
+    """The box part of the ambient light of a size canvas: top sunlight gradient plus ceiling spotlights."""
+    W, H = size
+    x0, y0, x1, y1 = box
+    r,g,b = hex_to_rgb(ambient_hex)
+    # gentle top sunlight gradient: one alpha per row
+    top = H*0.6
+    ys = np.arange(y0, y1)
+    a = np.where(ys < int(top), np.floor(power*255 * (1 - ys/top)), 0).astype(np.uint8)
+    alpha = Image.fromarray(a[:, None]).resize((x1-x0, y1-y0), Image.NEAREST)
+    amb = Image.merge("RGBA", tuple(Image.new("L", alpha.size, c) for c in (r,g,b)) + (alpha,))
+    # spotlights (ceiling), each only computed where it meets the box
+    rad = int(H*0.66)
+    cy = int(H*0.10) + int(rad*0.2)
+    cones = []
+    for i in range(spot_lights):
+        cx = int(W*(i+1)/(spot_lights+1))
+        c = _intersect(box, (cx-rad, cy-rad, cx+rad, cy+rad))
+        if c:
+            local = (c[0]-cx+rad, c[1]-cy+rad, c[2]-cx+rad, c[3]-cy+rad)
+            cones.append(Sprite(spot_cone(r, power, rad, local), c[0]-x0, c[1]-y0))
+    return composite_sprites(amb, cones, in_place=True)
+
+@lru_cache(maxsize=4)
+def ambient_layer(ambient_hex: str, power: float, spot_lights: int) -> Image.Image:
+    return ambient_region(ambient_hex, power, spot_lights, (CANVAS_W, CANVAS_H), (0, 0, CANVAS_W, CANVAS_H))
+
+def grid_region(size: Tuple[int,int], box: Box) -> Image.Image:
+    """The box part of the snap-grid guides of a size canvas."""
+    W, H = size
+    x0, y0, x1, y1 = box
+    guides = blank((x1-x0, y1-y0))
+    dg = ImageDraw.Draw(guides, "RGBA")
+    for x in range(-(-x0//GRID)*GRID, min(x1, W), GRID):
+        dg.line((x-x0, -y0, x-x0, H-y0), fill=(255,255,255,20))
+    for y in range(-(-y0//GRID)*GRID, min(y1, H), GRID):
+        dg.line((-x0, y-y0, W-x0, y-y0), fill=(255,255,255,20))
+    return guides
+
+@lru_cache(maxsize=1)
+def grid_layer() -> Image.Image:
+    return grid_region((CANVAS_W, CANVAS_H), (0, 0, CANVAS_W, CANVAS_H))
+
+@lru_cache(maxsize=1)
+def title_chip(title: str = "Dreamhouse Designer") -> Sprite:
+    """The title chip, drawn chip-sized and placed at (14, 14)."""
+    f1 = try_font(26)
+    tw,th = ImageDraw.Draw(blank((1,1))).textbbox((0,0), title, font=f1)[2:]
+    chip = blank((tw+21, th+15))
+    dc = ImageDraw.Draw(chip, "RGBA")
+    rr(dc, (0,0, tw+20, th+14), 999, fill=(255,255,255,160))
+    dc.text((10,4), title, font=f1, fill=(20,20,20,220))
+    return Sprite(chip, 14, 14)
+
+
+def _clip(box: Box) -> Box | None:
+    x0, y0, x1, y1 = max(box[0], 0), max(box[1], 0), min(box[2], CANVAS_W), min(box[3], CANVAS_H)
+    return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def item_box(it: Dict) -> Box:
+    """Canvas bbox of the item's rotated body, placed the way item_sprites centres it."""
+    w, h, a = int(it["w"]), int(it["h"]), math.radians(float(it["rot"]))
+    rw = math.ceil(abs(w*math.cos(a)) + abs(h*math.sin(a)))
+    rh = math.ceil(abs(w*math.sin(a)) + abs(h*math.cos(a)))
+    x0, y0 = int(it["x"] - rw/2), int(it["y"] - rh/2)
+    return x0, y0, x0+rw, y0+rh
+
+class ItemIndex:
+    """
+    Uniform grid hash over item boxes, so point, rectangle and nearest-item queries
+    only visit the cells around them. Call sync(items) after edits: like the
+    compositor it diffs per list slot, re-bucketing only items whose box changed.
+    Results are list positions; a higher position is drawn later, i.e. on top.
+    """
+    def __init__(self, cell: int = INDEX_CELL):
+        self.cell = cell
+        self._cells: Dict[Tuple[int,int], set] = defaultdict(set)
+        self._boxes: Dict[int, Box] = {}
+        self._span = (0, 0, 0, 0)   # occupied cell range, only ever grows
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def _keys(self, box: Box):
+        c = self.cell
+        return [(cx, cy) for cx in range(box[0]//c, (box[2]-1)//c + 1) for cy in range(box[1]//c, (box[3]-1)//c + 1)]
+
+    def _add(self, i: int, box: Box):
+        self._boxes[i] = box
+        for k in self._keys(box):
+            self._cells[k].add(i)
+        c, (sx0, sy0, sx1, sy1) = self.cell, self._span
+        if len(self._boxes) == 1: sx0, sy0, sx1, sy1 = box[0]//c, box[1]//c, (box[2]-1)//c, (box[3]-1)//c
+        self._span = (min(sx0, box[0]//c), min(sy0, box[1]//c), max(sx1, (box[2]-1)//c), max(sy1, (box[3]-1)//c))
+
+    def _remove(self, i: int):
+        for k in self._keys(self._boxes.pop(i)):
+            self._cells[k].discard(i)
+            if not self._cells[k]: del self._cells[k]
+
+    def sync(self, items: List[Dict]):
+        for i in [i for i in self._boxes if i >= len(items)]:
+            self._remove(i)
+        for i, it in enumerate(items):
+            box = item_box(it)
+            if self._boxes.get(i) != box:
+                if i in self._boxes: self._remove(i)
+                self._add(i, box)
+
+    def overlapping(self, box: Box) -> List[int]:
+        """Positions of items whose box overlaps box, in draw order."""
+        found = set()
+        for k in self._keys(box):
+            found |= self._cells.get(k, set())
+        return sorted(i for i in found if _overlaps(self._boxes[i], box))
+
+    def at(self, x: int, y: int) -> int | None:
+        """The topmost item whose box contains (x, y)."""
+        hits = [i for i in self._cells.get((x//self.cell, y//self.cell), ())
+                if self._boxes[i][0] <= x < self._boxes[i][2] and self._boxes[i][1] <= y < self._boxes[i][3]]
+        return max(hits, default=None)
+
+    def nearest(self, x: int, y: int) -> int | None:
+        """The item whose box is closest to (x, y) (topmost on ties), searching outward ring by ring."""
+        if not self._boxes:
+            return None
+        c = self.cell
+        px, py = x//c, y//c
+        sx0, sy0, sx1, sy1 = self._span
+        best, best_d = None, None
+        for r in range(max(px - sx0, sx1 - px, py - sy0, sy1 - py, 0) + 1):
+            ring = [(px+dx, py+dy) for dx in range(-r, r+1) for dy in range(-r, r+1) if max(abs(dx), abs(dy)) == r]
+            for k in ring:
+                for i in self._cells.get(k, ()):
+                    b = self._boxes[i]
+                    d = math.hypot(max(b[0] - x, 0, x - b[2] + 1), max(b[1] - y, 0, y - b[3] + 1))
+                    if best_d is None or (d, -i) < (best_d, -best):
+                        best, best_d = i, d
+            # anything in an unvisited ring is at least r whole cells away
+            if best_d is not None and best_d <= r*c:
+                break
+        return best
+
+WALL_KINDS = ("Window", "Door", "Wall Art", "Shelf")   # hung on / set into the wall, not stood on the floor
+LAYOUT_GAP = 20
+
+def skyline_pack(sizes: List[Tuple[int,int]], band_w: int, band_h: int) -> List[Tuple[int,int] | None]:
+    """
+    Bottom-left skyline packing of (w, h) rects into a band_w × band_h band, y measured
+    from the band's base. Tallest first; each rect goes where it rests lowest, then
+    leftmost. Returns each rect's (x, y), or None where it no longer fits.
+
+    O(n log n) for the sort plus O(s) per rect, s the skyline's segment count: every
+    segment start is tried once, with a sliding-window maximum for the height the rect
+    would rest at. Segments have whole-pixel widths, so s <= band_w whatever n is, and
+    merging equal-height neighbours keeps it to a few dozen in practice.
+    """
+    out: List[Tuple[int,int] | None] = [None]*len(sizes)
+    sky = [[0, band_w, 0]]   # [x, width, height] segments, left to right
+    for n in sorted(range(len(sizes)), key=lambda n: (-sizes[n][1], -sizes[n][0])):
+        w, h = sizes[n]
+        best = None
+        window = deque()   # segments under [x, x+w), tallest first; heights fall towards the back
+        j = 0
+        for i in range(len(sky)):
+            x = sky[i][0]
+            if x + w > band_w:
+                break
+            while window and window[0] < i:
+                window.popleft()
+            while j < len(sky) and sky[j][0] < x + w:
+                while window and sky[window[-1]][2] <= sky[j][2]:
+                    window.pop()
+                window.append(j); j += 1
+            y = sky[window[0]][2]
+            if y + h <= band_h and (best is None or (y, x) < best[:2]):
+                best = (y, x, i, j)
+        if best is None:
+            continue
+        y, x, i, j = best
+        out[n] = (x, y)
+        # the rect's top replaces the segments it spans; the last one may stick out past it
+        last = sky[j-1]
+        tail = [[x+w, last[0]+last[1]-(x+w), last[2]]] if last[0]+last[1] > x+w else []
+        sky[i:j] = [[x, w, y+h]] + tail
+        k = max(i-1, 0)   # merge equal-height neighbours so the skyline stays short
+        while k < min(i+2, len(sky)-1):
+            if sky[k][2] == sky[k+1][2]:
+                sky[k][1] += sky[k+1][1]; del sky[k+1]
+            else:
+                k += 1
+    return out
+
+def smart_layout(items: List[Dict], gap: int = LAYOUT_GAP) -> List[int]:
+    """
+    Re-place every item without overlaps: wall kinds are packed up from the skirting,
+    everything else back-to-front across the floor. Moves items in place and returns
+    the positions of any that did not fit (left where they were).
+    """
+    floor_y = int(CANVAS_H*0.55)
+    bands = {True: (floor_y - 6, []), False: (CANVAS_H - floor_y, [])}
+    for i, it in enumerate(items):
+        bands[it["kind"] in WALL_KINDS][1].append(i)
+    unplaced = []
+    for on_wall, (band_h, idxs) in bands.items():
+        boxes = [item_box(items[i]) for i in idxs]
+        sizes = [(b[2]-b[0], b[3]-b[1]) for b in boxes]
+        spots = skyline_pack([(w+gap, h+gap) for w, h in sizes], CANVAS_W - gap, band_h - gap)
+        for i, (w, h), spot in zip(idxs, sizes, spots):
+            if spot is None:
+                unplaced.append(i); continue
+            x0 = gap + spot[0]
+            y0 = floor_y - 6 - spot[1] - h - gap if on_wall else floor_y + gap + spot[1]
+            items[i]["x"], items[i]["y"] = x0 + (w+1)//2, y0 + (h+1)//2
+    return sorted(unplaced)
+
+class SceneCompositor:
+    """
+    Keeps the last composited scene plus each item's placed layers in z-order, and on
+    the next render repaints only the old and new boxes of items that changed (room
+    base, every overlapping item and the overlays, clipped to those boxes). Keep one
+    per session; render() returns a fresh image, the internal buffer is never shared.
+    Layers of items new since the last render are prepared together (prepare_layers);
+    compositing stays sequential, in z-order.
+    """
+    REBUILD_FRACTION = 0.6   # dirty area above this share of the canvas -> repaint everything
+
+    def __init__(self):
+        self._key = None
+        self._room: Image.Image | None = None
+        self._overlays: List[Image.Image | Sprite] = []
+        self._placed: List[Tuple[Sprite, ...]] = []
+        self._layers: Dict[Tuple, Tuple[Image.Image, Image.Image]] = {}   # item_key -> item_layers, for this scene's items
+        self._scene: Image.Image | None = None
+
+    @staticmethod
+    def _ident(layers: Tuple[Sprite, ...]) -> Tuple:
+        # cached sprites are shared objects, and self._placed keeps them alive, so ids are stable
+        return tuple((id(s.image), s.x, s.y) for s in layers)
+
+    def _repaint(self, box: Box):
+        x0, y0 = box[:2]
+        region = self._room.crop(box)
+        composite_sprites(region, [Sprite(s.image, s.x-x0, s.y-y0, s.masked)
+                                   for layers in self._placed for s in layers if _overlaps(s.box, box)], in_place=True)
+        overlays = [Sprite(o.image, o.x-x0, o.y-y0, o.masked) if isinstance(o, Sprite) else o.crop(box) for o in self._overlays]
+        self._scene.paste(compose(region, overlays), box[:2])
+
+    def render(self, settings: Dict, items: List[Dict]) -> Image.Image:
+        key = (settings["bg"], settings["wall"], settings["wall_mode"], settings["floor_mode"], settings["floor1"],
+               settings["floor2"], settings["skirting"], settings["ambient"], settings["ambient_power"],
+               settings["spot_lights"], settings["snap"])
+        keys = [item_key(it) for it in items]
+        known = self._layers
+        fresh = prepare_layers(k for k in keys if k not in known)
+        self._layers = {k: known.get(k) or fresh[k] for k in keys}
+        placed = [tuple(item_sprites(it, self._layers[k])) for it, k in zip(items, keys)]
+        old, self._placed = self._placed, placed
+
+        dirty: List[Box] = []
+        if key == self._key and self._scene is not None:
+            for i in range(max(len(old), len(placed))):
+                before = old[i] if i < len(old) else ()
+                after = placed[i] if i < len(placed) else ()
+                if self._ident(before) != self._ident(after):
+                    dirty += [b for b in (_clip(s.box) for s in before + after) if b]
+            area = sum((b[2]-b[0])*(b[3]-b[1]) for b in dirty)
+            if area > self.REBUILD_FRACTION * CANVAS_W * CANVAS_H:
+                dirty = [(0, 0, CANVAS_W, CANVAS_H)]
+        else:
+            self._key = key
+            self._room = render_room(*key[:7])
+            self._overlays = []
+            if settings["ambient_power"] > 0:
+                self._overlays.append(ambient_layer(settings["ambient"], settings["ambient_power"], settings["spot_lights"]))
+            if settings["snap"]:
+                self._overlays.append(grid_layer())
+            self._overlays.append(title_chip())
+            self._scene = blank()
+            dirty = [(0, 0, CANVAS_W, CANVAS_H)]
+
+        for box in dirty:
+            self._repaint(box)
+        return self._scene.copy()
+
+
+def render_scene(settings: Dict, items: List[Dict]) -> Image.Image:
+    """
+    The full room: cached room base, every item (shadow, then sprite) in list order,
+    then ambient light, grid guides (when snapping) and the title chip.
+    """
+    return SceneCompositor().render(settings, items)
+
+def scene_region(settings: Dict, placed: List[Sprite], size: Tuple[int,int], box: Box) -> Image.Image:
+    """
+    The box part of the scene on a size canvas, built from regions of the room and
+    overlays instead of full-canvas layers; placed holds the item sprites (see
+    item_sprites) in draw order, in canvas coordinates. At the editor's canvas size
+    this equals render_scene(...).crop(box).
+    """
+    x0, y0 = box[:2]
+    region = room_region(settings["bg"], settings["wall"], settings["wall_mode"], settings["floor_mode"],
+                         settings["floor1"], settings["floor2"], settings["skirting"], size, box)
+    composite_sprites(region, [Sprite(s.image, s.x-x0, s.y-y0, s.masked) for s in placed], in_place=True)
+    overlays: List[Image.Image | Sprite] = []
+    if settings["ambient_power"] > 0:
+        overlays.append(ambient_region(settings["ambient"], settings["ambient_power"], settings["spot_lights"], size, box))
+    if settings["snap"]:
+        overlays.append(grid_region(size, box))
+    chip = title_chip()
+    overlays.append(Sprite(chip.image, chip.x-x0, chip.y-y0))
+    return compose(region, overlays)
@@ -0,0 +1,99 @@
+"""
+Undo/redo for the Dreamhouse item list.
+
+The page keeps editing st.session_state.dh_items (plain dicts) in place and calls
+history.commit(items) once per run, after every edit. The history holds the scene as
+a tuple of immutable item records (tuples in Item field order) and keeps each change
+as a patch: the run of slots that differ, with their records before and after.
+Unchanged items keep their record objects, so a step costs only the items it changed
+however big the scene is: moving one of 1,000 items stores two records, not a copy.
+
+Depth and an estimated byte budget are both bounded; the oldest steps go first.
+"""
+from __future__ import annotations
+
+import sys
+from collections import deque
+from dataclasses import fields
+from operator import itemgetter
+from typing import Deque, Dict, Iterable, List, Tuple
+
+from components.dreamhouse import Item
+
+ITEM_FIELDS = tuple(f.name for f in fields(Item))
+HISTORY_DEPTH = 100
+HISTORY_BYTES = 4 << 20   # per session; a step moving one item is ~1 KB, Smart Layout on 1,000 items ~1 MB
+
+Record = Tuple
+Patch = Tuple[int, Tuple[Record, ...], Tuple[Record, ...]]   # (first slot, records before, records after)
+_record = itemgetter(*ITEM_FIELDS)
+
+
+def _patch_bytes(patch: Patch) -> int:
+    """Estimated size of a patch. Both sides are counted, and so is every field value,
+    though colour strings are mostly shared: an overestimate, never an underestimate."""
+    _, old, new = patch
+    return sys.getsizeof(patch) + sys.getsizeof(old) + sys.getsizeof(new) \
+        + sum(sys.getsizeof(r) + sum(map(sys.getsizeof, r)) for r in old + new)
+
+class EditHistory:
+    """Bounded undo/redo over a list of item dicts; see the module docstring."""
+    def __init__(self, items: Iterable[Dict] = (), depth: int = HISTORY_DEPTH, max_bytes: int = HISTORY_BYTES):
+        self.depth, self.max_bytes = depth, max_bytes
+        self._scene: Tuple[Record, ...] = tuple(_record(it) for it in items)
+        self._undo: Deque[Tuple[Patch, int]] = deque()
+        self._redo: List[Tuple[Patch, int]] = []
+        self.nbytes = 0
+
+    @property
+    def undo_steps(self) -> int:
+        return len(self._undo)
+
+    @property
+    def redo_steps(self) -> int:
+        return len(self._redo)
+
+    def items(self) -> List[Dict]:
+        """The current state as fresh item dicts, safe to edit in place."""
+        return [dict(zip(ITEM_FIELDS, r)) for r in self._scene]
+
+    def commit(self, items: List[Dict]) -> bool:
+        """Record items as the current state if they differ from it; returns whether a step was added."""
+        old, n, m = self._scene, len(self._scene), len(items)
+        lo = 0
+        while lo < min(n, m) and old[lo] == _record(items[lo]):
+            lo += 1
+        if lo == n == m:
+            return False
+        hi = 0
+        while hi < min(n, m) - lo and old[n-1-hi] == _record(items[m-1-hi]):
+            hi += 1
+        patch = (lo, old[lo:n-hi], tuple(_record(it) for it in items[lo:m-hi]))
+        self._scene = old[:lo] + patch[2] + old[n-hi:]
+        self.nbytes -= sum(cost for _, cost in self._redo)
+        self._redo.clear()
+        cost = _patch_bytes(patch)
+        self._undo.append((patch, cost))
+        self.nbytes += cost
+        # a step bigger than the whole budget goes too: nothing older could be reached without it
+        while self._undo and (len(self._undo) > self.depth or self.nbytes > self.max_bytes):
+            self.nbytes -= self._undo.popleft()[1]
+        return True
+
+    def undo(self) -> bool:
+        if not self._undo:
+            return False
+        step = self._undo.pop()
+        start, old, new = step[0]
+        self._scene = self._scene[:start] + old + self._scene[start+len(new):]
+        self._redo.append(step)
+        return True
+
+    def redo(self) -> bool:
+        if not self._redo:
+            return False
+        step = self._redo.pop()
+        start, old, new = step[0]
+        self._scene = self._scene[:start] + new + self._scene[start+len(old):]
+        self._undo.append(step)
+        return True
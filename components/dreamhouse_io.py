@@ -0,0 +1,359 @@
+"""
+Dreamhouse scene files.
+
+Two formats, read through the same validation:
+  * JSON: {"settings": {...}, "items": [{...}, ...]}, the original Save/Load format.
+    It is read a value at a time and the items checked in blocks, so neither the
+    whole text nor a second copy of every item dict is held at once.
+  * DHS: b"DHS", a version byte and a flags byte, then a length-prefixed JSON header
+    (settings, item count and the interned kind/string tables), then the items as one
+    little-endian NumPy structured array (ITEM_DTYPE), zlib-compressed when flagged.
+    It is read in chunks, so a large upload is never held decompressed all at once.
+
+Both load to the same (settings, items) the page keeps in session state; items are
+plain dicts in Item field order, so a scene round-trips exactly between the formats.
+"""
+from __future__ import annotations
+
+import codecs, io, json, math, re, struct, zlib
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from components.dreamhouse import CANVAS_H, CANVAS_W, CATALOG, FLOOR_MODES, WALL_MODES
+
+MAGIC = b"DHS"
+VERSION = 1
+FLAG_ZLIB = 1
+ZLIB_LEVEL = 1   # level 6 is ~5x slower for ~15% smaller files
+CHUNK = 1 << 16
+JSON_BLOCK = 4096   # JSON items converted and checked per block
+ITEM_DTYPE = np.dtype([("kind", "<u2"), ("x", "<i4"), ("y", "<i4"), ("w", "<i4"), ("h", "<i4"),
+                       ("rot", "<f8"), ("c1", "<u4"), ("c2", "<u4"), ("extra", "<u4")])
+ITEM_FIELDS = ("kind", "x", "y", "w", "h", "rot", "c1", "c2", "extra")
+ITEM_FIELD_SET = frozenset(ITEM_FIELDS)
+INT_MAX = 2**31 - 1
+# the editor's slider ranges: anything outside them could not be selected and edited
+ITEM_LIMITS = {"w": (40, 800), "h": (40, 500), "rot": (-45.0, 45.0)}
+# positions are clamped instead: Duplicate and the old Smart Layout put items past the canvas edge
+POSITION_LIMITS = {"x": (0, CANVAS_W), "y": (0, CANVAS_H)}
+MAX_STRING = 64
+HEX_RE = re.compile(r"#(?:[0-9a-fA-F]{3}){1,2}")
+SETTING_CHECKS = {
+    "bg": "colour", "wall": "colour", "floor1": "colour", "floor2": "colour", "skirting": "colour",
+    "ambient": "colour", "wall_mode": WALL_MODES, "floor_mode": FLOOR_MODES,
+    "snap": bool, "ambient_power": (0.0, 0.6), "spot_lights": (0, 4),
+}
+
+
+def validate_settings(settings: Dict) -> Dict:
+    """Check a (possibly partial) settings dict; raises ValueError on bad input."""
+    if not isinstance(settings, dict):
+        raise ValueError("settings must be a JSON object")
+    unknown = sorted(set(settings) - set(SETTING_CHECKS))
+    if unknown:
+        raise ValueError(f"unknown setting(s): {', '.join(unknown)}")
+    out = {}
+    for k, v in settings.items():
+        check = SETTING_CHECKS[k]
+        if check == "colour":
+            ok = isinstance(v, str) and HEX_RE.fullmatch(v)
+        elif check is bool:
+            ok = isinstance(v, bool)
+        elif isinstance(check, tuple) and isinstance(check[0], str):
+            ok = v in check
+        else:
+            lo, hi = check
+            ok = isinstance(v, (int, float)) and not isinstance(v, bool) and lo <= v <= hi
+            if ok and isinstance(lo, int): ok, v = v == int(v), int(v)
+        if not ok:
+            raise ValueError(f"setting {k!r} has invalid value {v!r}")
+        out[k] = v
+    return out
+
+def _bad_item(items: List, first: int = 0) -> ValueError:
+    """The error for the first malformed item dict (the slow, per-item path of _columns)."""
+    for n, it in enumerate(items, first):
+        if not isinstance(it, dict):
+            return ValueError(f"item {n+1}: must be a JSON object")
+        unknown = sorted(set(it) - set(ITEM_FIELDS))
+        if unknown:
+            return ValueError(f"item {n+1}: unknown field(s) {', '.join(unknown)}")
+        missing = [k for k in ITEM_FIELDS[:-1] if k not in it]
+        if missing:
+            return ValueError(f"item {n+1}: missing field(s) {', '.join(missing)}")
+        if not all(isinstance(it.get(k, ""), str) for k in ("kind", "c1", "c2", "extra")):
+            return ValueError(f"item {n+1}: kind, c1, c2 and extra must be strings")
+        nums = [it[k] for k in ("x", "y", "w", "h", "rot")]
+        if not all(type(v) in (int, float) and math.isfinite(v) for v in nums) \
+                or any(v != int(v) or abs(v) > INT_MAX for v in nums[:4]):
+            return ValueError(f"item {n+1}: x, y, w and h must be whole numbers and rot a number")
+    return ValueError("malformed items")
+
+def _columns(items: List[Dict], first: int = 0) -> Tuple[np.ndarray, List[str], List[str]]:
+    """Item dicts -> (structured array, kinds table, strings table), interning kinds and strings."""
+    try:
+        if not all(type(it) is dict and it.keys() <= ITEM_FIELD_SET for it in items):
+            raise TypeError
+        text = [[it[k] for it in items] for k in ("kind", "c1", "c2")] + [[it.get("extra", "") for it in items]]
+        nums = [np.array([it[k] for it in items], np.float64) for k in ("x", "y", "w", "h", "rot")]
+        if not all(set(map(type, col)) <= {str} for col in text) \
+                or not all(set(map(type, (it[k] for it in items))) <= {int, float} for k in ("x", "y", "w", "h", "rot")) \
+                or not all(np.isfinite(a).all() for a in nums) \
+                or any(((a != np.floor(a)) | (np.abs(a) > INT_MAX)).any() for a in nums[:4]):
+            raise TypeError
+    except (TypeError, KeyError, ValueError):
+        raise _bad_item(items, first) from None
+    kinds: Dict[str, int] = {}
+    strings: Dict[str, int] = {}
+    table = np.zeros(len(items), ITEM_DTYPE)
+    table["kind"] = [kinds.setdefault(k, len(kinds)) for k in text[0]]
+    for f, col in zip(("c1", "c2", "extra"), text[1:]):
+        table[f] = [strings.setdefault(v, len(strings)) for v in col]
+    for f, a in zip(("x", "y", "w", "h", "rot"), nums):
+        table[f] = a
+    return table, list(kinds), list(strings)
+
+def _checker(kinds: List[str], strings: List[str], limits: Dict | None = None):
+    """
+    Vectorised validation of blocks of item records against these tables; raises
+    ValueError naming the first bad item, else returns the block with x/y clamped.
+    """
+    limits = {**ITEM_LIMITS, **POSITION_LIMITS, **(limits or {})}
+    positions = {f: limits.pop(f) for f in POSITION_LIMITS}
+    kind_ok = np.array([k in CATALOG for k in kinds] + [False])
+    is_hex = np.array([bool(HEX_RE.fullmatch(s)) for s in strings] + [False])
+    # a Rug's second colour is unused (its default is the pattern name), so it is free-form
+    rug = kinds.index("Rug") if "Rug" in kinds else -1
+
+    def check(table: np.ndarray, first: int = 0) -> np.ndarray:
+        def fail(mask, what):
+            bad = np.flatnonzero(mask)
+            if bad.size:
+                raise ValueError(f"item {first + int(bad[0]) + 1}: {what}")
+        fail(table["kind"] >= len(kinds), "kind index out of range")
+        for f in ("c1", "c2", "extra"):
+            fail(table[f] >= len(strings), f"{f} index out of range")
+        fail(~kind_ok[table["kind"]], "unknown kind")
+        for f, (lo, hi) in limits.items():
+            col = table[f]
+            fail(~((col >= lo) & (col <= hi)), f"{f} outside {lo}..{hi}")   # NaN fails too
+        fail(~is_hex[table["c1"]], "c1 is not a #rrggbb colour")
+        fail(~is_hex[table["c2"]] & (table["kind"] != rug), "c2 is not a #rrggbb colour")
+        if any(((table[f] < lo) | (table[f] > hi)).any() for f, (lo, hi) in positions.items()):
+            table = table.copy()   # blocks read from a DHS stream are read-only views
+            for f, (lo, hi) in positions.items():
+                np.clip(table[f], lo, hi, out=table[f])
+        return table
+    return check
+
+def _check_tables(kinds, strings):
+    if not (isinstance(kinds, list) and isinstance(strings, list)
+            and all(isinstance(s, str) and len(s) <= MAX_STRING for s in kinds + strings)):
+        raise ValueError("bad kind/string tables")
+
+def _table(items: List[Dict], limits: Dict | None = None, first: int = 0) -> Tuple[np.ndarray, List[str], List[str]]:
+    """
+    Item dicts as a checked, position-clamped (table, kinds, strings): what a load of
+    them would give. first numbers the items in errors, for a block of a longer list.
+    """
+    table, kinds, strings = _columns(items, first)
+    _check_tables(kinds, strings)
+    return _checker(kinds, strings, limits)(table, first), kinds, strings
+
+def _items(table: np.ndarray, kinds: List[str], strings: List[str]) -> List[Dict]:
+    cols = [table[f].tolist() for f in ITEM_FIELDS]
+    cols[0] = [kinds[i] for i in cols[0]]
+    for j in (6, 7, 8):
+        cols[j] = [strings[i] for i in cols[j]]
+    return [dict(zip(ITEM_FIELDS, row)) for row in zip(*cols)]
+
+
+def dump_json(settings: Dict, items: List[Dict]) -> bytes:
+    """The scene as JSON bytes, checked and clamped as load_scene does, so it always loads back."""
+    table, kinds, strings = _table(items)
+    return json.dumps({"settings": validate_settings(settings), "items": _items(table, kinds, strings)}, indent=2).encode("utf-8")
+
+def dump_scene(settings: Dict, items: List[Dict], compress: bool = True) -> bytes:
+    """The scene as DHS bytes, checked and clamped as load_scene does, so it always loads back."""
+    settings = validate_settings(settings)
+    table, kinds, strings = _table(items)
+    header = json.dumps({"settings": settings, "count": len(table), "kinds": kinds, "strings": strings},
+                        separators=(",", ":")).encode("utf-8")
+    body = table.tobytes()
+    if compress:
+        body = zlib.compress(body, ZLIB_LEVEL)
+    return MAGIC + bytes([VERSION, FLAG_ZLIB if compress else 0]) + struct.pack("<I", len(header)) + header + body
+
+def _chunks(stream: BinaryIO, compressed: bool) -> Iterator[bytes]:
+    """The item bytes in blocks of at most CHUNK, however well they compressed."""
+    unz = zlib.decompressobj() if compressed else None
+    while True:
+        block = stream.read(CHUNK)
+        if not block:
+            break
+        if unz is None:
+            yield block
+            continue
+        while block:
+            try:
+                out = unz.decompress(block, CHUNK)
+            except zlib.error:
+                raise ValueError("corrupt compressed item data") from None
+            if out:
+                yield out
+            block = unz.unconsumed_tail
+    if unz is not None:
+        if not unz.eof:
+            raise ValueError("truncated compressed item data")
+        if unz.unused_data:
+            raise ValueError("trailing data after the items")
+
+def _load_dhs(stream: BinaryIO, limits: Dict | None) -> Tuple[Dict, List[Dict]]:
+    head = stream.read(6)
+    if len(head) < 6:
+        raise ValueError("truncated scene header")
+    version, flags, size = head[0], head[1], struct.unpack("<I", head[2:])[0]
+    if version != VERSION:
+        raise ValueError(f"unsupported scene version {version}")
+    if flags & ~FLAG_ZLIB:
+        raise ValueError("unknown scene flags")
+    try:
+        header = json.loads(stream.read(size).decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("corrupt scene header") from None
+    if not isinstance(header, dict):
+        raise ValueError("corrupt scene header")
+    settings = validate_settings(header.get("settings", {}))
+    kinds, strings, count = header.get("kinds"), header.get("strings"), header.get("count")
+    _check_tables(kinds, strings)
+    if not isinstance(count, int) or count < 0:
+        raise ValueError("bad item count")
+
+    check = _checker(kinds, strings, limits)
+    items: List[Dict] = []
+    pending = b""
+    rec = ITEM_DTYPE.itemsize
+    for block in _chunks(stream, bool(flags & FLAG_ZLIB)):
+        pending += block
+        whole = len(pending) // rec * rec
+        if whole:
+            if len(items) + whole // rec > count:
+                raise ValueError(f"more than the {count} items the header declares")
+            table = check(np.frombuffer(pending[:whole], ITEM_DTYPE), first=len(items))
+            items += _items(table, kinds, strings)
+            pending = pending[whole:]
+    if pending or len(items) != count:
+        raise ValueError(f"expected {count} items, found {len(items)}" + (" and a partial record" if pending else ""))
+    return settings, items
+
+class _JsonReader:
+    """Just enough of an incremental JSON reader to walk a scene object one value at a time."""
+    WS = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+        self._json = json.JSONDecoder()
+        self._buf, self._pos, self._eof = "", 0, False
+
+    def _more(self):
+        # read at least as much again as is buffered, so re-parsing a long value stays linear
+        block = self._stream.read(max(CHUNK, len(self._buf) - self._pos))
+        self._eof = not block
+        self._buf = self._buf[self._pos:] + self._utf8.decode(block, final=self._eof)
+        self._pos = 0
+
+    def peek(self) -> str:
+        """The next character that is not whitespace, '' at the end of the stream."""
+        while True:
+            self._pos = self.WS.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or self._eof:
+                return self._buf[self._pos:self._pos+1]
+            self._more()
+
+    def take(self, expected: str) -> str:
+        """Consume the next character, which must be one of expected."""
+        c = self.peek()
+        if not c or c not in expected:
+            raise ValueError(f"not a scene file: expected {' or '.join(map(repr, expected))}, found {c or 'the end'!r}")
+        self._pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                v, end = self._json.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise ValueError(f"not a scene file: {e.msg}") from None
+            else:
+                # a number could continue in the next block: a value ends before the buffer does
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return v
+            self._more()
+
+def _json_items(r: _JsonReader, limits: Dict | None) -> List[Dict]:
+    """The items array at r, converted and checked JSON_BLOCK items at a time."""
+    r.take("[")
+    items: List[Dict] = []
+    if r.peek() == "]":
+        r.take("]")
+        return items
+    block = []
+    while True:
+        block.append(r.value())
+        end = r.take(",]") == "]"
+        if end or len(block) == JSON_BLOCK:
+            items += _items(*_table(block, limits, first=len(items)))
+            block = []
+        if end:
+            return items
+
+def _load_json(stream: BinaryIO, limits: Dict | None) -> Tuple[Dict, List[Dict]]:
+    shape = ValueError("expected {\"settings\": {...}, \"items\": [...]}")
+    r = _JsonReader(stream)
+    if r.peek() != "{":
+        raise shape
+    r.take("{")
+    settings: Dict = {}
+    items: List[Dict] = []
+    if r.peek() == "}":
+        r.take("}")
+    else:
+        while True:
+            if r.peek() != '"':
+                raise ValueError("not a scene file: expected a property name")
+            key = r.value()
+            r.take(":")
+            if key == "items":
+                if r.peek() != "[":
+                    raise shape
+                items = _json_items(r, limits)
+            elif key == "settings":
+                settings = r.value()
+            else:
+                r.value()
+            if r.take(",}") == "}":
+                break
+    if r.peek():
+        raise ValueError("not a scene file: extra data after the scene")
+    return validate_settings(settings), items
+
+def load_scene(stream: BinaryIO | bytes, limits: Dict | None = None) -> Tuple[Dict, List[Dict]]:
+    """
+    Read a DHS or JSON scene; returns validated (settings, items) or raises ValueError.
+    Positions past the canvas are clamped onto it; limits overrides entries of
+    ITEM_LIMITS or POSITION_LIMITS, e.g. x/y for a canvas bigger than the editor's.
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if stream.read(len(MAGIC)) == MAGIC:
+        return _load_dhs(stream, limits)
+    stream.seek(0)
+    try:
+        return _load_json(stream, limits)
+    except UnicodeDecodeError as e:
+        raise ValueError(f"not a scene file: {e}") from None
@@ -0,0 +1,221 @@
+"""
+SVG export of Dreamhouse scenes.
+
+Everything in a scene is drawn from primitives, so instead of rasterizing, the same
+drawing code runs against SvgDraw, which records Pillow's ImageDraw calls as SVG
+elements. Furniture goes through the catalog's @drawn functions (each distinct item
+once, in <defs>, then placed by <use>), the wall and floor patterns become <pattern>
+tiles of one period, the horizon shadow and lighting become gradients and the drop
+shadows an SVG blur filter. A furnished room is a few tens of KB at any print size.
+
+The SVG follows the drawing calls rather than re-deriving the raster pipeline, so it
+differs from the PNG in raster-only details: anti-aliasing, rotation resampling, the
+shadow blur (done at 1/4 size), and inside a sprite, shapes over a translucent part
+blend with it rather than replacing it (a sofa's 3px outline rim, say).
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+from PIL import ImageColor
+
+from components.dreamhouse import (CANVAS_H, CANVAS_W, FLOOR_PERIODS, GRID, SHADOW_OFFSET, TERRAZZO_TILE, WALL_INSETS,
+                                   WALL_PERIODS, _floor_shapes, _terrazzo_chips, _wall_shapes, draw_item, item_key,
+                                   title_chip, try_font, wall_area)
+
+SPOT_STOPS = 9   # a spotlight's alpha grows with the square of the distance: sampled, not linear
+
+
+def _n(v: float) -> str:
+    return format(round(v, 2), "g")
+
+def _rgba(colour) -> Tuple[int,int,int,int]:
+    if isinstance(colour, str):
+        colour = ImageColor.getrgb(colour)
+    return tuple(colour) if len(colour) == 4 else (*colour, 255)
+
+class SvgDraw:
+    """
+    Records the ImageDraw calls the Dreamhouse drawing functions make as SVG elements.
+    Coordinates follow Pillow's: integer points are pixel centres, boxes include their
+    right and bottom pixels, and outlines are drawn inside the box.
+
+    With pasted=True, translucent colours come out as they look once the layer has
+    been pasted through its own alpha (media_utils.self_pasted), as every cached
+    sprite and room pattern is. On an RGBA image ImageDraw replaces the pixels a
+    translucent shape covers instead of blending into them, so where such a layer is
+    pasted over a plain colour (the room patterns over the background), that colour
+    shows through: given under, each translucent shape goes over an opaque copy in it.
+    """
+    def __init__(self, pasted: bool = False, under: str | None = None):
+        self.pasted, self.under = pasted, under
+        self.parts: List[str] = []
+
+    def _paint(self, attr: str, colour) -> str:
+        r, g, b, a = _rgba(colour)
+        if self.pasted and a < 255:
+            r, g, b, a = r*a//255, g*a//255, b*a//255, a*a//255
+        return f' {attr}="#{r:02x}{g:02x}{b:02x}"' + (f' {attr}-opacity="{_n(a/255)}"' if a < 255 else "")
+
+    def _shape(self, element: str, attr: str, colour, rest: str = ""):
+        if self.under is not None and _rgba(colour)[3] < 255:
+            self.parts.append(f'{element}{self._paint(attr, self.under)}{rest}/>')
+        self.parts.append(f'{element}{self._paint(attr, colour)}{rest}/>')
+
+    def _box(self, tag: str, xy, fill, outline, width: int, geometry):
+        # geometry(x, y, w, h, inset) -> attributes; an outline is stroked along the box inset by half its width
+        x0, y0, x1, y1 = xy
+        w, h = x1 - x0 + 1, y1 - y0 + 1
+        if fill is not None:
+            self._shape(f'<{tag}{geometry(x0, y0, w, h, 0)}', "fill", fill)
+        if outline is not None and width > 0:
+            i = width / 2
+            self._shape(f'<{tag}{geometry(x0+i, y0+i, w-width, h-width, i)}', "stroke", outline,
+                        f' fill="none" stroke-width="{_n(width)}"')
+
+    def rectangle(self, xy, fill=None, outline=None, width: int = 1):
+        self._box("rect", xy, fill, outline, width,
+                  lambda x, y, w, h, i: f' x="{_n(x)}" y="{_n(y)}" width="{_n(w)}" height="{_n(h)}"')
+
+    def rounded_rectangle(self, xy, radius: float = 0, fill=None, outline=None, width: int = 1, **_):
+        self._box("rect", xy, fill, outline, width,
+                  lambda x, y, w, h, i: f' x="{_n(x)}" y="{_n(y)}" width="{_n(w)}" height="{_n(h)}" rx="{_n(max(0, radius - i))}"')
+
+    def ellipse(self, xy, fill=None, outline=None, width: int = 1):
+        self._box("ellipse", xy, fill, outline, width,
+                  lambda x, y, w, h, i: f' cx="{_n(x + w/2)}" cy="{_n(y + h/2)}" rx="{_n(w/2)}" ry="{_n(h/2)}"')
+
+    def line(self, xy, fill=None, width: int = 1, **_):
+        x0, y0, x1, y1 = xy
+        self._shape(f'<line x1="{_n(x0+.5)}" y1="{_n(y0+.5)}" x2="{_n(x1+.5)}" y2="{_n(y1+.5)}"', "stroke", fill,
+                    f' stroke-width="{_n(width)}"')
+
+    def polygon(self, xy, fill=None, outline=None, width: int = 1):
+        element = '<polygon points="' + " ".join(f"{_n(x+.5)},{_n(y+.5)}" for x, y in xy) + '"'
+        if fill is not None:
+            self._shape(element, "fill", fill)
+        if outline is not None:
+            self._shape(element, "stroke", outline, f' fill="none" stroke-width="{_n(width)}"')
+
+    def svg(self) -> str:
+        return "".join(self.parts)
+
+
+def _pattern(pid: str, tile: Tuple[int,int], origin: Tuple[int,int], content: str, yscale: float = 1.0) -> str:
+    transform = f"translate({origin[0]} {origin[1]})" + (f" scale(1 {_n(yscale)})" if yscale != 1.0 else "")
+    return (f'<pattern id="{pid}" patternUnits="userSpaceOnUse" width="{tile[0]}" height="{tile[1]}" '
+            f'patternTransform="{transform}">{content}</pattern>')
+
+def _periods(size: Tuple[int,int], background: str, under: str, draw_shapes, offset: Tuple[int,int]) -> str:
+    """One period of a surface pattern: drawn on a 3-period canvas and shifted so the middle one lands on the tile."""
+    d = SvgDraw(pasted=True, under=under)
+    d.rectangle((0, 0, size[0]-1, size[1]-1), fill=background)
+    draw_shapes(d)
+    return f'<g transform="translate({-offset[0]} {-offset[1]})">{d.svg()}</g>'
+
+def _wall_pattern(mode: str, c: str, h: int, bg: str, origin: Tuple[int,int]) -> str:
+    pw, ph = WALL_PERIODS[mode]
+    i = WALL_INSETS.get(mode, 0)
+    size = (3*pw, h if ph is None else 3*ph)
+    content = _periods(size, c, bg, lambda d: _wall_shapes(d, size, mode), (pw+i, 0 if ph is None else ph+i))
+    return _pattern("wall", (pw, h if ph is None else ph), origin, content)
+
+def _floor_pattern(mode: str, c1: str, c2: str, top: int, bg: str) -> str:
+    if mode == "Terrazzo":
+        t = TERRAZZO_TILE
+        d = SvgDraw(pasted=True, under=bg)
+        d.rectangle((0, 0, t-1, t-1), fill=c2)
+        _terrazzo_chips(d, c1)
+        return _pattern("floor", (t, t), (0, top), d.svg(), 0.9)
+    pw, ph = FLOOR_PERIODS.get(mode, FLOOR_PERIODS["Planks"])
+    size = (3*pw, 3*ph)
+    content = _periods(size, c2, bg, lambda d: _floor_shapes(d, size, mode, c1, c2), (pw, ph))
+    return _pattern("floor", (pw, ph), (0, top), content, 0.9)
+
+def _room(settings: Dict, size: Tuple[int,int], defs: List[str]) -> str:
+    """Background, wall, floor, horizon shadow and skirting, as room_region draws them."""
+    W, H = size
+    floor_y, wall_h = int(H*0.55), int(H*0.62)
+    out = [f'<rect width="{W}" height="{H}" fill="{settings["bg"]}"/>']
+    x0, y0, x1, y1 = area = wall_area(settings["wall_mode"], W, wall_h)
+    if area != (0, 0, W, wall_h) or settings["wall_mode"] not in WALL_PERIODS:
+        out.append(f'<rect width="{W}" height="{wall_h}" fill="{settings["wall"]}"/>')
+    if settings["wall_mode"] in WALL_PERIODS:
+        defs.append(_wall_pattern(settings["wall_mode"], settings["wall"], wall_h, settings["bg"], (x0, y0)))
+        out.append(f'<rect x="{x0}" y="{y0}" width="{x1-x0}" height="{y1-y0}" fill="url(#wall)"/>')
+    defs.append(_floor_pattern(settings["floor_mode"], settings["floor1"], settings["floor2"], floor_y, settings["bg"]))
+    out.append(f'<rect y="{floor_y}" width="{W}" height="{int(H*0.45)}" fill="url(#floor)"/>')
+    # the horizon band is grey v at alpha v, v rising linearly to 120 at the floor line
+    defs.append(f'<linearGradient id="horizon" x1="0" y1="0" x2="0" y2="1"><stop offset="0" stop-color="#000000" stop-opacity="0"/>'
+                f'<stop offset="1" stop-color="#787878" stop-opacity="{_n(120/255)}"/></linearGradient>')
+    out.append(f'<rect y="{floor_y-80}" width="{W}" height="80" fill="url(#horizon)"/>')
+    out.append(f'<rect y="{floor_y-6}" width="{W}" height="7" fill="{settings["skirting"]}"/>')
+    return "".join(out)
+
+def _items(items: List[Dict], defs: List[str]) -> str:
+    """Each distinct item drawn once into <defs>; every item placed as its shadow and body, in list order."""
+    ids: Dict[Tuple, str] = {}
+    out = []
+    for it in items:
+        kind, w, h, c1, c2, extra, rot = item_key(it)
+        key = (kind, w, h, c1, c2, extra)
+        if key not in ids:
+            ids[key] = f"i{len(ids)}"
+            body = draw_item(kind, w, h, c1, c2, extra, draw=SvgDraw(pasted=True))
+            defs.append(f'<g id="{ids[key]}">{body.svg()}</g>')
+        place = lambda x, y: f'translate({_n(x)} {_n(y)}) rotate({_n(-rot)}) translate({_n(-w/2)} {_n(-h/2)})'
+        out.append(f'<use xlink:href="#{ids[key]}" transform="{place(it["x"]+SHADOW_OFFSET[0], it["y"]+SHADOW_OFFSET[1])}" filter="url(#shadow)"/>')
+        out.append(f'<use xlink:href="#{ids[key]}" transform="{place(it["x"], it["y"])}"/>')
+    return "".join(out)
+
+def _overlays(settings: Dict, size: Tuple[int,int], defs: List[str]) -> str:
+    """Ambient light, grid guides (when snapping) and the title chip, as ambient_region, grid_region and title_chip draw them."""
+    W, H = size
+    out = []
+    power = settings["ambient_power"]
+    if power > 0:
+        top = H*0.6
+        defs.append(f'<linearGradient id="sun" gradientUnits="userSpaceOnUse" x1="0" y1="0" x2="0" y2="{_n(top)}">'
+                    f'<stop offset="0" stop-color="{settings["ambient"]}" stop-opacity="{_n(power)}"/>'
+                    f'<stop offset="1" stop-color="{settings["ambient"]}" stop-opacity="0"/></linearGradient>')
+        out.append(f'<rect width="{W}" height="{int(top)}" fill="url(#sun)"/>')
+        n = settings["spot_lights"]
+        if n:
+            # spot_cone: v rises linearly from the centre to power*200 at the rim; grey red*v/255 at alpha v²/255
+            red = ImageColor.getrgb(settings["ambient"])[0]
+            stops = []
+            for i in range(SPOT_STOPS):
+                t = i / (SPOT_STOPS - 1)
+                v = t * power * 200
+                g = round(red * v / 255)
+                stops.append(f'<stop offset="{_n(t)}" stop-color="#{g:02x}{g:02x}{g:02x}" stop-opacity="{_n(v*v/255/255)}"/>')
+            defs.append(f'<radialGradient id="spot">{"".join(stops)}</radialGradient>')
+            rad = int(H*0.66)
+            cy = int(H*0.10) + int(rad*0.2)
+            out += [f'<circle cx="{int(W*(i+1)/(n+1))}" cy="{cy}" r="{rad}" fill="url(#spot)"/>' for i in range(n)]
+    if settings["snap"]:
+        defs.append(f'<pattern id="grid" patternUnits="userSpaceOnUse" width="{GRID}" height="{GRID}">'
+                    f'<path d="M0.5 0V{GRID}" stroke="#ffffff" stroke-opacity="{_n(20/255)}"/>'
+                    f'<path d="M0 0.5H{GRID}" stroke="#ffffff" stroke-opacity="{_n(20/255)}"/></pattern>')
+        out.append(f'<rect width="{W}" height="{H}" fill="url(#grid)"/>')
+    chip = title_chip()
+    cw, ch = chip.image.size
+    out.append(f'<rect x="{chip.x}" y="{chip.y}" width="{cw}" height="{ch}" rx="{_n(ch/2)}" fill="#ffffff" fill-opacity="{_n(160/255)}"/>')
+    ascent = try_font(26).getmetrics()[0]
+    out.append(f'<text x="{chip.x+10}" y="{chip.y+4+ascent}" font-family="Arial, DejaVu Sans, sans-serif" font-size="26" '
+               f'fill="#141414" fill-opacity="{_n(220/255)}">{escape("Dreamhouse Designer")}</text>')
+    return "".join(out)
+
+def scene_svg(settings: Dict, items: List[Dict], size: Tuple[int,int] = (CANVAS_W, CANVAS_H)) -> str:
+    """The scene render_scene draws, as an SVG document of the given canvas size."""
+    W, H = size
+    defs = ['<filter id="shadow" x="-50%" y="-50%" width="200%" height="200%" color-interpolation-filters="sRGB">'
+            # drop_shadow: grey 0.6× luminance at alpha of the same, blurred 8px, then squared
+            '<feColorMatrix type="matrix" values="' + " ".join([".1794 .3522 .0684 0 0"] * 4) + '"/>'
+            '<feGaussianBlur stdDeviation="8"/>'
+            '<feComponentTransfer>' + "".join(f'<feFunc{c} type="gamma" exponent="2"/>' for c in "RGBA") + '</feComponentTransfer>'
+            '</filter>']
+    body = _room(settings, size, defs) + _items(items, defs) + _overlays(settings, size, defs)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{W}" height="{H}" viewBox="0 0 {W} {H}"><defs>{"".join(defs)}</defs>{body}</svg>')
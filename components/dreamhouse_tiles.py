@@ -0,0 +1,138 @@
+"""
+Tiled Dreamhouse renderer for canvases far bigger than the editor's (no Streamlit needed).
+
+    python -m components.dreamhouse_tiles house.dhs -o plan.png [--size 8400x5400] [--scale 2] [--tile 512] [--workers N] [--compress 0-9]
+
+The scene (.dhs or .json, as saved by the page) is laid out on a size canvas: the
+room base scales with its height like the editor's does, items keep their pixel
+sizes at their x/y. The canvas is cut into tile×tile squares and rendered band by
+band: a band's item layers are prepared on a thread pool (each distinct item once),
+then its tiles are rendered concurrently, each compositing only the items that reach
+it, and the band is appended to the PNG before the next-but-one is started. Peak
+memory is about two bands, never the whole canvas. Pillow releases the GIL while it
+composites, resizes and blurs, so threads scale without pickling the layers.
+
+At the editor's canvas size the result equals render_scene(...) (upscaled() for
+scale > 1) pixel for pixel.
+"""
+from __future__ import annotations
+
+import argparse, os, sys, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from components.dreamhouse import (CANVAS_H, CANVAS_W, SHADOW_OFFSET, SHADOW_REDUCE, Box, ItemIndex, _intersect,
+                                   _overlaps, item_key, item_sprites, prepare_layers, scene_region)
+from components.dreamhouse_io import load_scene
+from components.media_utils import PngStreamWriter, Sprite, upscaled
+
+# page defaults (pages/2_Dreamhouse_Designer.py)
+DEFAULT_SETTINGS = {"bg": "#ffffff", "wall": "#ffd1dc", "wall_mode": "Wainscot", "floor_mode": "Herringbone",
+                    "floor1": "#e8d4c5", "floor2": "#f4eee9", "skirting": "#ffffff", "snap": True,
+                    "ambient": "#ffd1dc", "ambient_power": 0.18, "spot_lights": 2}
+TILE = 512
+SHADOW_REACH = 2*SHADOW_REDUCE + 2   # how far a drop shadow can overhang its offset body box (reduce/rotate rounding)
+LANCZOS_MARGIN = 4                   # source px an upscaled tile needs past its edges (LANCZOS reaches 3)
+
+
+def _band_sprites(index: ItemIndex, items: List[Dict], box: Box, pool: ThreadPoolExecutor) -> List[Sprite]:
+    """Placed sprites, in draw order, of every item that can reach box."""
+    dx, dy = SHADOW_OFFSET
+    x0, y0, x1, y1 = box
+    hits = index.overlapping((x0 - dx - SHADOW_REACH, y0 - dy - SHADOW_REACH, x1 + SHADOW_REACH, y1 + SHADOW_REACH))
+    layers = prepare_layers((item_key(items[i]) for i in hits), pool)
+    return [s for i in hits for s in item_sprites(items[i], layers[item_key(items[i])])]
+
+def _render_tile(settings: Dict, sprites: List[Sprite], size: Tuple[int,int], box: Box, scale: int) -> Image.Image:
+    m = LANCZOS_MARGIN if scale > 1 else 0
+    src = _intersect((box[0]-m, box[1]-m, box[2]+m, box[3]+m), (0, 0, *size))
+    img = scene_region(settings, [s for s in sprites if _overlaps(s.box, src)], size, src)
+    if scale > 1:
+        x, y = (box[0]-src[0])*scale, (box[1]-src[1])*scale
+        img = upscaled(img, scale).crop((x, y, x + (box[2]-box[0])*scale, y + (box[3]-box[1])*scale))
+    return img
+
+def render_tiled(settings: Dict, items: List[Dict], out: Path | str | BinaryIO | None = None,
+                 size: Tuple[int,int] = (CANVAS_W, CANVAS_H), scale: int = 1, tile: int = TILE,
+                 workers: Optional[int] = None, compress_level: int = 6) -> Image.Image | None:
+    """
+    Render the scene on a size canvas, scaled by scale, tile by tile. With out (a path
+    or binary stream) the PNG is streamed there and None returned; otherwise the bands
+    are assembled into one image, which is returned.
+    """
+    W, H = size
+    if W < 1 or H < 1 or scale < 1 or tile < 1:
+        raise ValueError("size, scale and tile must be positive")
+    index = ItemIndex()
+    index.sync(items)
+    workers = max(1, workers or os.cpu_count() or 1)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dh-tile") as pool:
+        def band(y0: int) -> List[Tuple[int, Future]]:
+            y1 = min(y0 + tile, H)
+            sprites = _band_sprites(index, items, (0, y0, W, y1), pool)
+            return [(x0, pool.submit(_render_tile, settings, sprites, size, (x0, y0, min(x0 + tile, W), y1), scale))
+                    for x0 in range(0, W, tile)]
+
+        def bands():
+            ahead = band(0)
+            for y0 in range(0, H, tile):
+                tiles, ahead = ahead, (band(y0 + tile) if y0 + tile < H else None)
+                strip = Image.new("RGBA", (W*scale, (min(y0 + tile, H) - y0)*scale))
+                for x0, fut in tiles:
+                    strip.paste(fut.result(), (x0*scale, 0))
+                yield y0, strip
+
+        if out is None:
+            canvas = Image.new("RGBA", (W*scale, H*scale))
+            for y0, strip in bands():
+                canvas.paste(strip, (0, y0*scale))
+            return canvas
+        stream = open(out, "wb") if isinstance(out, (str, Path)) else out
+        try:
+            with PngStreamWriter(stream, (W*scale, H*scale), compress_level) as png:
+                for _, strip in bands():
+                    png.write(strip)
+        finally:
+            if stream is not out:
+                stream.close()
+    return None
+
+
+def _dims(text: str) -> Tuple[int,int]:
+    try:
+        w, h = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected WIDTHxHEIGHT, e.g. 8400x5400") from None
+    return w, h
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m components.dreamhouse_tiles", description="Render a Dreamhouse scene to a large PNG, tile by tile.")
+    ap.add_argument("scene", help="scene file (.dhs or .json)")
+    ap.add_argument("-o", "--out", default="dreamhouse.png", help="output PNG (default: dreamhouse.png)")
+    ap.add_argument("--size", type=_dims, default=(CANVAS_W, CANVAS_H), help=f"canvas WIDTHxHEIGHT (default: {CANVAS_W}x{CANVAS_H})")
+    ap.add_argument("--scale", type=int, default=1, help="integer upscale of the canvas (default: 1)")
+    ap.add_argument("--tile", type=int, default=TILE, help=f"tile edge in canvas px (default: {TILE})")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="render threads (default: CPU count)")
+    ap.add_argument("--compress", type=int, choices=range(10), default=6, metavar="0-9",
+                    help="zlib level; 1 writes ~3x faster, ~30%% bigger (default: 6)")
+    args = ap.parse_args(argv)
+
+    W, H = args.size
+    try:
+        with open(args.scene, "rb") as f:
+            settings, items = load_scene(f, limits={"x": (0, W), "y": (0, H)})
+        t = time.perf_counter()
+        render_tiled({**DEFAULT_SETTINGS, **settings}, items, args.out, args.size, args.scale, args.tile, args.workers, args.compress)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"rendered {len(items)} items to {args.out} ({W*args.scale}x{H*args.scale}) in {time.perf_counter() - t:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
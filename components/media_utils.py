@@ -1,8 +1,15 @@
 from __future__ import annotations
+import struct, threading, zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import BinaryIO, Callable, Hashable, Iterable, Optional, Tuple
+import numpy as np
 from PIL import Image
 
+EXPORT_CACHE_SIZE = 8   # encoded PNGs kept per process (a 3x Story export is ~10-20 MB)
+
 def load_image(path: Path | str, fallback_color: str = "#ffffff", size: tuple[int,int] | None = None) -> Image.Image:
     """Load an image if present; otherwise return a plain fallback canvas."""
     p = Path(path)
@@ -14,15 +21,145 @@ def load_image(path: Path | str, fallback_color: str = "#ffffff", size: tuple[in
     bg = Image.new("RGBA", (w, h), fallback_color)
     return bg
 
-def compose(base: Image.Image, layers: Iterable[Image.Image]) -> Image.Image:
-    """Alpha-composite a stack of RGBA layers onto base."""
-    out = base.copy()
-    for layer in layers:
-        out.alpha_composite(layer)
+@dataclass
+class Sprite:
+    """An RGBA image placed with its top-left corner at (x, y) on a larger canvas.
+
+    `masked` reproduces the old `blank().paste(img, xy, img)` idiom: the image is first
+    pasted through its own alpha onto transparency, which softens semi-transparent edges.
+    """
+    image: Image.Image
+    x: int = 0
+    y: int = 0
+    masked: bool = False
+
+    @classmethod
+    def centered(cls, image: Image.Image, center: Tuple[int,int], masked: bool = False) -> "Sprite":
+        return cls(image, int(center[0] - image.width/2), int(center[1] - image.height/2), masked)
+
+    @property
+    def box(self) -> Tuple[int,int,int,int]:
+        return self.x, self.y, self.x + self.image.width, self.y + self.image.height
+
+def self_pasted(img: Image.Image) -> Image.Image:
+    """img pasted through its own alpha onto transparency (what Sprite(masked=True) blends)."""
+    out = Image.new("RGBA", img.size, (0,0,0,0))
+    out.paste(img, (0, 0), img)
     return out
 
+def composite_sprites(base: Image.Image, sprites: Iterable[Sprite], in_place: bool = False) -> Image.Image:
+    """Alpha-composite sprites in order, blending only the canvas region each one covers.
+
+    Sprites are clipped to the canvas, so they may hang off any edge (or miss it entirely).
+    """
+    out = base if in_place else base.copy()
+    W, H = out.size
+    for s in sprites:
+        x0, y0, x1, y1 = max(s.x, 0), max(s.y, 0), min(s.box[2], W), min(s.box[3], H)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        img = s.image if s.image.mode == "RGBA" else s.image.convert("RGBA")
+        if (x0, y0, x1, y1) != s.box:
+            img = img.crop((x0 - s.x, y0 - s.y, x1 - s.x, y1 - s.y))
+        out.alpha_composite(self_pasted(img) if s.masked else img, (x0, y0))
+    return out
+
+def trimmed(img: Image.Image) -> Sprite:
+    """A full-canvas layer cropped to the bbox of its non-transparent pixels (0×0 if empty)."""
+    box = img.getbbox() or (0, 0, 0, 0)
+    return Sprite(img.crop(box), box[0], box[1])
+
+def compose(base: Image.Image, layers: Iterable[Image.Image | Sprite]) -> Image.Image:
+    """Alpha-composite a stack of RGBA layers (full-size images or placed sprites) onto base.
+
+    Sprites only blend the box they cover, so trim cached full-canvas layers once (see
+    `trimmed`) rather than re-blending their empty margins; benchmarks/bench_compose.py
+    compares this against the plain alpha_composite chain.
+    """
+    out = base
+    for layer in layers:
+        if isinstance(layer, Sprite) and (layer.masked or layer.box != (0, 0, *base.size)):
+            if out is base: out = base.copy()
+            composite_sprites(out, [layer], in_place=True)
+        else:
+            # full-canvas: Pillow's functional composite beats any in-place variant
+            out = Image.alpha_composite(out, layer.image if isinstance(layer, Sprite) else layer)
+    return out.copy() if out is base else out
+
 def to_png_bytes(img: Image.Image) -> bytes:
     import io
     buf = io.BytesIO()
     img.save(buf, format="PNG")
     return buf.getvalue()
+
+def upscaled(img: Image.Image, scale: int) -> Image.Image:
+    """Integer export upscale (LANCZOS); scale 1 returns img itself."""
+    return img if scale == 1 else img.resize((img.width*scale, img.height*scale), Image.LANCZOS)
+
+class PngStreamWriter:
+    """
+    Writes an RGBA PNG to a binary stream band by band (top to bottom), so an image
+    too big to hold in memory can be saved as it is rendered. Rows use PNG's Up
+    filter, which costs one NumPy subtraction and compresses smooth scenes well.
+
+        with PngStreamWriter(f, (w, h)) as png:
+            for band in bands: png.write(band)
+    """
+    SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+    def __init__(self, stream: BinaryIO, size: Tuple[int,int], compress_level: int = 6):
+        self.stream, self.size = stream, size
+        self.rows = 0
+        self._z = zlib.compressobj(compress_level)
+        self._prev = np.zeros((1, size[0]*4), np.uint8)
+        stream.write(self.SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", size[0], size[1], 8, 6, 0, 0, 0))   # 8-bit RGBA
+
+    def _chunk(self, tag: bytes, data: bytes):
+        self.stream.write(struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(tag))))
+
+    def write(self, band: Image.Image):
+        """Append band's rows; it must be the image width."""
+        if band.width != self.size[0] or self.rows + band.height > self.size[1]:
+            raise ValueError(f"band {band.size} does not fit the {self.size} image at row {self.rows}")
+        rows = np.asarray(band.convert("RGBA")).reshape(band.height, -1)
+        up = np.empty((band.height, rows.shape[1] + 1), np.uint8)
+        up[:, 0] = 2   # filter type: Up
+        np.subtract(rows, np.concatenate((self._prev, rows[:-1])), out=up[:, 1:])
+        self._prev = rows[-1:]
+        self.rows += band.height
+        data = self._z.compress(up.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        if self.rows != self.size[1]:
+            raise ValueError(f"only {self.rows} of {self.size[1]} rows were written")
+        self._chunk(b"IDAT", self._z.flush())
+        self._chunk(b"IEND", b"")
+
+    def __enter__(self) -> "PngStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+
+_exports: "OrderedDict[Hashable, Future]" = OrderedDict()
+_exports_lock = threading.Lock()
+_encoder = ThreadPoolExecutor(max_workers=2, thread_name_prefix="png-export")
+
+def png_export(key: Hashable, make: Callable[[], Image.Image]) -> Future:
+    """
+    Future of the PNG bytes of make(), rendered and encoded on a background thread.
+    Results are shared per key (scene parameters + scale) in a small LRU, so asking
+    again for an unchanged export costs nothing; failed encodes are retried.
+    """
+    with _exports_lock:
+        fut = _exports.get(key)
+        if fut is None or (fut.done() and fut.exception() is not None):
+            fut = _exports[key] = _encoder.submit(lambda: to_png_bytes(make()))
+            while len(_exports) > EXPORT_CACHE_SIZE:
+                _exports.popitem(last=False)
+        _exports.move_to_end(key)
+    return fut
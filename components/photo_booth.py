@@ -0,0 +1,400 @@
+"""
+Photo Booth looks.
+
+A look is a chain of stages: colour stages, ("bright", f), ("contrast", f),
+("color", f), ("temp", t), ("matte", lift), ("mono", contrast) and ("cube", path,
+mtime), which map each pixel's colour on its own, and spatial ones, ("sharp", f),
+("bloom", strength, radius), ("vignette", strength) and ("grain", amount[, gain]). The
+sidebar's stages come first, then the preset's (look_stages). Presets are the
+built-in LOOK_PRESETS plus every .cube file in LUT_DIR (data/luts, or
+$PHOTO_BOOTH_LUT_DIR), named by file stem.
+
+apply_looks runs the chain over one float32 array, channels first so every channel
+is contiguous, updated in place instead of a fresh Pillow image per split, point,
+merge and blend. A .cube, and any run of BAKE_MIN_STAGES or more colour stages, is
+baked into one 3D LUT (baked_lut, cached) and applied in a single lookup, so colour
+work never costs more than one pass however many stages it has; shorter runs are
+cheaper stage by stage. Contrast pivots on the image's mean grey, which a LUT cannot
+see: it is measured on a 1/16 subsample put through the run's earlier stages, and
+baked in.
+
+Each stage rounds back to whole levels, as the Pillow filters it replaces did when
+they stored uint8 (blends and point() truncate, composites round), so the result
+matches the old chain to within a level or two. Blurs still go through Pillow's C
+box blur.
+
+The page previews on a proxy, a copy scaled to about PREVIEW_PIXELS; apply_looks(...,
+scale) scales the spatial stages to match (scaled_stages), so the proxy looks like
+the full-size result scaled down, which is rendered only for export.
+"""
+from __future__ import annotations
+
+import math, os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+Stage = Tuple
+LOOK_PRESETS: Dict[str, Tuple[Stage, ...]] = {
+    "Barbie Glam": (("bright", 1.06), ("contrast", 1.08), ("color", 1.18), ("sharp", 1.02), ("temp", 0.25),
+                    ("bloom", 0.18, 12), ("vignette", 0.15)),
+    "Retro Film": (("bright", 0.98), ("contrast", 1.04), ("color", 0.92), ("sharp", 0.9), ("temp", -0.08), ("matte", 36),
+                   ("grain", 0.18), ("vignette", 0.22)),
+    "Dreamy Pastel": (("bright", 1.04), ("contrast", 0.96), ("color", 1.25), ("sharp", 0.9), ("bloom", 0.28, 18), ("temp", 0.18)),
+    "Noir": (("mono", 1.35), ("vignette", 0.25), ("matte", 28)),
+}
+COLOUR_STAGES = frozenset({"bright", "contrast", "color", "temp", "matte", "mono", "cube"})
+PIVOTED = frozenset({"contrast", "mono"})   # pivot on the image's mean grey
+LUMA = np.array([19595, 38470, 7471], np.float32) / 65536   # Pillow's RGB -> L weights
+BLOOM_RADIUS = 14
+LUT_SIZE = 33        # baked grid points per axis (Pillow allows 2..65)
+BAKE_MIN_STAGES = 6  # a lookup costs about five float stages (~95 ms at 1080×1920)
+PIVOT_STEP = 4       # contrast means are taken over every 4th row and column
+GRAIN_MEAN = 127.0   # of the blurred 0..254 noise
+PREVIEW_PIXELS = 360_000   # proxy budget, about 450×800 for a Story canvas
+LUT_DIR = Path(os.environ.get("PHOTO_BOOTH_LUT_DIR") or Path(__file__).resolve().parent.parent / "data" / "luts")
+
+
+def _levels(x: np.ndarray, rounded: bool = False) -> np.ndarray:
+    """x back to whole 0..255 levels in place, as the uint8 image of a Pillow stage."""
+    (np.rint if rounded else np.floor)(x, out=x)
+    return np.clip(x, 0, 255, out=x)
+
+def _luma(rgb: np.ndarray) -> np.ndarray:
+    return _levels(np.dot(LUMA, rgb.reshape(3, -1)).reshape(rgb.shape[1:]), rounded=True)
+
+def _opaque(a: np.ndarray) -> bool:
+    # every stage keeps a fully opaque image opaque, so its alpha work can be skipped
+    return a[3].min() == 255
+
+def _blurred(a: np.ndarray, radius: float) -> np.ndarray:
+    """Gaussian blur (Pillow's) of whole levels, (c, h, w) or (h, w), as uint8 (h, w[, c])."""
+    img = Image.fromarray(a.astype(np.uint8) if a.ndim == 2 else a.transpose(1, 2, 0).astype(np.uint8))
+    return np.asarray(img.filter(ImageFilter.GaussianBlur(radius)))
+
+def _bright(a: np.ndarray, f: float):
+    a[:3] *= f
+    _levels(a[:3])
+
+def _contrast(a: np.ndarray, f: float, mean: int | None = None):
+    """Stretch away from the mean grey (ImageEnhance.Contrast); mean defaults to a's own."""
+    rgb = a[:3]
+    if mean is None:
+        mean = int(_luma(rgb).mean() + 0.5)
+    rgb -= mean; rgb *= f; rgb += mean
+    _levels(rgb)
+
+def _color(a: np.ndarray, f: float):
+    """Saturation, as ImageEnhance.Color: away from each pixel's grey."""
+    rgb = a[:3]
+    grey = _luma(rgb)
+    rgb -= grey; rgb *= f; rgb += grey
+    _levels(rgb)
+
+def _sharp(a: np.ndarray, f: float):
+    """ImageEnhance.Sharpness: blend(SMOOTH, img, f), SMOOTH being 3×3 (centre 5, rest 1)/13."""
+    rgb = a[:3]
+    if min(rgb.shape[1:]) <= 2:
+        return   # Pillow leaves the border px as they are
+    rows = rgb[..., :-2] + rgb[..., 1:-1]
+    rows += rgb[..., 2:]
+    box = rows[:, :-2] + rows[:, 1:-1]
+    box += rows[:, 2:]
+    box *= (1 - f) / 13
+    inner = rgb[:, 1:-1, 1:-1]
+    inner *= f + 4*(1 - f)/13
+    inner += box
+    _levels(inner)
+
+def _temp(a: np.ndarray, t: float):
+    """Warm (t > 0) or cool (t < 0): red and blue scaled by ±15%·t."""
+    t = max(-1.0, min(1.0, t))
+    for c, f in ((0, 1 + 0.15*t), (2, 1 - 0.15*t)):
+        a[c] *= f
+        _levels(a[c]) if f > 1 else np.floor(a[c], out=a[c])
+
+def _bloom(a: np.ndarray, strength: float, radius: float):
+    """Soft glow: blend towards a Gaussian blur of the image."""
+    n = 3 if _opaque(a) else 4
+    blur = _blurred(a[:n], radius)
+    step = np.empty_like(a[0])
+    for c in range(n):
+        np.subtract(blur[..., c], a[c], out=step)
+        step *= min(strength, 1.0)
+        a[c] += step
+        np.floor(a[c], out=a[c])   # a blend of two 0..255 images stays in range
+
+def _matte(a: np.ndarray, lift: float):
+    """Lift blacks for a matte/retro vibe, lift 0..80."""
+    rgb = a[:3]
+    np.power(rgb, 0.9, out=rgb)
+    rgb *= (255 - lift) / 255**0.9
+    rgb += lift
+    np.floor(rgb, out=rgb)   # lift..255
+
+@lru_cache(maxsize=4)
+def vignette_mask(w: int, h: int) -> np.ndarray:
+    """Where the vignette darkens, 0..1: a blurred ellipse cut out of the frame. Read-only."""
+    mask = Image.new("L", (w, h), 255)
+    ImageDraw.Draw(mask).ellipse((-int(w*0.35), -int(h*0.35), int(w*1.35), int(h*1.35)), fill=0)
+    m = np.asarray(mask.filter(ImageFilter.GaussianBlur(int(min(w, h)*0.12))), np.float32) / 255
+    m.flags.writeable = False
+    return m
+
+def _vignette(a: np.ndarray, strength: float):
+    """Dark corners: a (0,0,0,220·strength) layer over the image, through vignette_mask."""
+    k = int(220*strength) / 255
+    m = vignette_mask(a.shape[2], a.shape[1])
+    if _opaque(a):
+        a[:3] *= 1 - k*m
+        np.rint(a[:3], out=a[:3])
+        return
+    alpha = a[3]
+    kept = alpha * (1 - k)                 # the photo's share of the darkened colour, ×255
+    dark_a = kept + 255*k
+    kept = np.divide(kept, dark_a, out=np.zeros_like(kept), where=dark_a > 0)
+    a[:3] *= 1 - m*(1 - kept)
+    alpha += m * (dark_a - alpha)
+    _levels(a, rounded=True)
+
+def _grain(a: np.ndarray, amount: float, gain: float = 1.0):
+    """Blurred random noise composited over the image at up to 25% opacity; gain scales its spread (see grain_gain)."""
+    h, w = a.shape[1:]
+    n = _blurred(np.random.randint(0, 255, (h, w), dtype=np.uint8), 0.6).astype(np.float32)   # 0..254, like random()*255 was
+    if gain != 1:
+        n -= GRAIN_MEAN; n *= gain; n += GRAIN_MEAN
+    grain_a = np.floor(n * max(0.0, min(amount, 0.25)))
+    if _opaque(a):
+        grain_a /= 255
+        step = np.empty_like(n)
+        for c in range(3):
+            np.subtract(n, a[c], out=step)
+            step *= grain_a
+            a[c] += step
+        np.rint(a[:3], out=a[:3])
+        return
+    alpha = a[3]
+    out_a = grain_a + alpha * (1 - grain_a/255)
+    share = np.divide(grain_a, out_a, out=np.zeros_like(out_a), where=out_a > 0)
+    rgb = a[:3]
+    rgb *= 1 - share
+    rgb += n * share
+    alpha[:] = out_a
+    _levels(a, rounded=True)
+
+def _mono(a: np.ndarray, contrast: float, mean: int | None = None):
+    """Monochrome with a contrast boost about the mean grey (default: a's own); alpha kept."""
+    grey = _luma(a[:3])
+    if mean is None:
+        mean = int(grey.mean() + 0.5)
+    grey -= mean; grey *= contrast; grey += mean
+    a[:3] = _levels(grey)
+
+def _cube(a: np.ndarray, path: str, mtime: int):
+    """A .cube LUT, trilinear (slow: for LUT grids and subsamples; full frames go through baked_lut)."""
+    table = cube_table(path, mtime)
+    n = table.shape[0]
+    x = a[:3] * ((n - 1) / 255)
+    i = np.minimum(x.astype(np.intp), n - 2)
+    x -= i
+    out = np.zeros(x.shape[1:] + (3,), np.float32)
+    for corner in range(8):
+        d = [(corner >> k) & 1 for k in range(3)]   # r, g, b offsets
+        w = np.prod([x[k] if d[k] else 1 - x[k] for k in range(3)], axis=0)
+        out += w[..., None] * table[i[2] + d[2], i[1] + d[1], i[0] + d[0]]
+    a[:3] = np.moveaxis(out, -1, 0) * 255
+    _levels(a[:3], rounded=True)
+
+STAGES = {"bright": _bright, "contrast": _contrast, "color": _color, "sharp": _sharp, "temp": _temp,
+          "bloom": _bloom, "matte": _matte, "vignette": _vignette, "grain": _grain, "mono": _mono, "cube": _cube}
+
+
+# .cube files
+def _domain(key: str, values: List[str], default: Tuple[float, ...]) -> None:
+    try:
+        ok = tuple(map(float, values)) == default
+    except ValueError:
+        ok = False
+    if not ok:
+        raise ValueError(f"only the default 0..1 input domain is supported, got {key} {' '.join(values)}")
+
+@lru_cache(maxsize=16)
+def cube_table(path: str, mtime: int = 0) -> np.ndarray:
+    """
+    The table of a 3D .cube LUT (Adobe/Resolve text format), (n, n, n, 3) indexed
+    [b, g, r] with values 0..1; mtime keys the cache. Read-only. Raises ValueError.
+    """
+    size, rows = None, []
+    try:
+        text = Path(path).read_text(encoding="utf-8-sig", errors="replace")   # some editors write a BOM
+    except OSError as e:
+        raise ValueError(f"cannot read {path}: {e}") from None
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        key, *rest = line.split()
+        if key[0].isdigit() or key[0] in "-+.":
+            rows.append(line)
+        elif key == "LUT_3D_SIZE":
+            size = int(rest[0]) if rest and rest[0].isdigit() else 0
+        elif key == "LUT_1D_SIZE":
+            raise ValueError("1D LUTs are not supported")
+        elif key == "DOMAIN_MIN":
+            _domain(key, rest, (0.0, 0.0, 0.0))
+        elif key == "DOMAIN_MAX":
+            _domain(key, rest, (1.0, 1.0, 1.0))
+        elif key == "LUT_3D_INPUT_RANGE":
+            _domain(key, rest, (0.0, 1.0))
+        elif key != "TITLE":
+            raise ValueError(f"unknown .cube keyword {key}")
+    if size is None or not 2 <= size <= 65:
+        raise ValueError("LUT_3D_SIZE must be 2..65")
+    try:
+        table = np.array(" ".join(rows).split(), np.float32)
+    except ValueError:
+        raise ValueError("malformed LUT rows") from None
+    if table.size != 3 * size**3 or not np.isfinite(table).all():
+        raise ValueError(f"expected {size**3} rows of three numbers")
+    table = table.reshape(size, size, size, 3)   # red varies fastest
+    table.flags.writeable = False
+    return table
+
+def cube_presets(folder: Path | str = LUT_DIR) -> Dict[str, Path]:
+    """The .cube files in folder by stem, skipping any that shadow a built-in preset."""
+    folder = Path(folder)
+    if not folder.is_dir():
+        return {}
+    return {p.stem: p for p in sorted(folder.glob("*.cube")) if p.stem not in LOOK_PRESETS and p.stem != "None"}
+
+
+# baking
+@lru_cache(maxsize=32)
+def baked_lut(run: Tuple[Stage, ...]) -> ImageFilter.Color3DLUT:
+    """
+    A run of colour stages as one 3D LUT. Contrast and mono stages must carry their
+    mean (see _pinned); .cube stages raise the grid to their own size, so a lone .cube
+    is reproduced exactly.
+    """
+    n = max([LUT_SIZE] + [cube_table(*args).shape[0] for name, *args in run if name == "cube"])
+    v = np.linspace(0, 255, n, dtype=np.float32)
+    b, g, r = np.meshgrid(v, v, v, indexing="ij")
+    grid = np.stack([r, g, b, np.full_like(r, 255)]).reshape(4, n, n*n)
+    for name, *args in run:
+        STAGES[name](grid, *args)
+    return ImageFilter.Color3DLUT(n, grid[:3].reshape(3, -1).T / 255)
+
+def _pinned(a: np.ndarray, run: Tuple[Stage, ...]) -> Tuple[Stage, ...]:
+    """run with each contrast/mono stage's mean appended: the mean a subsample of a has when it gets there."""
+    if not PIVOTED.intersection(name for name, *_ in run):
+        return run
+    sub = a[:, ::PIVOT_STEP, ::PIVOT_STEP].copy()
+    out = []
+    for name, *args in run:
+        if name in PIVOTED:
+            args = [*args, int(_luma(sub[:3]).mean() + 0.5)]
+        STAGES[name](sub, *args)
+        out.append((name, *args))
+    return tuple(out)
+
+def _steps(stages: Tuple[Stage, ...]) -> List[Tuple[Stage, ...]]:
+    """stages split into steps: each maximal run of colour stages, and each spatial stage on its own."""
+    steps: List[Tuple[Stage, ...]] = []
+    for s in stages:
+        if s[0] in COLOUR_STAGES and steps and steps[-1][-1][0] in COLOUR_STAGES:
+            steps[-1] += (s,)
+        else:
+            steps.append((s,))
+    return steps
+
+
+# preview proxies
+def preview_scale(size: Tuple[int, int], pixels: int = PREVIEW_PIXELS) -> float:
+    """
+    The scale that brings a size canvas down to about pixels, never up. Where the sides
+    allow it is a multiple of 1/gcd(w, h), so both scale to whole pixels and back exactly.
+    """
+    w, h = size
+    k = min(1.0, (pixels / (w*h)) ** 0.5)
+    g = math.gcd(w, h)
+    return math.floor(k*g) / g if k*g >= 1 else k
+
+@lru_cache(maxsize=16)
+def grain_gain(scale: float) -> float:
+    """
+    How much of the grain's spread survives scaling the image by scale (LANCZOS), measured
+    once on a patch of the noise: grain drawn at that gain on a scaled copy looks like the
+    full-size grain looks scaled down.
+    """
+    if scale >= 1:
+        return 1.0
+    rng = np.random.default_rng(0)
+    n = Image.fromarray(rng.integers(0, 255, (512, 512), dtype=np.uint8)).filter(ImageFilter.GaussianBlur(0.6))
+    side = max(8, round(512*scale))
+    return float(np.asarray(n.resize((side, side), Image.LANCZOS), np.float32).std() / np.asarray(n, np.float32).std())
+
+def scaled_stages(stages: Tuple[Stage, ...], scale: float) -> Tuple[Stage, ...]:
+    """
+    The stages for the same look on a copy scaled by scale: blur radii follow the pixel
+    size, grain loses what downscaling would average away, and the 3×3 sharpen's
+    strength goes with scale**1.5 (between a Laplacian's square and linear; closest on
+    photos at 0.3..0.75). The vignette is drawn relative to the frame already.
+    """
+    if scale == 1:
+        return stages
+    out = []
+    for name, *args in stages:
+        if name == "bloom":
+            args = [args[0], args[1]*scale]
+        elif name == "sharp":
+            args = [1 + (args[0] - 1)*scale**1.5]
+        elif name == "grain":
+            args = [args[0], grain_gain(scale)]
+        out.append((name, *args))
+    return tuple(out)
+
+
+def _is_identity(stage: Stage) -> bool:
+    name, *args = stage
+    if name in ("bright", "contrast", "color", "sharp"):
+        return args[0] == 1
+    if name == "temp":
+        return abs(args[0]) < 1e-3
+    return name not in ("mono", "cube") and args[0] <= 0
+
+def preset_stages(preset: str) -> Tuple[Stage, ...]:
+    """A built-in preset's stages, or a .cube preset's single stage; () for "None" or an unknown name."""
+    if preset in LOOK_PRESETS:
+        return LOOK_PRESETS[preset]
+    path = cube_presets().get(preset)
+    return (("cube", str(path), path.stat().st_mtime_ns),) if path else ()
+
+def look_stages(bright: float = 1.0, contrast: float = 1.0, color: float = 1.0, sharp: float = 1.0,
+                temp: float = 0.0, bloom: float = 0.0, matte: float = 0, vignette: float = 0.0,
+                grain: float = 0.0, preset: str = "None") -> Tuple[Stage, ...]:
+    """The sidebar's looks followed by the preset's, without the stages that would leave the image as it is."""
+    stages = (("bright", bright), ("contrast", contrast), ("color", color), ("sharp", sharp), ("temp", temp),
+              ("bloom", bloom, BLOOM_RADIUS), ("matte", matte), ("vignette", vignette), ("grain", grain)) + preset_stages(preset)
+    return tuple(s for s in stages if not _is_identity(s))
+
+def apply_looks(img: Image.Image, stages: Tuple[Stage, ...], scale: float = 1.0) -> Image.Image:
+    """
+    img (RGBA) through the stages, on one float32 copy of its pixels. With scale < 1, img
+    is a preview proxy of an image 1/scale its size and the stages are scaled to match
+    (scaled_stages). A broken .cube raises ValueError.
+    """
+    if not stages:
+        return img
+    stages = scaled_stages(stages, scale)
+    a = np.asarray(img.convert("RGBA")).transpose(2, 0, 1).astype(np.float32, order="C")
+    for step in _steps(stages):
+        if len(step) >= BAKE_MIN_STAGES or any(name == "cube" for name, *_ in step):
+            lut = baked_lut(_pinned(a, step))
+            a[:] = np.asarray(Image.fromarray(a.transpose(1, 2, 0).astype(np.uint8), "RGBA").filter(lut)).transpose(2, 0, 1)
+        else:
+            for name, *args in step:
+                STAGES[name](a, *args)
+    return Image.fromarray(a.transpose(1, 2, 0).astype(np.uint8), "RGBA")
@@ -0,0 +1,180 @@
+"""
+Headless Style Studio batch renderer (no Streamlit needed).
+
+    python -m components.style_batch looks.jsonl -o lookbook/ [--workers N] [--quality final|draft] [--scale 2]
+
+Each JSONL line is one outfit: the sidebar's palette and doll fields at the top
+level (primary, secondary, accent, skin, hair, ..., earrings), the dress options
+under "opts" exactly as render_stage takes them (glitter is 0-120), and optional
+"id", "bg", "quality" and "scale". Missing fields take the sidebar defaults;
+every field is checked against the sidebar's choices and ranges (FIELD_CHECKS).
+Writes <id>.png per outfit plus manifest.json, in input order; a bad line is
+recorded in the manifest instead of stopping the batch.
+
+Rendering goes through the same render_stage/export_image calls as the page's
+download button (final quality), so a spec gives the same pixels as the download.
+"""
+from __future__ import annotations
+
+import argparse, json, os, re, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from components.style_studio import (DEFAULT_BG, DEFAULT_DOLL, DEFAULT_OPTS, DEFAULT_PALETTE, HAIR_STYLES, NECKLINES, PATTERNS,
+                                     SKIRT_CUTS, SLEEVES, export_image, render_stage)
+
+QUALITIES = ("draft", "final")
+HEX_RE = re.compile(r"#(?:[0-9a-fA-F]{3}){1,2}")
+# the sidebar's widgets: "colour", a tuple of choices, bool, str, or a (lo, hi) range (ints must be whole)
+FIELD_CHECKS = {
+    **{k: "colour" for k in ("bg", "primary", "secondary", "accent", "skin", "hair", "eyes", "lips", "brows",
+                             "highlight", "shoes")},
+    "hair_style": HAIR_STYLES, "head_scale": (0.8, 1.2), "hairline": (8, 40),
+    "volume": (0, 100), "brow_thick": (4, 18), "eye_size": (10, 22),
+    "blush": bool, "glasses": bool, "necklace": bool, "earrings": bool,
+}
+OPTS_CHECKS = {
+    "pattern": PATTERNS, "angle": (0, 180), "scale": (8, 80), "glitter": (0, 120), "gloss": bool,
+    "neckline": NECKLINES, "sleeve": SLEEVES, "skirt_cut": SKIRT_CUTS,
+    "flare": (0, 20), "belt": bool, "bow": bool, "monogram": str,
+}
+
+
+def _checked(fields: Dict, checks: Dict, prefix: str = "") -> Dict:
+    """fields validated against checks (see FIELD_CHECKS); raises ValueError naming the first bad one."""
+    out = {}
+    for k, v in fields.items():
+        check = checks[k]
+        if check == "colour":
+            ok = isinstance(v, str) and HEX_RE.fullmatch(v)
+        elif check in (bool, str):
+            ok = isinstance(v, check)
+        elif isinstance(check[0], str):
+            ok = v in check
+        else:
+            lo, hi = check
+            ok = isinstance(v, (int, float)) and not isinstance(v, bool) and lo <= v <= hi
+            if ok and isinstance(lo, int): ok, v = v == int(v), int(v)
+        if not ok:
+            if check == "colour": want = "a #rrggbb colour"
+            elif check is bool: want = "true or false"
+            elif check is str: want = "a string"
+            elif isinstance(check[0], str): want = "one of " + ", ".join(check)
+            else: want = f"a number in {check[0]}..{check[1]}" + (" (whole)" if isinstance(check[0], int) else "")
+            raise ValueError(f"{prefix}{k} must be {want}, got {v!r}")
+        out[k] = v
+    return out
+
+def resolve_spec(spec: Dict, index: int) -> Dict:
+    """Fill defaults and validate one outfit spec; raises ValueError on bad input."""
+    if not isinstance(spec, dict):
+        raise ValueError("spec must be a JSON object")
+    known = {"id", "bg", "quality", "scale", "opts", *DEFAULT_PALETTE, *DEFAULT_DOLL}
+    unknown = sorted(set(spec) - known)
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(unknown)}")
+    opts = {} if spec.get("opts") is None else spec["opts"]
+    if not isinstance(opts, dict):
+        raise ValueError("opts must be a JSON object")
+    unknown = sorted(set(opts) - set(DEFAULT_OPTS))
+    if unknown:
+        raise ValueError(f"unknown opts field(s): {', '.join(unknown)}")
+    look_id = re.sub(r"[^A-Za-z0-9._-]+", "_", str(spec.get("id") or f"look_{index:04d}"))
+    quality = spec.get("quality", "final")
+    if quality not in QUALITIES:
+        raise ValueError(f"quality must be one of {QUALITIES}")
+    scale = spec.get("scale", 1)
+    if scale not in (1, 2, 3) or isinstance(scale, bool):
+        raise ValueError("scale must be 1, 2 or 3")
+    fields = _checked({k: spec.get(k, v) for k, v in {"bg": DEFAULT_BG, **DEFAULT_PALETTE, **DEFAULT_DOLL}.items()},
+                      FIELD_CHECKS)
+    return {
+        "id": look_id, "bg": fields["bg"], "quality": quality, "scale": int(scale),
+        "palette": {k: fields[k] for k in DEFAULT_PALETTE},
+        "doll": {k: fields[k] for k in DEFAULT_DOLL},
+        "opts": _checked({**DEFAULT_OPTS, **opts}, OPTS_CHECKS, prefix="opts."),
+    }
+
+def render_spec(look: Dict):
+    """Render a resolved spec to its export image."""
+    stage = render_stage(look["palette"], look["doll"], look["opts"], bg_hex=look["bg"], quality=look["quality"])
+    return export_image(stage, look["scale"])
+
+def _render_job(job: Tuple[Dict, str]) -> Dict:
+    look, out_dir = job
+    t = time.perf_counter()
+    try:
+        img = render_spec(look)
+        path = Path(out_dir) / f"{look['id']}.png"
+        img.save(path, format="PNG")
+    except Exception as e:  # keep the batch going; the manifest says what failed
+        return {"error": f"{type(e).__name__}: {e}"}
+    return {"file": path.name, "size": list(img.size), "ms": round((time.perf_counter() - t) * 1e3, 1)}
+
+def _cache_order(look: Dict):
+    # neighbours share body/hair/dress geometry, so each worker's layer caches stay warm
+    d, o = look["doll"], look["opts"]
+    return (look["quality"], d["head_scale"], d["hair_style"], o["neckline"], o["sleeve"], o["skirt_cut"], o["flare"])
+
+def run_batch(lines: List[str], out_dir: Path | str, workers: Optional[int] = None,
+              overrides: Optional[Dict] = None) -> List[Dict]:
+    """Render every JSONL line into out_dir; returns (and writes) the manifest entries."""
+    out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
+    manifest: List[Dict] = []
+    looks: Dict[int, Dict] = {}
+    seen = set()
+    for i, line in enumerate(lines):
+        entry: Dict = {"line": i + 1}
+        try:
+            spec = json.loads(line)
+            if isinstance(spec, dict): spec = {**spec, **(overrides or {})}
+            look = resolve_spec(spec, i)
+            if look["id"] in seen:
+                raise ValueError(f"duplicate id {look['id']!r}")
+            seen.add(look["id"])
+            entry.update(look); looks[i] = look
+        except ValueError as e:  # json.JSONDecodeError is a ValueError too
+            entry["error"] = str(e)
+        manifest.append(entry)
+
+    order = sorted(looks, key=lambda i: _cache_order(looks[i]))
+    jobs = [(looks[i], str(out_dir)) for i in order]
+    workers = max(1, workers or os.cpu_count() or 1)
+    if workers == 1 or len(jobs) < 2:
+        results = [_render_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    for i, res in zip(order, results):
+        manifest[i].update(res)
+
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m components.style_batch", description="Render Style Studio outfits from a JSONL file.")
+    ap.add_argument("specs", help="JSONL file, one outfit per line ('-' for stdin)")
+    ap.add_argument("-o", "--out", default="lookbook", help="output directory (default: lookbook)")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--quality", choices=QUALITIES, help="override every spec's quality")
+    ap.add_argument("--scale", type=int, choices=(1, 2, 3), help="override every spec's export scale")
+    args = ap.parse_args(argv)
+
+    text = sys.stdin.read() if args.specs == "-" else Path(args.specs).read_text(encoding="utf-8")
+    lines = [ln for ln in text.splitlines() if ln.strip()]
+    overrides = {k: v for k, v in (("quality", args.quality), ("scale", args.scale)) if v is not None}
+
+    t = time.perf_counter()
+    manifest = run_batch(lines, args.out, workers=args.workers, overrides=overrides)
+    failed = [m for m in manifest if "error" in m]
+    print(f"rendered {len(manifest) - len(failed)}/{len(manifest)} looks into {args.out} "
+          f"in {time.perf_counter() - t:.1f}s")
+    for m in failed:
+        print(f"  line {m['line']}: {m['error']}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
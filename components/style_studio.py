@@ -0,0 +1,863 @@
+"""
+Style Studio render pipeline.
+Each layer is a pure function of small hashable inputs and is memoized in a
+bounded, process-wide LRU, so a rerun only redraws the layers whose controls
+changed. Cached images are shared: treat them as read-only.
+Set STYLE_STUDIO_MASK_DIR to also keep the bodice/skirt masks on disk, so a
+restarted server (or a batch worker) loads them instead of redrawing.
+"""
+from __future__ import annotations
+
+import inspect, itertools, math, os, re, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageChops
+
+from components.media_utils import Sprite, compose, composite_sprites, trimmed, upscaled
+
+CANVAS_W, CANVAS_H = 900, 1200
+LAYER_CACHE_SIZE = 12   # per layer function; each entry is one canvas-sized RGBA (~4 MB)
+MASK_CACHE_SIZE = 64    # per dress-mask function; each entry is one piece-sized L image (<0.5 MB)
+MASK_DIR = os.environ.get("STYLE_STUDIO_MASK_DIR") or None
+MASK_VERSION = 1        # bump when bodice_mask/skirt_mask change, so stale files are ignored
+
+# the sidebar's choices and defaults, shared by the page and the batch renderer
+HAIR_STYLES = ("Straight", "Waves", "High Pony", "Bob")
+NECKLINES = ("Scoop", "V-neck", "Sweetheart", "Off-Shoulder")
+SLEEVES = ("Sleeveless", "Cap", "Puff", "Long")
+SKIRT_CUTS = ("A-Line", "Ball Gown", "Mermaid", "Sheath")
+PATTERNS = ("Solid", "Stripes", "Polka", "Check", "Gradient")
+DEFAULT_PALETTE = {"primary": "#ff4fb7", "secondary": "#ffe6f3", "accent": "#ffffff"}
+DEFAULT_DOLL = {"skin": "#f0d5c4", "hair": "#4a2f2a", "eyes": "#1b1b1b", "lips": "#ff6b9a", "brows": "#3b2a26",
+                "highlight": "#ffffff", "hair_style": "Waves", "head_scale": 0.95, "hairline": 16, "volume": 40,
+                "brow_thick": 10, "eye_size": 12, "blush": False,
+                "shoes": "#2b2b2b", "glasses": False, "necklace": True, "earrings": True}
+DEFAULT_OPTS = {"pattern": "Solid", "angle": 30, "scale": 22, "glitter": 30, "gloss": True,   # glitter is 0-120
+                "neckline": "Sweetheart", "sleeve": "Sleeveless", "skirt_cut": "A-Line",
+                "flare": 6, "belt": True, "bow": True, "monogram": "BB"}
+DEFAULT_BG = "#f6eff6"
+
+#tiny utils
+def blank(size: Tuple[int,int]=(CANVAS_W, CANVAS_H), color=(0,0,0,0)) -> Image.Image:
+    return Image.new("RGBA", size, color)
+
+def try_font(size: int):
+    for cand in ("arial.ttf", "DejaVuSans.ttf"):
+        try: return ImageFont.truetype(cand, size)
+        except Exception: pass
+    return ImageFont.load_default()
+
+def hex_to_rgb(h: str):
+    s = h.strip().lstrip("#")
+    if len(s)==3: s="".join(c*2 for c in s)
+    return int(s[0:2],16), int(s[2:4],16), int(s[4:6],16)
+
+def contrast_text(h: str) -> str:
+    r,g,b = hex_to_rgb(h)
+    return "#000000" if (0.2126*r+0.7152*g+0.0722*b) > 165 else "#ffffff"
+
+def rr(draw: ImageDraw.ImageDraw, box, radius: int, fill=None, outline=None, width: int=1):
+    try: draw.rounded_rectangle(box, radius=radius, fill=fill, outline=outline, width=width)
+    except Exception: draw.rectangle(box, fill=fill, outline=outline, width=width)
+
+def _frozen(d: Dict) -> Tuple:
+    """Hashable, order-independent view of a small options dict (cache key)."""
+    return tuple(sorted(d.items()))
+
+# color-decoupled layers: geometry is drawn once as per-ink coverage masks
+# (keyed only by shape parameters); colors are applied afterwards by paint()
+class _Inks:
+    """Per-ink coverage masks, drawn with plain ImageDraw calls at fill=255."""
+    def __init__(self, size: Tuple[int,int]=(CANVAS_W, CANVAS_H)):
+        self.size = size
+        self.masks: Dict[str, Image.Image] = {}
+
+    def __call__(self, ink: str) -> ImageDraw.ImageDraw:
+        if ink not in self.masks:
+            self.masks[ink] = Image.new("L", self.size, 0)
+        return ImageDraw.Draw(self.masks[ink], "L")
+
+    def freeze(self) -> Tuple:
+        """((ink, mask cropped to its bbox, offset), ...) in first-drawn order."""
+        out = []
+        for ink, m in self.masks.items():
+            box = m.getbbox()
+            if box: out.append((ink, m.crop(box), box[:2]))
+        return tuple(out)
+
+def paint(inks: Tuple, colors: Dict[str, Tuple[int,int,int,int]], size: Tuple[int,int]=(CANVAS_W, CANVAS_H),
+          layer: Image.Image | None = None) -> Image.Image:
+    """Recolor cached coverage masks: one bbox-sized alpha blend per ink (onto `layer` if given)."""
+    sprites = []
+    for ink, mask, xy in inks:
+        r,g,b,a = colors[ink]
+        sprite = Image.new("RGBA", mask.size, (r,g,b,255))
+        sprite.putalpha(mask if a >= 255 else mask.point(lambda p, a=a: p*a//255))
+        sprites.append(Sprite(sprite, *xy))
+    return composite_sprites(layer if layer is not None else blank(size), sprites, in_place=True)
+
+@lru_cache(maxsize=4)
+def soft_bg(color=DEFAULT_BG):
+    layer = Image.new("RGBA", (CANVAS_W, CANVAS_H), hex_to_rgb(color)+(255,))
+    d = ImageDraw.Draw(layer, "RGBA")
+    rr(d, (16,16,CANVAS_W-16,CANVAS_H-16), 30, outline=(255,255,255,180), width=2)
+    # subtle vignette
+    mask = Image.new("L", (CANVAS_W, CANVAS_H), 0)
+    dm = ImageDraw.Draw(mask)
+    dm.ellipse((40,40,CANVAS_W-40,CANVAS_H-60), fill=90)
+    mask = mask.filter(ImageFilter.GaussianBlur(110))
+    haze = Image.merge("RGBA", (mask,mask,mask,mask))
+    return Image.alpha_composite(layer, haze)
+
+# fabrics (vectorized: patterns are coverage maps over a coordinate grid)
+FABRIC_CACHE_SIZE = 16
+
+def _readonly(a: np.ndarray) -> np.ndarray:
+    a.setflags(write=False)   # cached arrays are shared between reruns
+    return a
+
+@lru_cache(maxsize=FABRIC_CACHE_SIZE)
+def pattern_coverage(size: Tuple[int,int], mode: str, angle: int, scale: int) -> np.ndarray:
+    """
+    Per-pixel weight of the primary color (float32, 0..1, shape h×w).
+    0 = secondary, 1 = primary; edges are anti-aliased over one pixel.
+    """
+    w,h = size
+    if mode == "Gradient":
+        t = np.linspace(0.0, 1.0, h, dtype=np.float32) if h > 1 else np.zeros(1, np.float32)
+        return np.broadcast_to(t[:,None], (h,w))
+    if mode not in ("Stripes","Polka","Check"):   # Solid
+        return _readonly(np.zeros((h,w), np.float32))
+    y, x = np.ogrid[0:h, 0:w]
+    x = x.astype(np.float32); y = y.astype(np.float32)
+    if mode == "Stripes":
+        step = max(8, scale); half = max(6, step//2)/2
+        ang = math.radians(angle % 180)
+        L = int((w*w+h*h)**0.5)+200
+        # distance across the stripes, phased like the old line sweep (i = -L, -L+step, ...)
+        across = (x-w//2)*(-math.sin(ang)) + (y-h//2)*math.cos(ang) + L
+        dist = np.abs((across + step/2) % step - step/2)
+        return _readonly(np.clip(half + 0.5 - dist, 0.0, 1.0))
+    if mode == "Polka":
+        step = max(18, scale*2); r = max(5, scale//2)
+        row = np.floor(y/step + 0.5)
+        offset = np.where(row % 2 == 0, step//2, 0).astype(np.float32)   # even rows shift half a step
+        dx = (x - offset) - np.round((x - offset)/step)*step
+        dy = y - row*step
+        return _readonly(np.clip(r + 0.5 - np.sqrt(dx*dx + dy*dy), 0.0, 1.0))
+    step = max(14, scale)   # Check
+    # squares are drawn step+1 wide, so every inner grid line belongs to one of them
+    on = ((x//step) + (y//step)) % 2 == 0
+    on = on | ((x % step == 0) & (x > 0)) | ((y % step == 0) & (y > 0))
+    return _readonly(on.astype(np.float32))
+
+@lru_cache(maxsize=FABRIC_CACHE_SIZE)
+def glitter_alpha(size: Tuple[int,int], glitter: float) -> np.ndarray:
+    """Sparkle alpha (float32, 0..1): one batched scatter of small discs, seeded for stable output."""
+    w,h = size
+    a = np.zeros((h,w), np.float32)
+    n = int((w*h)/1200 * glitter)
+    if n <= 0: return _readonly(a)
+    rng = np.random.default_rng(5)
+    xs = rng.integers(0, w, n); ys = rng.integers(0, h, n)
+    alpha = rng.integers(120, 221, n).astype(np.float32)/255
+    rad = rng.integers(1, 3, n)
+    for r in (1, 2):
+        sel = rad == r
+        for oy in range(-r, r+1):
+            for ox in range(-r, r+1):
+                if ox*ox + oy*oy > r*r + r: continue
+                px = np.clip(xs[sel]+ox, 0, w-1); py = np.clip(ys[sel]+oy, 0, h-1)
+                np.maximum.at(a, (py, px), alpha[sel])
+    return _readonly(a)
+
+def fabric(size: Tuple[int,int], mode: str, primary: str, secondary: str, angle: int, scale: int, glitter: float):
+    t = pattern_coverage(tuple(size), mode, int(angle) if mode == "Stripes" else 0, int(scale))[..., None]
+    c1 = np.array(hex_to_rgb(secondary), np.float32); c2 = np.array(hex_to_rgb(primary), np.float32)
+    rgb = c1 + (c2 - c1)*t
+    if glitter > 0:
+        g = glitter_alpha(tuple(size), float(glitter))[..., None]
+        rgb = rgb + (255.0 - rgb)*g
+    w,h = size
+    out = np.empty((h,w,4), np.uint8)
+    out[..., :3] = np.clip(rgb + 0.5, 0, 255)
+    out[..., 3] = 255
+    return Image.fromarray(out, "RGBA")
+
+def glossy(img: Image.Image, amount: float=0.16):
+    if amount<=0: return img
+    w,h = img.size
+    g = Image.new("L",(1,h))
+    for y in range(h):
+        t = max(0, 1 - (y/h)*1.6)
+        g.putpixel((0,y), int(255*t*amount))
+    g = g.resize((w,h))
+    return Image.alpha_composite(img, Image.merge("RGBA",(Image.new("L",(w,h),255),)*3+(g,)))
+
+# BODY (proportionate head + jawline)
+BODY_SS = 4   # reference supersampling; layout is always computed at this scale
+QUALITY_SS = {"draft": 2, "final": 4}   # interactive preview vs export
+
+def quality_ss(quality: str) -> int:
+    return QUALITY_SS.get(quality, QUALITY_SS["final"])
+
+@lru_cache(maxsize=32)
+def body_geometry(head_scale: float) -> Dict:
+    """
+    Canvas-space anchors for the body at a given head size (no drawing):
+      - head_top / head_bottom / head_h
+      - torso, waist, hip, leg and neck anchors used by the other layers
+    """
+    SS = BODY_SS
+    W,H = CANVAS_W*SS, CANVAS_H*SS
+    torso_top = int(H*0.27)
+    head_h = int(H*0.115*head_scale)
+    neck_h = int(H*0.055)
+    torso_w = int(W*0.29); torso_h = int(H*0.33)
+    waist_w = int(torso_w*0.68); hip_w = int(torso_w*1.04)
+    jaw_y = torso_top-int(H*0.03)
+    underarm_y = torso_top+int(torso_h*0.16)
+    bottom_y = torso_top+torso_h
+    leg_h = int(H*0.30); leg_y0 = bottom_y+int(H*0.02)
+
+    head_bottom = torso_top//SS
+    head_top = head_bottom - (head_h//SS) - int(CANVAS_H*0.03)
+    return {
+        "cx": CANVAS_W//2, "torso_top": torso_top//SS, "torso_h": torso_h//SS,
+        "torso_w": torso_w//SS, "waist_w": waist_w//SS, "hip_w": hip_w//SS,
+        "leg_y0": leg_y0//SS, "leg_h": leg_h//SS,
+        "head_top": head_top, "head_bottom": head_bottom, "head_h": head_h//SS,
+        "underarm_y": underarm_y//SS, "neck_y": (jaw_y+neck_h)//SS,
+    }
+
+@lru_cache(maxsize=4)
+def _body_shape_hi(head_scale: float, ss: int):
+    """
+    Supersampled body coverage at `ss`, covering only the body's bounding box.
+    Returns (silhouette, clavicle, box) where box is the canvas-space region. Read-only:
+    only reduced once per shape by body_inks and body_tone.
+    """
+    SS = BODY_SS
+    W,H = CANVAS_W*SS, CANVAS_H*SS
+    cx = W//2
+
+    torso_top = int(H*0.27)
+    # head scaled
+    head_h = int(H*0.115*head_scale); head_w=int(W*0.125*head_scale)
+    neck_w=int(W*0.055); neck_h=int(H*0.055)
+    torso_w=int(W*0.29); torso_h=int(H*0.33)
+    waist_w=int(torso_w*0.68); hip_w=int(torso_w*1.04)
+    jaw_y = torso_top-int(H*0.03); chin_y = jaw_y+int(head_h*0.38)
+    underarm_y = torso_top+int(torso_h*0.16)
+    waist_y = torso_top+int(torso_h*0.58); bottom_y = torso_top+torso_h
+    arm_w=int(W*0.05); arm_l=int(H*0.22)
+    axL = cx-torso_w//2-int(W*0.015); axR = cx+torso_w//2+int(W*0.015)
+    leg_w=int(W*0.07); leg_h=int(H*0.30)
+    leg_y0 = bottom_y+int(H*0.02); gap=int(W*0.02)
+
+    # supersample only the bounding box (layout coords are at BODY_SS), with room for LANCZOS' 3-px ringing
+    box = (max(0, (axL-arm_w//2)//SS - 4), max(0, (torso_top-head_h-int(H*0.03))//SS - 4),
+           min(CANVAS_W, (axR+arm_w//2)//SS + 5), min(CANVAS_H, (leg_y0+leg_h)//SS + 5))
+    k = ss/SS; ox, oy = box[0]*ss, box[1]*ss
+    def P(x, y): return (x*k-ox, y*k-oy)
+    def B(x0, y0, x1, y1): return P(x0, y0) + P(x1, y1)
+
+    size = ((box[2]-box[0])*ss, (box[3]-box[1])*ss)
+    mask_hi = Image.new("L",size,0)
+    dm = ImageDraw.Draw(mask_hi,"L")
+
+    # skull + jawline (heart-ish)
+    dm.ellipse(B(cx-head_w//2, torso_top-head_h-int(H*0.03), cx+head_w//2, torso_top-int(H*0.03)), fill=255)
+    dm.polygon([P(cx-int(head_w*0.50),jaw_y),
+                P(cx-int(head_w*0.30),jaw_y+int(head_h*0.17)),
+                P(cx,chin_y),
+                P(cx+int(head_w*0.30),jaw_y+int(head_h*0.17)),
+                P(cx+int(head_w*0.50),jaw_y)], fill=255)
+
+    # neck trapezoid
+    dm.polygon([P(cx-neck_w//2, jaw_y),
+                P(cx+neck_w//2, jaw_y),
+                P(cx+int(neck_w*0.62), jaw_y+neck_h),
+                P(cx-int(neck_w*0.62), jaw_y+neck_h)], fill=255)
+
+    # torso hourglass
+    dm.polygon([P(cx-torso_w//2,torso_top),
+                P(cx-int(W*0.13),underarm_y),
+                P(cx-waist_w//2,waist_y),
+                P(cx-hip_w//2,bottom_y),
+                P(cx+hip_w//2,bottom_y),
+                P(cx+waist_w//2,waist_y),
+                P(cx+int(W*0.13),underarm_y),
+                P(cx+torso_w//2,torso_top)], fill=255)
+
+    # arms
+    dm.rounded_rectangle(B(axL-arm_w//2, underarm_y-10, axL+arm_w//2, underarm_y-10+arm_l), 30*k, fill=255)
+    dm.rounded_rectangle(B(axR-arm_w//2, underarm_y-10, axR+arm_w//2, underarm_y-10+arm_l), 30*k, fill=255)
+
+    # legs
+    for sgn in (-1,1):
+        x = cx+sgn*(gap+leg_w//2)
+        dm.rounded_rectangle(B(x-leg_w//2, leg_y0, x+leg_w//2, leg_y0+leg_h), 40*k, fill=255)
+
+    # subtle clavicle
+    clav_hi = Image.new("L",size,0)
+    ImageDraw.Draw(clav_hi,"L").arc(B(cx-int(W*0.04), jaw_y+neck_h-int(H*0.01), cx+int(W*0.04), jaw_y+neck_h+int(H*0.03)),
+                                    20, 160, fill=255, width=max(1,ss))
+    return mask_hi, clav_hi, box
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def body_inks(head_scale: float, quality: str = "final") -> Tuple:
+    """Skin coverage, LANCZOS-reduced from the supersampled bbox."""
+    mask_hi, _, box = _body_shape_hi(head_scale, quality_ss(quality))
+    return (("skin", mask_hi.resize((box[2]-box[0], box[3]-box[1]), Image.LANCZOS), box[:2]),)
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def body_mask(head_scale: float, quality: str = "final") -> Image.Image:
+    """Body silhouette at canvas size; clothing is fitted against it."""
+    (_, skin, xy), = body_inks(head_scale, quality)
+    out = Image.new("L", (CANVAS_W, CANVAS_H), 0)
+    out.paste(skin, xy)
+    return out
+
+@lru_cache(maxsize=32)
+def dilated_body_mask(head_scale: float, quality: str = "final", size: int = 9) -> Image.Image:
+    """body_mask grown by a size×size max filter (separable, NumPy)."""
+    a = np.asarray(body_mask(head_scale, quality))
+    r = size//2
+    for axis in (1, 0):
+        out = a.copy()
+        for s in range(1, r+1):
+            if axis == 1:
+                np.maximum(out[:, s:], a[:, :-s], out=out[:, s:]); np.maximum(out[:, :-s], a[:, s:], out=out[:, :-s])
+            else:
+                np.maximum(out[s:], a[:-s], out=out[s:]); np.maximum(out[:-s], a[s:], out=out[:-s])
+        a = out
+    return Image.fromarray(a, "L")
+
+BODY_TONE_REF = 200   # grey the body is reduced in; LANCZOS rings ~13% past it, still under 255
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def body_tone(head_scale: float, quality: str = "final") -> Tuple:
+    """
+    Color-free body after the LANCZOS reduction: (tone, alpha, xy), both "L".
+    The full-resolution body (skin over its silhouette, clavicle pasted as
+    (0,0,0,22)) is built once in BODY_TONE_REF grey and reduced premultiplied,
+    as RGBA resizes are, so tone keeps the ringing any skin colour would get.
+    """
+    mask_hi, clav_hi, box = _body_shape_hi(head_scale, quality_ss(quality))
+    ref = BODY_TONE_REF
+    body_hi = Image.composite(Image.new("RGBa", mask_hi.size, (ref,ref,ref,255)),
+                              Image.new("RGBa", mask_hi.size, (0,0,0,0)), mask_hi)
+    body_hi.paste((0,0,0,22), mask=clav_hi)
+    size = (box[2]-box[0], box[3]-box[1])
+    return body_hi.getchannel("R").resize(size, Image.LANCZOS), body_hi.getchannel("a").resize(size, Image.LANCZOS), box[:2]
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def draw_body(skin_hex: str, head_scale: float, quality: str = "final") -> Image.Image:
+    """Recolor the cached body tone: one point() per channel, then unpremultiply."""
+    tone, alpha, xy = body_tone(head_scale, quality)
+    ref = BODY_TONE_REF
+    rgb = [tone.point(lambda p, c=c: min(255, (2*p*c + ref)//(2*ref))) for c in hex_to_rgb(skin_hex)]
+    layer = blank()
+    layer.paste(Image.merge("RGBa", (*rgb, alpha)).convert("RGBA"), xy)
+    return layer
+
+# face (anchored to head box)
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def face_inks(head_scale:float, brow_thick:int, eye_size:int, blush:bool) -> Tuple:
+    geo = body_geometry(head_scale)
+    ink = _Inks()
+    cx = geo["cx"]; head_top = geo["head_top"]
+
+    # proportions inside head box (stable across styles)
+    brow_y = head_top + int(geo["head_h"]*0.28)
+    eye_y  = head_top + int(geo["head_h"]*0.38)
+    lip_y  = head_top + int(geo["head_h"]*0.60)
+
+    # brows
+    t = max(4, brow_thick)
+    rr(ink("brow"), (cx-46, brow_y, cx-8, brow_y+t), 6, fill=255)
+    rr(ink("brow"), (cx+8,  brow_y, cx+46, brow_y+t), 6, fill=255)
+    # eyes
+    esw = max(10, eye_size)
+    ink("eye").ellipse((cx-36, eye_y, cx-36+esw, eye_y+esw//2), fill=255)
+    ink("eye").ellipse((cx+16, eye_y, cx+16+esw, eye_y+esw//2), fill=255)
+    # nose bridge
+    rr(ink("nose"), (cx-2, eye_y+6, cx+2, eye_y+20), 2, fill=255)
+    # lips
+    rr(ink("lips"), (cx-14, lip_y, cx+14, lip_y+8), 8, fill=255)
+
+    # blush
+    if blush:
+        dx = int(geo["head_h"] * 0.30)   # horizontal offset from center
+        drop = int(geo["head_h"] * 0.20) # LOWER than before so it sits mid-cheek
+        rx = int(geo["head_h"] * 0.12)   # horizontal radius
+        ry = int(geo["head_h"] * 0.08)   # vertical radius
+
+        L = (cx - dx - rx, eye_y + drop - ry,
+             cx - dx + rx, eye_y + drop + ry)
+        R = (cx + dx - rx, eye_y + drop - ry,
+             cx + dx + rx, eye_y + drop + ry)
+
+        ink("blush").ellipse(L, fill=255)
+        ink("blush").ellipse(R, fill=255)
+    return ink.freeze()
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def draw_face(eye_hex:str, brow_hex:str, lip_hex:str, head_scale:float, brow_thick:int, eye_size:int, blush:bool):
+    return paint(face_inks(head_scale, brow_thick, eye_size, blush), {
+        "brow": hex_to_rgb(brow_hex)+(230,), "eye": hex_to_rgb(eye_hex)+(230,), "nose": (0,0,0,28),
+        "lips": hex_to_rgb(lip_hex)+(235,), "blush": (255,105,180,64),
+    })
+
+
+# hair (safe hairline + proportional volume)
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def hair_inks(style: str, head_scale: float, hairline: int, volume: int) -> Tuple:
+    geo = body_geometry(head_scale)
+    ink = _Inks()
+    dB = ink("hair")
+
+    cx        = geo["cx"]
+    head_top  = geo["head_top"]
+    head_h    = geo["head_h"]
+    head_bot  = geo["head_bottom"]
+    head_w    = int(head_h * 0.86)
+
+    hairline  = int(max(6, min(hairline, head_h // 2)))
+    volume    = int(max(0, min(volume, 100)))
+
+    scalp_curve_h = int(head_h * 0.35)  # curve depth over forehead
+
+    # Base scalp fill based on hairline + volume
+    expand_x = 1.0 + (volume * 0.002)  # widen with volume
+    expand_y = 1.0 + (volume * 0.001)  # height with volume
+
+    scalp_top = head_top + hairline  # lowers hair if hairline slider is high
+    scalp_w = int(head_w * expand_x)
+    scalp_h = int((head_bot - scalp_top) * expand_y)
+    dB.ellipse(
+        (cx - scalp_w // 2, scalp_top,
+         cx + scalp_w // 2, scalp_top + scalp_h),
+        fill=255
+    )
+    # FRONT/TOP SCALP FILL
+    scalp_top = head_top + hairline
+    scalp_w = int(head_w * (1.1 + volume * 0.002))  # widen slightly with volume
+    scalp_h = int((head_bot - scalp_top) * (1.0 + volume * 0.001))  # taller with volume
+
+    # Elliptical fill covering the top and blending into back hair
+    dB.pieslice(
+        (cx - scalp_w // 2, scalp_top - scalp_h // 3,
+         cx + scalp_w // 2, scalp_top + scalp_h),
+        start=180, end=360, fill=255
+    )
+
+    #  STYLE LAYERS
+    if style == "Bob":
+        dB.pieslice(
+            (cx - head_w//2 - 6, head_top,
+             cx + head_w//2 + 6, head_bot),
+            start=180, end=360, fill=255
+        )
+
+    elif style == "Straight":
+        dB.rectangle(
+            (cx - head_w//2 - 4, head_top + scalp_curve_h,
+             cx + head_w//2 + 4, head_bot + 20),
+            fill=255
+        )
+
+    elif style == "Waves":
+        step = int(head_w * 0.25)
+        for i in range(-head_w//2, head_w//2, step):
+            dB.pieslice(
+                (cx + i, head_bot - 10,
+                 cx + i + step, head_bot + 10),
+                start=0, end=180, fill=255
+            )
+
+    elif style == "High Pony":
+        # Ponytail above head
+        dB.ellipse(
+            (cx - 12, head_top - 28,
+             cx + 12, head_top + 20),
+            fill=255
+        )
+        dB.rectangle(
+            (cx - 6, head_top + 20,
+             cx + 6, head_bot + 50),
+            fill=255
+        )
+
+    return ink.freeze()
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def hair_layers(hair_hex: str, highlight_hex: str, style: str, head_scale: float, hairline: int, volume: int):
+    back = paint(hair_inks(style, head_scale, hairline, volume), {"hair": hex_to_rgb(hair_hex)+(255,)})
+    return back, blank()
+
+# bodice + skirt masks
+def _disk_cached(fn):
+    """Keep fn's mask as a PNG under MASK_DIR (when set), named by its bound arguments."""
+    sig = inspect.signature(fn)
+    @wraps(fn)
+    def wrapper(*args, **kw):
+        if not MASK_DIR: return fn(*args, **kw)
+        bound = sig.bind(*args, **kw); bound.apply_defaults()
+        key = re.sub(r"[^A-Za-z0-9.=-]+", "_", "-".join(f"{k}={v}" for k, v in bound.arguments.items()))
+        path = Path(MASK_DIR) / f"{fn.__name__}-v{MASK_VERSION}-{key}.png"
+        try:
+            with Image.open(path) as im:
+                return im.convert("L")
+        except (OSError, ValueError):
+            pass
+        m = fn(*args, **kw)
+        tmp = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # atomic, and a temp file of its own: worker processes and contact-sheet threads may race on a key
+            with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as f:
+                tmp = f.name
+                m.save(f, format="PNG")
+            os.replace(tmp, path)
+        except OSError:
+            if tmp: Path(tmp).unlink(missing_ok=True)
+        return m
+    return wrapper
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+@_disk_cached
+def bodice_mask(w:int,h:int, neckline:str, waist:int, sleeve:str, ss:int=4):
+    SS=ss; W,H = w*SS, h*SS; cx=W//2
+    m = Image.new("L",(W,H),0); d=ImageDraw.Draw(m,"L")
+    shoulder=int(H*0.06); under=int(H*0.20); waist_y=int(H*0.60)
+    torso_w=int(W*0.78); waist_w=max(SS, waist*SS)
+
+    d.polygon([(cx-torso_w//2,shoulder),
+               (cx-int(W*0.32),under),
+               (cx-waist_w//2,waist_y),
+               (cx+waist_w//2,waist_y),
+               (cx+int(W*0.32),under),
+               (cx+torso_w//2,shoulder)], fill=255)
+
+    if neckline=="V-neck":
+        depth=int(H*0.30)
+        d.polygon([(cx, shoulder+depth),
+                   (cx-int(W*0.20), shoulder),
+                   (cx+int(W*0.20), shoulder)], fill=0)
+    elif neckline=="Sweetheart":
+        r=int(W*0.22); top=shoulder-int(H*0.02)
+        d.pieslice((cx-r,top,cx,top+int(H*0.32)),0,180,fill=0)
+        d.pieslice((cx,top,cx+r,top+int(H*0.32)),0,180,fill=0)
+        d.polygon([(cx-int(W*0.06), top+int(H*0.16)),
+                   (cx+int(W*0.06), top+int(H*0.16)),
+                   (cx, top+int(H*0.22))], fill=0)
+    elif neckline=="Off-Shoulder":
+        band=int(H*0.12)
+        d.rectangle((cx-int(W*0.50), shoulder-band, cx+int(W*0.50), shoulder+int(H*0.02)), fill=0)
+        d.pieslice((cx-int(W*0.50), shoulder-band, cx+int(W*0.50), shoulder+band), 0, 180, fill=0)
+    else: # Scoop
+        r=int(W*0.28)
+        d.pieslice((cx-r, shoulder-int(H*0.04), cx+r, shoulder+int(H*0.26)), 0, 180, fill=0)
+
+    # sleeves
+    if sleeve!="Sleeveless":
+        if sleeve=="Cap":
+            d.ellipse((cx-int(W*0.56), shoulder-int(H*0.02), cx-int(W*0.26), under+int(H*0.10)), fill=255)
+            d.ellipse((cx+int(W*0.26), shoulder-int(H*0.02), cx+int(W*0.56), under+int(H*0.10)), fill=255)
+        elif sleeve=="Puff":
+            d.ellipse((cx-int(W*0.60), shoulder-int(H*0.04), cx-int(W*0.22), under+int(H*0.18)), fill=255)
+            d.ellipse((cx+int(W*0.22), shoulder-int(H*0.04), cx+int(W*0.60), under+int(H*0.18)), fill=255)
+        else: # Long
+            r=int(H*0.08)
+            ImageDraw.Draw(m,"L").rounded_rectangle((cx-int(W*0.60), under-r, cx-int(W*0.30), int(H*0.92)), r, fill=255)
+            ImageDraw.Draw(m,"L").rounded_rectangle((cx+int(W*0.30), under-r, cx+int(W*0.60), int(H*0.92)), r, fill=255)
+
+    return m.resize((w,h), Image.LANCZOS)
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+@_disk_cached
+def skirt_mask(w:int,h:int, cut:str, flare:int, ss:int=4):
+    SS=ss; W,H=w*SS, h*SS; cx=W//2
+    m = Image.new("L",(W,H),0); d=ImageDraw.Draw(m,"L")
+    top=int(H*0.02)
+    if cut=="A-Line":
+        d.polygon([(cx-int(W*0.22),top),(cx+int(W*0.22),top),
+                   (cx+int(W*0.46), H-int(H*0.06)),(cx-int(W*0.46), H-int(H*0.06))], fill=255)
+    elif cut=="Ball Gown":
+        d.pieslice((cx-int(W*0.70), top, cx+int(W*0.70), H+int(H*0.70)), 200, -20, fill=255)
+    elif cut=="Mermaid":
+        waist=int(W*0.24); knee=int(H*0.55)
+        d.polygon([(cx-waist//2,top),(cx+waist//2,top),
+                   (cx+int(W*0.15),knee),(cx+int(W*0.46),H-int(H*0.04)),
+                   (cx-int(W*0.46),H-int(H*0.04)),(cx-int(W*0.15),knee)], fill=255)
+    else: # Sheath
+        rad=int(W*0.05)
+        ImageDraw.Draw(m,"L").rounded_rectangle((cx-int(W*0.24), top, cx+int(W*0.24), H), rad, fill=255)
+
+    if flare>0 and cut in ("A-Line","Ball Gown"):
+        glow = Image.new("L",(W,H),0); dg=ImageDraw.Draw(glow)
+        dg.ellipse((cx-int(W*(0.34+0.01*flare)), H-int(H*0.25),
+                    cx+int(W*(0.34+0.01*flare)), H+int(H*0.55)), fill=int(60+flare*3))
+        glow = glow.filter(ImageFilter.GaussianBlur(24*SS/4))
+        m = ImageChops.lighter(m, glow)
+    return m.resize((w,h), Image.LANCZOS)
+
+# dress (fits to body via body mask)
+def draw_dress(head_scale:float, palette:Dict, opts:Dict, quality:str="final"):
+    return _dress_layer(head_scale, _frozen(palette), _frozen(opts), quality)
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def dress_geometry(head_scale:float, neckline:str, sleeve:str, skirt_cut:str, flare:int, quality:str="final") -> Dict:
+    """
+    Color-free dress cut fitted to the body: bodice and skirt coverage with their
+    canvas offsets. Keyed only by shape.
+    """
+    geo = body_geometry(head_scale); ss = quality_ss(quality)
+    cx = geo["cx"]; torso_top = geo["torso_top"]; torso_h=geo["torso_h"]
+    dilated = dilated_body_mask(head_scale, quality)
+
+    bw = int(geo["torso_w"]*2.05); bh=int(torso_h*0.96)
+    left = cx-bw//2; top = torso_top-int(bh*0.10)
+    sk_top = torso_top+int(torso_h*0.64)
+    sh = geo["leg_y0"]+int(geo["leg_h"]*0.92)-sk_top
+    sw = int(geo["torso_w"]*2.15)
+
+    m_b = bodice_mask(bw,bh,neckline, waist=geo["waist_w"], sleeve=sleeve, ss=ss)
+    m_b = ImageChops.multiply(m_b, dilated.crop((left, top, left+bw, top+bh)))
+    m_s = skirt_mask(sw,sh,skirt_cut, flare=flare, ss=ss)
+    m_s = ImageChops.lighter(m_s, dilated.crop((cx-sw//2, sk_top, cx-sw//2+sw, sk_top+sh)))
+    return {
+        "bodice": (m_b, (left, top)),
+        "skirt": (m_s, (cx-sw//2, sk_top)),
+    }
+
+def _cut(opts: Dict, palette: Dict, piece, gloss: float) -> Tuple[Image.Image, Tuple[int,int]]:
+    """Cut one dress piece: its own panel of fabric, glossed, then clipped by its coverage."""
+    mask, (x, y) = piece
+    # each panel starts the pattern at its own corner (gradient top to hem, stripe/check/dot phase)
+    pat = fabric(mask.size, opts["pattern"], palette["primary"], palette["secondary"], opts["angle"], opts["scale"], opts["glitter"])
+    pat = glossy(pat, gloss)
+    cut = Image.composite(pat, Image.new("RGBA",mask.size,(0,0,0,0)), mask)
+    # pasting through its own alpha keeps the soft, shadowed falloff of the flare glow
+    out = Image.new("RGBA",mask.size,(0,0,0,0)); out.paste(cut,(0,0),cut)
+    return out, (x, y)
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def _dress_layer(head_scale:float, palette_key:Tuple, opts_key:Tuple, quality:str):
+    palette = dict(palette_key); opts = dict(opts_key)
+    geo = body_geometry(head_scale)
+    cut = dress_geometry(head_scale, opts["neckline"], opts["sleeve"], opts["skirt_cut"], opts["flare"], quality)
+    layer = blank()
+    cx = geo["cx"]; torso_top = geo["torso_top"]; torso_h=geo["torso_h"]
+
+    # bodice (fabric is recolored from cached coverage)
+    bod, xy = _cut(opts, palette, cut["bodice"], 0.16 if opts["gloss"] else 0)
+    composite_sprites(layer, [Sprite(bod, *xy)], in_place=True)
+
+
+    # waist belt / monogram
+    if opts["belt"]:
+        waist_y = torso_top + int(torso_h * 0.57)
+        belt_h = max(14, int(torso_h * 0.08))
+        belt_w = int(geo["waist_w"] * 1.05)  # fits waist instead of torso width
+        x0 = cx - belt_w // 2
+
+        belt_img = Image.new("RGBA", (belt_w, belt_h), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(belt_img)
+
+        def rrect(dr, box, r, **kw):
+            dr.rounded_rectangle(box, radius=r, **kw)
+
+        def darken(color_val, amt=0.15):
+            # If it's a hex string, convert to RGBA
+            if isinstance(color_val, str):
+                r, g, b = hex_to_rgb(color_val)
+                a = 255
+            else:
+                if len(color_val) == 3:
+                    r, g, b = color_val
+                    a = 255
+                else:
+                    r, g, b, a = color_val
+            return (
+                int(r * (1 - amt)),
+                int(g * (1 - amt)),
+                int(b * (1 - amt)),
+                a
+            )
+
+        r = belt_h // 2
+        rrect(draw, (0, 0, belt_w - 1, belt_h - 1), r,
+              fill=palette["accent"],
+              outline=darken(palette["accent"]),
+              width=2)
+
+        # unique center plate
+        plate_w = max(48, int(belt_w * 0.25))
+        plate_h = max(20, int(belt_h * 0.75))
+        plate = Image.new("RGBA", (plate_w, plate_h), (0, 0, 0, 0))
+        pd = ImageDraw.Draw(plate)
+        rrect(pd, (0, 0, plate_w - 1, plate_h - 1), plate_h // 2,
+              fill=(255, 255, 255, 200))
+
+        txt = (opts["monogram"][:3] or "BB").upper()
+        f = try_font(min(18, plate_h - 6))
+        tcol = contrast_text("#ffffff")
+        tw, th = f.getlength(txt), f.size
+        pd.text(((plate_w - tw) / 2, (plate_h - th) / 2 - 1), txt, font=f, fill=tcol)
+
+        # plate is pasted (not blended) onto the belt so it reads as a translucent inset
+        by = waist_y - belt_h // 2
+        px = x0 + (belt_w - plate_w) // 2
+        py = waist_y - plate_h // 2
+        ux0, uy0 = min(x0, px), min(by, py)
+        buckle = Image.new("RGBA", (max(x0+belt_w, px+plate_w)-ux0, max(by+belt_h, py+plate_h)-uy0), (0,0,0,0))
+        buckle.paste(belt_img, (x0-ux0, by-uy0), belt_img)
+        buckle.paste(plate, (px-ux0, py-uy0), plate)
+        composite_sprites(layer, [Sprite(buckle, ux0, uy0)], in_place=True)
+
+
+    # skirt
+    skirt, (sx, sk_top) = _cut(opts, palette, cut["skirt"], 0.14 if opts["gloss"] else 0)
+    composite_sprites(layer, [Sprite(skirt, sx, sk_top)], in_place=True)
+    sw, sh = skirt.size
+
+    # hem highlight
+    d = ImageDraw.Draw(layer,"RGBA")
+    d.arc((cx-sw//2+8, sk_top+sh-36, cx+sw//2-8, sk_top+sh+36), 0,180, fill=palette["accent"], width=2)
+    return layer
+
+#shoes & jewelry
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def shoe_inks(head_scale:float) -> Tuple:
+    geo = body_geometry(head_scale)
+    ink = _Inks()
+    cx=geo["cx"]; foot_y = geo["leg_y0"]+int(geo["leg_h"]*0.92)
+    for sgn in (-1,1):
+        x = cx+sgn*40
+        rr(ink("shoe"),(x-20,foot_y-6,x+20,foot_y+10),8,fill=255,outline=0,width=1)   # edge sits beside the fill
+        rr(ink("edge"),(x-20,foot_y-6,x+20,foot_y+10),8,outline=255,width=1)
+        ink("sole").rectangle((x-16,foot_y+10,x+16,foot_y+24), fill=255)
+        ink("edge").rectangle((x-16,foot_y+10,x+16,foot_y+24), fill=0)   # the sole replaces the edge it overlaps
+    return ink.freeze()
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def draw_shoes(head_scale:float, shoe_hex:str):
+    col = hex_to_rgb(shoe_hex)
+    return paint(shoe_inks(head_scale), {"shoe": col+(255,), "edge": (20,20,20,120), "sole": col+(235,)})
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def accessory_inks(head_scale:float, glasses:bool, necklace:bool, earrings:bool) -> Tuple:
+    geo = body_geometry(head_scale)
+    ink = _Inks(); d = ink("acc")
+    cx=geo["cx"]; head_top = geo["head_top"]
+    if glasses:
+        y=head_top + int(geo["head_h"]*0.36)
+        rr(d,(cx-46,y-6,cx-8,y+6),6,outline=255,width=3)
+        rr(d,(cx+8,y-6,cx+46,y+6),6,outline=255,width=3)
+        d.line([(cx-8,y),(cx+8,y)], fill=255, width=3)
+    if necklace:
+        ny=geo["torso_top"]+22
+        d.arc((cx-48,ny-12,cx+48,ny+24), 10,170, fill=255, width=3)
+        d.ellipse((cx-3,ny+10,cx+3,ny+16), fill=255)
+    if earrings:
+        ear_y = head_top + int(geo["head_h"]*0.34)
+        d.ellipse((cx-56, ear_y, cx-50, ear_y+8), fill=255)
+        d.ellipse((cx+50, ear_y, cx+56, ear_y+8), fill=255)
+    return ink.freeze()
+
+@lru_cache(maxsize=LAYER_CACHE_SIZE)
+def draw_accessories(head_scale:float, acc_hex:str, glasses:bool, necklace:bool, earrings:bool):
+    return paint(accessory_inks(head_scale, glasses, necklace, earrings), {"acc": hex_to_rgb(acc_hex)+(255,)})
+
+
+def _hair_back(*args): return hair_layers(*args)[0]
+def _hair_front(*args): return hair_layers(*args)[1]
+
+@lru_cache(maxsize=7*LAYER_CACHE_SIZE)
+def layer_sprite(draw, *args) -> Sprite:
+    """draw(*args) trimmed to its visible bbox, so the stack only blends what each layer covers."""
+    return trimmed(draw(*args))
+
+def render_stage(palette:Dict, doll:Dict, opts:Dict, bg_hex:str=DEFAULT_BG, quality:str="final") -> Image.Image:
+    """
+    Composite the full doll. `doll` carries the sidebar's Doll/Accessories controls
+    (skin, hair, eyes, lips, brows, highlight, hair_style, head_scale, hairline,
+    volume, brow_thick, eye_size, blush, shoes, glasses, necklace, earrings).
+    Unchanged layers come straight from cache; only the stack is re-composited.
+    Geometry is cached apart from color, so color-only changes just repaint masks.
+    quality="draft" supersamples the body and dress masks at a lower factor for
+    interactive preview; "final" is used for export.
+    """
+    hs = doll["head_scale"]
+    hair = (doll["hair"], doll["highlight"], doll["hair_style"], hs, doll["hairline"], doll["volume"])
+    return compose(soft_bg(bg_hex), [
+        layer_sprite(_hair_back, *hair),
+        layer_sprite(draw_body, doll["skin"], hs, quality),
+        layer_sprite(_dress_layer, hs, _frozen(palette), _frozen(opts), quality),
+        layer_sprite(draw_shoes, hs, doll["shoes"]),
+        layer_sprite(draw_face, doll["eyes"], doll["brows"], doll["lips"], hs, doll["brow_thick"], doll["eye_size"], doll["blush"]),
+        layer_sprite(draw_accessories, hs, palette["accent"], doll["glasses"], doll["necklace"], doll["earrings"]),
+        layer_sprite(_hair_front, *hair),
+    ])
+
+# contact sheet: every combination of the chosen dress options for one doll
+SHEET_MAX_CELLS = 64
+
+def _stage_layers(palette:Dict, doll:Dict, bg_hex:str, quality:str) -> Tuple[Image.Image, List[Sprite]]:
+    """The dress-independent part of the stack: background+hair+body flattened, and the layers above the dress."""
+    hs = doll["head_scale"]
+    hair = (doll["hair"], doll["highlight"], doll["hair_style"], hs, doll["hairline"], doll["volume"])
+    under = compose(soft_bg(bg_hex), [layer_sprite(_hair_back, *hair), layer_sprite(draw_body, doll["skin"], hs, quality)])
+    over = [layer_sprite(draw_shoes, hs, doll["shoes"]),
+            layer_sprite(draw_face, doll["eyes"], doll["brows"], doll["lips"], hs, doll["brow_thick"], doll["eye_size"], doll["blush"]),
+            layer_sprite(draw_accessories, hs, palette["accent"], doll["glasses"], doll["necklace"], doll["earrings"]),
+            layer_sprite(_hair_front, *hair)]
+    return under, over
+
+def render_contact_sheet(palette:Dict, doll:Dict, opts:Dict, variants:Dict[str, List], bg_hex:str=DEFAULT_BG,
+                         quality:str="draft", cell_w:int=300, workers:int|None=None) -> Image.Image:
+    """
+    One grid image with a cell per combination of `variants` (dress option -> values,
+    e.g. {"neckline": [...], "skirt_cut": [...]}), everything else from `opts`.
+    The doll and background are composited once; each cell only renders its dress
+    layer (on a thread pool — Pillow releases the GIL and the layer caches are shared).
+    """
+    unknown = [k for k in variants if k not in opts]
+    if unknown: raise ValueError(f"not dress options: {', '.join(unknown)}")
+    keys = list(variants)
+    combos = list(itertools.product(*(variants[k] for k in keys)))
+    if len(combos) > SHEET_MAX_CELLS:
+        raise ValueError(f"{len(combos)} combinations; the sheet is limited to {SHEET_MAX_CELLS}")
+    under, over = _stage_layers(palette, doll, bg_hex, quality)
+    palette_key = _frozen(palette)
+    cell_h = round(cell_w * CANVAS_H / CANVAS_W)
+
+    def cell(values):
+        o = dict(opts, **dict(zip(keys, values)))
+        dress = layer_sprite(_dress_layer, doll["head_scale"], palette_key, _frozen(o), quality)
+        return compose(under, [dress, *over]).resize((cell_w, cell_h), Image.LANCZOS)
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        cells = list(pool.map(cell, combos))
+
+    cols = len(variants[keys[-1]]) if keys and len(variants[keys[-1]]) <= 6 else max(1, math.ceil(math.sqrt(len(cells))))
+    rows = max(1, math.ceil(len(cells) / cols))
+    label_h = 22 if keys else 0
+    sheet = Image.new("RGBA", (cols*cell_w, rows*(cell_h+label_h)), (255,255,255,255))
+    d = ImageDraw.Draw(sheet); f = try_font(13)
+    for i, (img, values) in enumerate(zip(cells, combos)):
+        x, y = (i % cols)*cell_w, (i // cols)*(cell_h+label_h)
+        sheet.paste(img, (x, y))
+        if label_h: d.text((x+6, y+cell_h+4), " · ".join(str(v) for v in values), font=f, fill=(60,40,60,255))
+    return sheet
+
+def export_image(stage: Image.Image, scale: int = 1) -> Image.Image:
+    """The exported PNG image: the final-quality stage upscaled by an integer factor."""
+    return upscaled(stage, scale)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 import streamlit as st
-from typing import List, Dict
+from typing import Callable, Dict, Hashable, List
+from PIL import Image
+
+from components.media_utils import png_export
 
 def section_header(title: str, subtitle: str | None = None):
     st.markdown(f"""
@@ -37,3 +40,11 @@ def page_link_grid(items: List[Dict[str, str]]):
                 st.page_link(item["href"], label="Open", use_container_width=True)
             except Exception:
                 st.link_button("Open", item["href"], use_container_width=True)
+
+def png_download(label: str, key: Hashable, make: Callable[[], Image.Image], file_name: str, **kwargs) -> bool:
+    """
+    Download button for an image export that costs nothing until clicked: make()
+    (render/upscale) and the PNG encode run on a background thread, cached by `key`.
+    """
+    return st.download_button(label, data=lambda: png_export(key, make).result(), file_name=file_name,
+                              mime="image/png", use_container_width=True, **kwargs)
@@ -6,6 +6,9 @@ from typing import List, Tuple, Dict
 from PIL import Image, ImageDraw, ImageFont
 import streamlit as st
 
+from components.media_utils import upscaled
+from components.ui import png_download
+
 
 st.set_page_config(page_title="Goals & Vision Board", page_icon="✨", layout="wide")
 
@@ -164,11 +167,13 @@ st.markdown("### Vision Board")
 # layout: simple Masonry-ish grid -> deterministic order
 thumb_cols = st.columns(grid_cols)
 images: List[Image.Image] = []
+image_ids: List[str] = []   # identifies the uploads in the export key
 if uploads:
     for i, up in enumerate(uploads):
         try:
             img = Image.open(up).convert("RGB")
             images.append(img)
+            image_ids.append(up.file_id)
             with thumb_cols[i % grid_cols]:
                 st.image(img, use_container_width=True)
         except Exception:
@@ -292,10 +297,12 @@ with right:
     st.info(affirmation(st.session_state.goals))
 
     # export PNG
-    buf = io.BytesIO()
-    export_img = board if export_scale == 1 else board.resize((board.width*export_scale, board.height*export_scale), Image.LANCZOS)
-    export_img.save(buf, format="PNG")
-    st.download_button("Download Board (PNG)", data=buf.getvalue(), file_name="vision_board.png", mime="image/png", use_container_width=True)
+    # keyed by the inputs (and the watermark's day), so a rerun never hashes the canvas
+    board_key = ("vision_board", board_w, palette_name, bg, grid_cols, tile_round, gap, tuple(image_ids), quote, subtext,
+                 sticker, tuple(tuple(sorted(g.items())) for g in st.session_state.goals[:6]),
+                 watermark and date.today().isoformat(), export_scale)
+    png_download("Download Board (PNG)", board_key,
+                 lambda: upscaled(board, export_scale), "vision_board.png")
 
     # export goals CSV
     if st.session_state.goals:
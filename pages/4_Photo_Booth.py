@@ -3,9 +3,12 @@ from __future__ import annotations
 import io, math, random
 from typing import Tuple, List, Dict, Optional
 
-import numpy as np
 import streamlit as st
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+from PIL import Image, ImageDraw, ImageFont
+
+from components.media_utils import Sprite, composite_sprites, upscaled
+from components.photo_booth import LOOK_PRESETS, apply_looks, cube_presets, look_stages, preview_scale
+from components.ui import png_download
 
 
 st.set_page_config(page_title="Photo Booth", page_icon="📸", layout="wide")
@@ -38,11 +41,7 @@ def blank(w: int, h: int, color=(0,0,0,0)) -> Image.Image:
 
 def center_paste(canvas: Image.Image, child: Image.Image, xy: Tuple[int,int]) -> Image.Image:
     """Paste child at xy *center* (child center at xy) with alpha."""
-    x = int(xy[0] - child.width/2)
-    y = int(xy[1] - child.height/2)
-    layer = blank(*canvas.size)
-    layer.paste(child, (x, y), child)
-    return Image.alpha_composite(canvas, layer)
+    return composite_sprites(canvas, [Sprite.centered(child, xy, masked=True)])
 
 def fit_cover(img: Image.Image, box_w: int, box_h: int) -> Image.Image:
     """Scale/crop to completely cover target box (like CSS background-size: cover)."""
@@ -54,136 +53,78 @@ def fit_cover(img: Image.Image, box_w: int, box_h: int) -> Image.Image:
     y = (nh - box_h) // 2
     return im.crop((x, y, x + box_w, y + box_h)).convert("RGBA")
 
-
-def apply_basic_adjust(img: Image.Image, bright=1.0, contrast=1.0, color=1.0, sharp=1.0) -> Image.Image:
-    out = ImageEnhance.Brightness(img).enhance(float(bright))
-    out = ImageEnhance.Contrast(out).enhance(float(contrast))
-    out = ImageEnhance.Color(out).enhance(float(color))
-    out = ImageEnhance.Sharpness(out).enhance(float(sharp))
-    return out
-
-def temperature_tint(img: Image.Image, temp: float = 0.0) -> Image.Image:
-    """temp in [-1..+1]: negative=cool, positive=warm."""
-    if abs(temp) < 1e-3: return img
-    r, g, b, a = img.split()
-    t = clamp(temp, -1, 1)
-    r = r.point(lambda p: clamp(int(p * (1 + 0.15*t)), 0, 255))
-    b = b.point(lambda p: clamp(int(p * (1 - 0.15*t)), 0, 255))
-    return Image.merge("RGBA", (r, g, b, a))
-
-def bloom(img: Image.Image, strength: float = 0.0, radius: int = 10) -> Image.Image:
-    """Soft glow bloom."""
-    if strength <= 0: return img
-    blur = img.filter(ImageFilter.GaussianBlur(radius=max(2, radius)))
-    return Image.blend(img, blur, alpha=float(clamp(strength, 0, 1)))
-
-def vignette(img: Image.Image, strength: float = 0.0) -> Image.Image:
-    if strength <= 0: return img
-    w, h = img.size
-    mask = Image.new("L", (w, h), 255)
-    d = ImageDraw.Draw(mask)
-    d.ellipse((-int(w*0.35), -int(h*0.35), int(w*1.35), int(h*1.35)), fill=0)
-    mask = mask.filter(ImageFilter.GaussianBlur(int(min(w, h)*0.12)))
-    dark = Image.new("RGBA", (w, h), (0, 0, 0, int(220*strength)))
-    return Image.composite(Image.alpha_composite(img, dark), img, mask)  # dark corners
-
-def film_grain(img: Image.Image, amount: float = 0.0) -> Image.Image:
-    if amount <= 0: return img
-    w, h = img.size
-    noise = (np.random.random((h, w))*255).astype(np.uint8)
-    n = Image.fromarray(noise, mode="L").filter(ImageFilter.GaussianBlur(0.6))
-    alpha = n.point(lambda p: int(p * clamp(amount, 0, 0.25)))
-    grain = Image.merge("RGBA", (n, n, n, alpha))
-    return Image.alpha_composite(img, grain)
-
-def matte_fade(img: Image.Image, lift: int = 0) -> Image.Image:
-    """Lift blacks for a matte/retro vibe. lift 0..80."""
-    if lift <= 0: return img
-    r, g, b, a = img.split()
-    def f(p): return clamp(int((p/255)**0.9 * (255 - lift) + lift), 0, 255)
-    return Image.merge("RGBA", (r.point(f), g.point(f), b.point(f), a))
-
-# LUT-ish presets built from the above
-def apply_preset(img: Image.Image, name: str) -> Image.Image:
-    name = (name or "").lower()
-    if name == "" or name == "none": return img
-    out = img
-    if name == "barbie glam":
-        out = apply_basic_adjust(out, 1.06, 1.08, 1.18, 1.02)
-        out = temperature_tint(out, +0.25)
-        out = bloom(out, 0.18, 12)
-        out = vignette(out, 0.15)
-    elif name == "retro film":
-        out = apply_basic_adjust(out, 0.98, 1.04, 0.92, 0.9)
-        out = temperature_tint(out, -0.08)
-        out = matte_fade(out, 36)
-        out = film_grain(out, 0.18)
-        out = vignette(out, 0.22)
-    elif name == "dreamy pastel":
-        out = apply_basic_adjust(out, 1.04, 0.96, 1.25, 0.9)
-        out = bloom(out, 0.28, 18)
-        out = temperature_tint(out, +0.18)
-    elif name == "noir":
-        # convert to monochrome with contrast boost
-        r, g, b, a = out.split()
-        gray = Image.merge("RGB", (r, g, b)).convert("L")
-        gray = ImageEnhance.Contrast(gray).enhance(1.35)
-        out = Image.merge("RGBA", (gray, gray, gray, a))
-        out = vignette(out, 0.25)
-        out = matte_fade(out, 28)
-    else:
-        return img
-    return out
-
-
-def frame_none(canvas: Image.Image) -> Image.Image:
+def fit_photo(data: bytes, box_w: int, box_h: int, cover: bool, draft: bool = False) -> Image.Image:
+    """
+    The photo fitted to the box: Cover crops, Contain letterboxes transparent. With draft,
+    a JPEG decodes at the smallest DCT scale still big enough (for preview proxies).
+    """
+    img = Image.open(io.BytesIO(data))
+    if draft:
+        fit = (max if cover else min)(box_w / img.width, box_h / img.height)
+        img.draft("RGB", (math.ceil(img.width*fit), math.ceil(img.height*fit)))
+    img = img.convert("RGBA")
+    if cover:
+        return fit_cover(img, box_w, box_h)
+    # Contain: keep whole image inside, letterbox transparent
+    img.thumbnail((box_w, box_h), Image.LANCZOS)
+    fitted = blank(box_w, box_h)
+    fitted.paste(img, ((box_w - img.width)//2, (box_h - img.height)//2), img)
+    return fitted
+
+
+# frames take k, the canvas scale (< 1 for preview proxies): their px sizes are at k = 1
+def frame_none(canvas: Image.Image, k: float = 1.0) -> Image.Image:
     return canvas
 
-def frame_glass(canvas: Image.Image) -> Image.Image:
+def frame_glass(canvas: Image.Image, k: float = 1.0) -> Image.Image:
     w, h = canvas.size
     overlay = blank(w, h)
     d = ImageDraw.Draw(overlay, "RGBA")
-    d.rounded_rectangle((12, 12, w-12, h-12), radius=28, outline=(255,255,255,200), width=2)
-    d.rounded_rectangle((24, 24, w-24, h-24), radius=24, fill=(255,255,255,70))
+    a, b = round(12*k), round(24*k)
+    d.rounded_rectangle((a, a, w-a, h-a), radius=round(28*k), outline=(255,255,255,200), width=max(1, round(2*k)))
+    d.rounded_rectangle((b, b, w-b, h-b), radius=b, fill=(255,255,255,70))
     shine = blank(w, h)
     ds = ImageDraw.Draw(shine)
     ds.polygon([(0,0),(int(w*0.55),0),(0,int(h*0.25))], fill=(255,255,255,50))
     return Image.alpha_composite(Image.alpha_composite(canvas, overlay), shine)
 
-def frame_polaroid(canvas: Image.Image) -> Image.Image:
+def frame_polaroid(canvas: Image.Image, k: float = 1.0) -> Image.Image:
     w, h = canvas.size
     pad = int(min(w,h)*0.06)
     bottom = int(pad*2.6)
     frame = blank(w, h)
     d = ImageDraw.Draw(frame, "RGBA")
-    d.rounded_rectangle((pad, pad, w-pad, h-pad), radius=28, fill=(255,255,255,255))
+    d.rounded_rectangle((pad, pad, w-pad, h-pad), radius=round(28*k), fill=(255,255,255,255))
     # window cut
     win = (pad+int(pad*0.6), pad+int(pad*0.6), w-pad-int(pad*0.6), h-pad-bottom)
     mask = Image.new("L", (w, h), 255); dm = ImageDraw.Draw(mask)
-    dm.rounded_rectangle(win, radius=18, fill=0)
+    dm.rounded_rectangle(win, radius=round(18*k), fill=0)
     frame.putalpha(mask.point(lambda p: 255 - p))
     return Image.alpha_composite(frame, canvas)
 
-def frame_film(canvas: Image.Image) -> Image.Image:
+def frame_film(canvas: Image.Image, k: float = 1.0) -> Image.Image:
     w, h = canvas.size
     overlay = blank(w, h)
     d = ImageDraw.Draw(overlay, "RGBA")
-    d.rectangle((0, 0, w, h), outline=(25,25,25,255), width=46)
-    hole_w, hole_h, gap = 36, 22, 100
-    for x in range(70, w-70, gap):
-        d.rounded_rectangle((x, 22, x+hole_w, 22+hole_h), 6, fill=(230,230,230,220))
-        d.rounded_rectangle((x, h-22-hole_h, x+hole_w, h-22), 6, fill=(230,230,230,220))
+    d.rectangle((0, 0, w, h), outline=(25,25,25,255), width=round(46*k))
+    hole_w, hole_h, gap, edge, r = (round(v*k) for v in (36, 22, 100, 22, 6))
+    for x in range(round(70*k), w-round(70*k), gap):
+        d.rounded_rectangle((x, edge, x+hole_w, edge+hole_h), r, fill=(230,230,230,220))
+        d.rounded_rectangle((x, h-edge-hole_h, x+hole_w, h-edge), r, fill=(230,230,230,220))
     return Image.alpha_composite(canvas, overlay)
 
-def frame_glitter(canvas: Image.Image, color="#ff4fb7") -> Image.Image:
+def frame_glitter(canvas: Image.Image, k: float = 1.0, color="#ff4fb7") -> Image.Image:
     w, h = canvas.size
     overlay = blank(w, h)
     d = ImageDraw.Draw(overlay, "RGBA")
-    d.rounded_rectangle((10, 10, w-10, h-10), radius=26, outline=hex_to_rgba(color, 255), width=6)
+    e = round(10*k)
+    d.rounded_rectangle((e, e, w-e, h-e), radius=round(26*k), outline=hex_to_rgba(color, 255), width=max(1, round(6*k)))
+    # the dots are scattered over the full-size frame and scaled, so a proxy shows the same glitter
+    W, H = round(w/k), round(h/k)
     rng = random.Random(21)
-    for _ in range(int((w+h)*0.6)):
-        x, y = rng.randint(12, w-12), rng.randint(12, h-12)
-        r = rng.randint(1, 3)
+    for _ in range(int((W+H)*0.6)):
+        x, y = rng.randint(12, W-12)*k, rng.randint(12, H-12)*k
+        r = rng.randint(1, 3)*k
         a = rng.randint(120, 220)
         d.ellipse((x-r, y-r, x+r, y+r), fill=hex_to_rgba(color, a))
     return Image.alpha_composite(canvas, overlay)
@@ -259,7 +200,7 @@ with st.sidebar:
     st.divider()
 
     st.header("Looks")
-    preset_name = st.selectbox("Preset", ["None","Barbie Glam","Retro Film","Dreamy Pastel","Noir"], index=1)
+    preset_name = st.selectbox("Preset", ["None", *LOOK_PRESETS, *cube_presets()], index=1)
     bright = st.slider("Brightness", 0.3, 1.7, 1.0, 0.01)
     contrast = st.slider("Contrast", 0.3, 1.7, 1.0, 0.01)
     saturation = st.slider("Saturation", 0.3, 1.7, 1.0, 0.01)
@@ -301,70 +242,83 @@ with st.sidebar:
 
     st.header("Export")
     export_scale = st.select_slider("Scale", [1,2,3], value=2)
-
-
-# base canvas
-canvas = blank(CANVAS_W, CANVAS_H, hex_to_rgba(bg_color))
+    fast_preview = st.toggle("Fast preview", True, help="Preview a smaller copy while editing; the download is always full size.")
+
+
+# the preview renders a proxy at scale k (about PREVIEW_PIXELS); full size only for the download
+k = preview_scale((CANVAS_W, CANVAS_H)) if fast_preview else 1.0
+stickers = [dict(s) for s in st.session_state.pb_stickers]
+
+def render_booth(fx: Optional[Image.Image], k: float = 1.0) -> Image.Image:
+    """The booth at k times its size around fx, the looked photo already fitted at that scale."""
+    W, H = round(CANVAS_W*k), round(CANVAS_H*k)
+    canvas = blank(W, H, hex_to_rgba(bg_color))
+    if fx is not None:
+        # paste centered box
+        canvas = composite_sprites(canvas, [Sprite(fx, round(padding*k), round(padding*k), masked=True)], in_place=True)
+
+    # caption
+    if caption.strip():
+        f = try_font(max(1, round(cap_size*k)))
+        x, y, off = round(cap_x*k), round(cap_y*k), max(1, round(2*k))
+        # draw into a layer that only spans the text (+ its shadow offset)
+        tx0, ty0, tx1, ty1 = ImageDraw.Draw(canvas).textbbox((x, y), caption, font=f)
+        txt = Image.new("RGBA", (max(1, tx1-tx0+off), max(1, ty1-ty0+off)), (0,0,0,0))
+        d = ImageDraw.Draw(txt)
+        shadow = (0,0,0,90)
+        d.text((x+off-tx0, y+off-ty0), caption, font=f, fill=shadow)
+        d.text((x-tx0, y-ty0), caption, font=f, fill=hex_to_rgba(cap_color))
+        canvas = composite_sprites(canvas, [Sprite(txt, tx0, ty0)], in_place=True)
+
+    # stickers (each one only blends the box it covers), drawn full size and scaled down with the rest
+    sprites: List[Sprite] = []
+    for s in stickers:
+        base = sticker_shape(s["name"], s["size"], s["color"])
+        sticker_img = rotate_scale(base, s["deg"], s["scale"]*k)
+        x = clamp(round(s["x"]*k) - sticker_img.width//2, 0, W - sticker_img.width)
+        y = clamp(round(s["y"]*k) - sticker_img.height//2, 0, H - sticker_img.height)
+        sprites.append(Sprite(sticker_img, x, y, masked=True))
+    canvas = composite_sprites(canvas, sprites, in_place=True)
+
+    # frame last
+    return FRAME_STYLES[frame_style](canvas, k)
+
+def fitted_photo(k: float = 1.0) -> Image.Image:
+    """The photo fitted to the padded box at scale k."""
+    box = (round(CANVAS_W*k) - 2*round(padding*k), round(CANVAS_H*k) - 2*round(padding*k))
+    cover = fill_mode.startswith("Cover")
+    if k == 1:
+        return fit_photo(photo_data, *box, cover)
+    # fitting decodes the whole upload; the proxy is kept until the photo or its box changes
+    key = (photo_id, box, cover)
+    if st.session_state.get("pb_proxy", (None,))[0] != key:
+        st.session_state.pb_proxy = (key, fit_photo(photo_data, *box, cover, draft=True))
+    return st.session_state.pb_proxy[1]
+
+def full_render() -> Image.Image:
+    return render_booth(apply_looks(fitted_photo(), stages) if photo_data is not None else None)
 
 # bring in photo
-photo: Optional[Image.Image] = None
-if file is not None:
+up = file if file is not None else shot
+photo_data = photo_id = fitted = fx = None
+if up is not None:
+    photo_data, photo_id = up.getvalue(), up.file_id
     try:
-        photo = Image.open(file).convert("RGBA")
+        fitted = fitted_photo(k)
     except Exception:
-        st.error("Could not read the uploaded image.")
-elif shot is not None:
+        st.error("Could not read the uploaded image." if file is not None else "Could not read the camera shot.")
+        photo_data = photo_id = None
+
+# apply looks
+stages = look_stages(bright, contrast, saturation, sharpness, temp, bloom_amt, matte, vign, grain, preset_name)
+if fitted is not None:
     try:
-        photo = Image.open(shot).convert("RGBA")
-    except Exception:
-        st.error("Could not read the camera shot.")
-
-if photo is not None:
-    box_w = CANVAS_W - padding*2
-    box_h = CANVAS_H - padding*2
-    if fill_mode.startswith("Cover"):
-        fitted = fit_cover(photo, box_w, box_h)
-    else:
-        # Contain: keep whole image inside, letterbox transparent
-        img = photo.copy()
-        img.thumbnail((box_w, box_h), Image.LANCZOS)
-        fitted = blank(box_w, box_h)
-        fitted.paste(img, ((box_w - img.width)//2, (box_h - img.height)//2), img)
-    # apply looks
-    fx = apply_basic_adjust(fitted, bright, contrast, saturation, sharpness)
-    fx = temperature_tint(fx, temp)
-    fx = bloom(fx, bloom_amt, 14)
-    fx = matte_fade(fx, matte)
-    fx = vignette(fx, vign)
-    fx = film_grain(fx, grain)
-    fx = apply_preset(fx, preset_name)
-    # paste centered box
-    layer = blank(CANVAS_W, CANVAS_H)
-    layer.paste(fx, (padding, padding), fx)
-    canvas = Image.alpha_composite(canvas, layer)
-
-# caption
-if caption.strip():
-    f = try_font(int(cap_size))
-    txt = Image.new("RGBA", (CANVAS_W, CANVAS_H), (0,0,0,0))
-    d = ImageDraw.Draw(txt)
-    shadow = (0,0,0,90)
-    d.text((cap_x+2, cap_y+2), caption, font=f, fill=shadow)
-    d.text((cap_x, cap_y), caption, font=f, fill=hex_to_rgba(cap_color))
-    canvas = Image.alpha_composite(canvas, txt)
-
-# stickers
-for s in st.session_state.pb_stickers:
-    base = sticker_shape(s["name"], s["size"], s["color"])
-    sticker_img = rotate_scale(base, s["deg"], s["scale"])
-    layer = blank(CANVAS_W, CANVAS_H)
-    x = clamp(s["x"] - sticker_img.width//2, 0, CANVAS_W - sticker_img.width)
-    y = clamp(s["y"] - sticker_img.height//2, 0, CANVAS_H - sticker_img.height)
-    layer.paste(sticker_img, (x, y), sticker_img)
-    canvas = Image.alpha_composite(canvas, layer)
-
-# frame last
-canvas = FRAME_STYLES[frame_style](canvas)
+        fx = apply_looks(fitted, stages, k)
+    except ValueError as e:  # a broken .cube preset
+        st.error(f"Could not apply the {preset_name} look: {e}")
+        stages = look_stages(bright, contrast, saturation, sharpness, temp, bloom_amt, matte, vign, grain)
+        fx = apply_looks(fitted, stages, k)
+canvas = render_booth(fx, k)
 
 
 st.markdown("### 🎛️ Scene Presets")
@@ -405,8 +359,12 @@ if "__preset_fill" in st.session_state:
     del st.session_state["__preset_fill"]
 
 
-st.image(canvas, caption="Photo Booth Preview", use_container_width=True)
+st.image(canvas, caption="Photo Booth Preview" + (" (fast)" if k < 1 else ""), use_container_width=True)
 
-out = canvas if export_scale == 1 else canvas.resize((CANVAS_W*export_scale, CANVAS_H*export_scale), Image.LANCZOS)
-buf = io.BytesIO(); out.save(buf, format="PNG")
-st.download_button("Download PNG", data=buf.getvalue(), file_name="photo_booth.png", mime="image/png", use_container_width=True)
+# a proxy preview is not the export, so the key is everything that goes into the full-size render;
+# it runs only when the button is clicked (grain is random, so one render per key)
+export_key = ("photo_booth", photo_id, CANVAS_W, CANVAS_H, bg_color, frame_style, fill_mode, padding, stages,
+              caption, cap_color, cap_size, cap_x, cap_y, tuple(tuple(sorted(s.items())) for s in stickers), export_scale)
+full = canvas if k == 1 else None
+png_download("Download PNG", export_key,
+             lambda: upscaled(full if full is not None else full_render(), export_scale), "photo_booth.png")
@@ -11,6 +11,9 @@ import pandas as pd
 import streamlit as st
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 
+from components.media_utils import upscaled
+from components.ui import png_download
+
 
 st.set_page_config(page_title="Party Playlist", page_icon="🎉", layout="wide")
 
@@ -404,18 +407,16 @@ st.image(cover, caption="Cover Art Preview (1080×1080)", use_container_width=Tr
 
 c1, c2 = st.columns(2)
 with c1:
-    buf = io.BytesIO()
-    out = cover if export_scale == 1 else cover.resize((cover.width*export_scale, cover.height*export_scale), Image.LANCZOS)
-    out.save(buf, format="PNG")
-    st.download_button("Download Cover (PNG)", data=buf.getvalue(), file_name="party_cover.png", mime="image/png", use_container_width=True)
+    cover_key = ("party_cover", PRIMARY, SECONDARY, repr(sorted(meta.items())), export_scale)
+    png_download("Download Cover (PNG)", cover_key,
+                 lambda: upscaled(cover, export_scale), "party_cover.png")
 
 with c2:
-
-    poster = render_cover(size=(1600, 1000), bg1=SECONDARY, bg2=PRIMARY, title=f"{meta['emoji']} {meta['name']}", subtitle="tonight's soundtrack", sticker="vibes")
-    pbuf = io.BytesIO()
-    pout = poster if export_scale == 1 else poster.resize((poster.width*export_scale, poster.height*export_scale), Image.LANCZOS)
-    pout.save(pbuf, format="PNG")
-    st.download_button("Download Poster (PNG)", data=pbuf.getvalue(), file_name="party_poster.png", mime="image/png", use_container_width=True)
+    # the poster is only rendered when someone actually downloads it
+    poster_key = ("party_poster", PRIMARY, SECONDARY, repr(sorted(meta.items())), export_scale)
+    png_download("Download Poster (PNG)", poster_key, lambda: upscaled(render_cover(
+        size=(1600, 1000), bg1=SECONDARY, bg2=PRIMARY, title=f"{meta['emoji']} {meta['name']}",
+        subtitle="tonight's soundtrack", sticker="vibes"), export_scale), "party_poster.png")
 
 st.divider()
 
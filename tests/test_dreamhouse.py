@@ -0,0 +1,117 @@
+import math, random
+
+import pytest
+
+from components.dreamhouse import (CANVAS_H, CANVAS_W, CATALOG, DEFAULT_COLORS, INDEX_CELL, WALL_KINDS, ItemIndex,
+                                   SceneCompositor, _overlaps, item_box, render_scene, skyline_pack, smart_layout)
+from components.dreamhouse_tiles import DEFAULT_SETTINGS
+
+
+def random_items(n, seed=0):
+    rng = random.Random(seed)
+    kinds = list(CATALOG)
+    items = []
+    for _ in range(n):
+        k = rng.choice(kinds)
+        c1, c2 = DEFAULT_COLORS[k]
+        items.append(dict(kind=k, x=rng.randrange(CANVAS_W), y=rng.randrange(CANVAS_H), w=rng.randrange(40, 300),
+                          h=rng.randrange(40, 240), rot=rng.choice([0.0, 12.0, -30.0]), c1=c1, c2=c2, extra=""))
+    return items
+
+def overlapping_pairs(boxes):
+    return [(a, b) for i, a in enumerate(boxes) for b in boxes[i+1:]
+            if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_skyline_pack_places_rects_inside_without_overlap(seed):
+    rng = random.Random(seed)
+    sizes = [(rng.randrange(1, 200), rng.randrange(1, 150)) for _ in range(300)]
+    spots = skyline_pack(sizes, 1000, 600)
+    boxes = [(x, y, x+w, y+h) for (w, h), spot in zip(sizes, spots) if spot for x, y in [spot]]
+    assert boxes and all(0 <= b[0] and b[2] <= 1000 and 0 <= b[1] and b[3] <= 600 for b in boxes)
+    assert overlapping_pairs(boxes) == []
+
+def test_skyline_pack_fills_an_exact_fit():
+    assert sorted(skyline_pack([(50, 50)]*4, 100, 100)) == [(0, 0), (0, 50), (50, 0), (50, 50)]
+    assert skyline_pack([(101, 10)], 100, 100) == [None]
+
+def test_smart_layout_keeps_bands_and_canvas():
+    items = random_items(60)
+    unplaced = smart_layout(items)
+    floor_y = int(CANVAS_H*0.55)
+    placed = [(it, item_box(it)) for i, it in enumerate(items) if i not in unplaced]
+    assert placed
+    for it, b in placed:
+        assert 0 <= b[0] and b[2] <= CANVAS_W and 0 <= b[1] and b[3] <= CANVAS_H
+        assert (b[3] <= floor_y - 6) if it["kind"] in WALL_KINDS else (b[1] >= floor_y)
+    assert overlapping_pairs([b for _, b in placed]) == []
+
+
+def brute_at(boxes, x, y):
+    return max((i for i, b in enumerate(boxes) if b[0] <= x < b[2] and b[1] <= y < b[3]), default=None)
+
+def brute_nearest(boxes, x, y):
+    dist = lambda b: math.hypot(max(b[0] - x, 0, x - b[2] + 1), max(b[1] - y, 0, y - b[3] + 1))
+    return min(range(len(boxes)), key=lambda i: (dist(boxes[i]), -i), default=None)
+
+@pytest.mark.parametrize("cell", [64, INDEX_CELL, 1000])
+def test_item_index_matches_brute_force_through_edits(cell):
+    rng = random.Random(cell)
+    items = random_items(120, seed=cell)
+    index = ItemIndex(cell)
+    for step in range(40):
+        # the page's edits: move, resize/rotate, duplicate, delete, reorder
+        op = step % 5
+        i = rng.randrange(len(items))
+        if op == 0:
+            items[i]["x"], items[i]["y"] = rng.randrange(-200, CANVAS_W + 200), rng.randrange(CANVAS_H)   # in place, like the sliders
+        elif op == 1:
+            items[i] = dict(items[i], w=rng.randrange(40, 800), rot=rng.uniform(-45, 45))
+        elif op == 2:
+            items.insert(i + 1, dict(items[i], x=items[i]["x"] + 40))
+        elif op == 3:
+            items.pop(i)
+        else:
+            items[i], items[-1] = items[-1], items[i]
+        index.sync(items)
+        boxes = [item_box(it) for it in items]
+        assert len(index) == len(items)
+        for _ in range(25):
+            x, y = rng.randrange(-300, CANVAS_W + 300), rng.randrange(-300, CANVAS_H + 300)
+            assert index.at(x, y) == brute_at(boxes, x, y)
+            assert index.nearest(x, y) == brute_nearest(boxes, x, y)
+            q = (x, y, x + rng.randrange(1, 500), y + rng.randrange(1, 400))
+            assert index.overlapping(q) == [j for j, b in enumerate(boxes) if _overlaps(b, q)]
+
+def test_item_index_empty():
+    index = ItemIndex()
+    index.sync(random_items(5))
+    index.sync([])
+    assert len(index) == 0 and index.at(10, 10) is None and index.nearest(10, 10) is None
+    assert index.overlapping((0, 0, CANVAS_W, CANVAS_H)) == []
+
+
+def test_compositor_edits_match_a_full_render():
+    rng = random.Random(7)
+    items = random_items(40, seed=7)
+    settings = dict(DEFAULT_SETTINGS, ambient_power=0.3, spot_lights=2)
+    compositor = SceneCompositor()
+    for step in range(24):
+        op = step % 6
+        i = rng.randrange(len(items))
+        if op == 0:
+            items[i]["x"], items[i]["y"] = rng.randrange(CANVAS_W), rng.randrange(CANVAS_H)
+        elif op == 1:
+            items[i]["rot"], items[i]["c1"] = rng.choice([0.0, 7.5, -40.0]), "#%06x" % rng.randrange(1 << 24)
+        elif op == 2:
+            items.insert(i, dict(items[i], x=items[i]["x"] + 40, y=items[i]["y"] + 20))
+        elif op == 3:
+            items.pop(i)
+        elif op == 4:
+            items[i], items[i-1] = items[i-1], items[i]
+        elif step == 11:
+            settings = dict(settings, snap=True, wall_mode="Panel")
+        got = compositor.render(settings, items)
+        assert got.tobytes() == render_scene(settings, items).tobytes(), f"step {step}"
+    assert compositor.render(settings, []).tobytes() == render_scene(settings, []).tobytes()
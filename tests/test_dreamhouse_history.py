@@ -0,0 +1,94 @@
+import copy, random
+
+from components.dreamhouse import CATALOG, DEFAULT_COLORS
+from components.dreamhouse_history import EditHistory
+
+
+def item(n, kind="Sofa"):
+    c1, c2 = DEFAULT_COLORS[kind]
+    return dict(kind=kind, x=10*n, y=600, w=200, h=120, rot=0.0, c1=c1, c2=c2, extra="")
+
+def edit(items, rng):
+    """One of the page's edits, in place like the page does it."""
+    op = rng.randrange(5)
+    i = rng.randrange(len(items))
+    if op == 0:
+        items[i]["x"] = rng.randrange(1400)
+    elif op == 1 or len(items) < 3:
+        items.insert(i, item(rng.randrange(100), rng.choice(list(CATALOG))))
+    elif op == 2:
+        items.pop(i)
+    elif op == 3:
+        items[i], items[i-1] = items[i-1], items[i]
+    else:
+        for it in items:   # Smart Layout moves everything
+            it["y"] = rng.randrange(900)
+
+
+def test_undo_and_redo_walk_back_and_forth_through_every_state():
+    rng = random.Random(1)
+    items = [item(n) for n in range(30)]
+    history = EditHistory(items)
+    states = [copy.deepcopy(items)]
+    for _ in range(40):
+        edit(items, rng)
+        assert history.commit(items)
+        states.append(copy.deepcopy(items))
+    for state in reversed(states[:-1]):
+        assert history.undo() and history.items() == state
+    assert not history.undo() and history.redo_steps == 40
+    for state in states[1:]:
+        assert history.redo() and history.items() == state
+    assert not history.redo()
+
+def test_unchanged_commit_is_not_a_step_and_a_new_edit_drops_redo():
+    items = [item(n) for n in range(5)]
+    history = EditHistory(items)
+    assert not history.commit(items)
+    items[2]["x"] += 1
+    history.commit(items)
+    history.undo()
+    items = history.items()
+    items[0]["rot"] = 10.0
+    assert history.commit(items)
+    assert (history.undo_steps, history.redo_steps) == (1, 0)
+    assert history.items() == items
+
+def test_items_are_fresh_copies():
+    history = EditHistory([item(0)])
+    history.items()[0]["x"] = 999
+    assert history.items()[0]["x"] == 0
+
+def test_depth_drops_the_oldest_steps():
+    items = [item(n) for n in range(5)]
+    history = EditHistory(items, depth=4)
+    states = []
+    for n in range(10):
+        items[0]["x"] = n
+        history.commit(items)
+        states.append(copy.deepcopy(items))
+    assert history.undo_steps == 4
+    while history.undo():
+        pass
+    assert history.items() == states[5]
+
+def test_byte_budget_and_structural_sharing():
+    items = [item(n) for n in range(1000)]
+    history = EditHistory(items)
+    items[500]["x"] += 5
+    history.commit(items)
+    one_move = history.nbytes
+    assert 0 < one_move < 4096   # two records, not a copy of 1,000 items
+    history = EditHistory(items, max_bytes=5*one_move)
+    for n in range(20):
+        items[n]["x"] += 5
+        history.commit(items)
+        assert history.nbytes <= history.max_bytes
+    assert 0 < history.undo_steps < 20
+    undone = history.nbytes
+    history.undo()
+    assert history.nbytes == undone   # redo steps still count
+    for it in items:
+        it["y"] += 1
+    history.commit(items)   # bigger than the whole budget: kept nowhere
+    assert (history.undo_steps, history.redo_steps, history.nbytes) == (0, 0, 0)
@@ -0,0 +1,77 @@
+import io, json, random
+
+import pytest
+
+from components.dreamhouse import CANVAS_H, CANVAS_W, CATALOG, DEFAULT_COLORS
+from components import dreamhouse_io
+from components.dreamhouse_io import dump_json, dump_scene, load_scene
+
+SETTINGS = {"wall_mode": "Panel", "snap": True, "ambient_power": 0.3, "spot_lights": 2}
+ITEMS = [dict(kind=k, x=100 + 7*i, y=300, w=120, h=90, rot=-5.0, c1=DEFAULT_COLORS[k][0], c2=DEFAULT_COLORS[k][1], extra="")
+         for i, k in enumerate(CATALOG)] * 20
+
+
+@pytest.mark.parametrize("dump", [dump_json, dump_scene, lambda s, i: dump_scene(s, i, compress=False)])
+def test_scene_round_trips(dump):
+    assert load_scene(dump(SETTINGS, ITEMS)) == (SETTINGS, ITEMS)
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_damaged_scenes_raise_only_value_error(compress):
+    data = dump_scene(SETTINGS, ITEMS, compress)
+    rng = random.Random(0)
+    for n in range(1500):
+        b = bytearray(data)
+        if n % 3 == 0:
+            b = b[:rng.randrange(len(b))]
+        else:
+            for _ in range(rng.randrange(1, 4)):
+                b[rng.randrange(len(b))] ^= 1 << rng.randrange(8)
+        try:
+            load_scene(bytes(b))
+        except ValueError:
+            pass
+
+@pytest.mark.parametrize("dump", [dump_json, dump_scene])
+def test_items_off_the_canvas_save_and_load_clamped(dump):
+    # Duplicate near the edge and the old Smart Layout both left items past the canvas
+    items = [dict(ITEMS[0], x=1500, y=-30), dict(ITEMS[1], x=CANVAS_W + 40, y=CANVAS_H + 20)]
+    settings, loaded = load_scene(dump(SETTINGS, items))
+    assert [(it["x"], it["y"]) for it in loaded] == [(CANVAS_W, 0), (CANVAS_W, CANVAS_H)]
+    assert load_scene(dump(settings, loaded)) == (settings, loaded)
+
+def test_old_json_with_off_canvas_items_imports():
+    data = json.dumps({"settings": SETTINGS, "items": [dict(ITEMS[2], x=1620.0, y=700)]}).encode()
+    assert load_scene(data)[1][0]["x"] == CANVAS_W
+
+def test_nan_and_malformed_positions_are_rejected():
+    for bad in (float("nan"), "12", 1.5):
+        with pytest.raises(ValueError, match="item 1"):
+            load_scene(json.dumps({"items": [dict(ITEMS[0], x=bad)]}).encode())
+
+class ChunkedReads(io.BytesIO):
+    """Records read sizes; the JSON import must never ask for the whole upload."""
+    def __init__(self, data):
+        super().__init__(data)
+        self.sizes = []
+
+    def read(self, size=-1):
+        self.sizes.append(size)
+        return super().read(size)
+
+def test_json_is_read_in_bounded_blocks(monkeypatch):
+    monkeypatch.setattr(dreamhouse_io, "CHUNK", 256)
+    monkeypatch.setattr(dreamhouse_io, "JSON_BLOCK", 7)
+    stream = ChunkedReads(dump_json(SETTINGS, ITEMS))
+    assert load_scene(stream) == (SETTINGS, ITEMS)
+    assert all(0 < size < 4096 for size in stream.sizes[1:])   # the first read is the magic sniff
+
+def test_json_errors_name_the_item_across_blocks(monkeypatch):
+    monkeypatch.setattr(dreamhouse_io, "JSON_BLOCK", 7)
+    items = ITEMS[:30] + [dict(ITEMS[0], w=5)] + ITEMS[:3]
+    with pytest.raises(ValueError, match="item 31: w outside"):
+        load_scene(json.dumps({"settings": SETTINGS, "items": items}).encode())
+
+@pytest.mark.parametrize("data", [b"[]", b'{"items": {}}', b'{"items": [],}', b'{"items": [1,]}', b'{"items": []} x', b"", b'{"items": [{"kind": "Bed"'])
+def test_malformed_json_is_rejected(data):
+    with pytest.raises(ValueError):
+        load_scene(data)
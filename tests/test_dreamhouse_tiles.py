@@ -0,0 +1,38 @@
+import io, random
+
+import pytest
+from PIL import Image
+
+from components.dreamhouse import (CANVAS_H, CANVAS_W, CATALOG, DEFAULT_COLORS, item_key, item_sprites, prepare_layers,
+                                   render_scene, scene_region)
+from components.dreamhouse_tiles import DEFAULT_SETTINGS, render_tiled
+from components.media_utils import upscaled
+
+rng = random.Random(3)
+ITEMS = [dict(kind=k, x=rng.randrange(CANVAS_W), y=rng.randrange(CANVAS_H), w=rng.randrange(40, 300), h=rng.randrange(40, 240),
+              rot=rng.choice([0.0, 12.0, -30.0]), c1=DEFAULT_COLORS[k][0], c2=DEFAULT_COLORS[k][1], extra="")
+         for k in rng.choices(list(CATALOG), k=50)]
+
+
+@pytest.mark.parametrize("tile, workers", [(512, 1), (97, 4), (5000, 2)])
+def test_tiles_equal_the_editor_render(tile, workers):
+    assert render_tiled(DEFAULT_SETTINGS, ITEMS, tile=tile, workers=workers).tobytes() == render_scene(DEFAULT_SETTINGS, ITEMS).tobytes()
+
+def test_scaled_tiles_equal_the_upscaled_render():
+    expected = upscaled(render_scene(DEFAULT_SETTINGS, ITEMS), 2)
+    assert render_tiled(DEFAULT_SETTINGS, ITEMS, scale=2, tile=300, workers=3).tobytes() == expected.tobytes()
+
+def test_large_canvas_tiles_equal_one_pass_and_stream():
+    size = (2100, 1300)
+    items = ITEMS + [dict(it, x=it["x"] + 700, y=it["y"] + 400) for it in ITEMS]
+    layers = prepare_layers(item_key(it) for it in items)
+    sprites = [s for it in items for s in item_sprites(it, layers[item_key(it)])]
+    one_pass = scene_region(DEFAULT_SETTINGS, sprites, size, (0, 0, *size))
+    assert render_tiled(DEFAULT_SETTINGS, items, size=size, tile=256, workers=4).tobytes() == one_pass.tobytes()
+    out = io.BytesIO()
+    assert render_tiled(DEFAULT_SETTINGS, items, out, size=size, tile=700) is None
+    assert Image.open(io.BytesIO(out.getvalue())).convert("RGBA").tobytes() == one_pass.tobytes()
+
+def test_bad_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        render_tiled(DEFAULT_SETTINGS, ITEMS, size=(0, 900))
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from components.photo_booth import cube_table
+
+IDENTITY = "".join(f"{r} {g} {b}\n" for b in (0, 1) for g in (0, 1) for r in (0, 1))
+
+
+def write_cube(tmp_path, text, encoding="utf-8"):
+    path = tmp_path / "look.cube"
+    path.write_text(text, encoding=encoding)
+    return str(path)
+
+def test_cube_with_bom_and_default_input_range(tmp_path):
+    path = write_cube(tmp_path, 'TITLE "id"\nLUT_3D_SIZE 2\nLUT_3D_INPUT_RANGE 0 1\nDOMAIN_MIN 0 0 0\n' + IDENTITY, "utf-8-sig")
+    table = cube_table(path)
+    assert table.shape == (2, 2, 2, 3)
+    assert np.array_equal(table[1, 0, 1], [1, 0, 1])
+
+@pytest.mark.parametrize("line", ["LUT_3D_INPUT_RANGE 0 4095", "LUT_3D_INPUT_RANGE 0", "DOMAIN_MAX 1 1 2", "DOMAIN_MIN 0 x 0"])
+def test_cube_rejects_other_input_domains(tmp_path, line):
+    with pytest.raises(ValueError, match="input domain"):
+        cube_table(write_cube(tmp_path, f"LUT_3D_SIZE 2\n{line}\n" + IDENTITY))
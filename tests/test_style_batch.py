@@ -0,0 +1,39 @@
+import json, re
+
+import pytest
+
+from components.style_batch import resolve_spec, run_batch
+from components.style_studio import DEFAULT_BG, DEFAULT_DOLL, DEFAULT_OPTS, DEFAULT_PALETTE
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"head_scale": "big"}, "head_scale must be a number in 0.8..1.2"),
+    ({"opts": {"neckline": "Bogus"}}, "opts.neckline must be one of"),
+    ({"skin": "peach"}, "skin must be a #rrggbb colour"),
+    ({"opts": {"flare": 2.5}}, "opts.flare must be a number in 0..20 (whole)"),
+    ({"blush": "yes"}, "blush must be true or false"),
+    ({"opts": []}, "opts must be a JSON object"),
+])
+def test_resolve_spec_rejects_bad_fields(spec, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        resolve_spec(spec, 0)
+
+def test_resolve_spec_fills_defaults():
+    look = resolve_spec({"id": "a b", "head_scale": 1, "opts": {"glitter": 60.0}}, 3)
+    assert look["id"] == "a_b"
+    assert look["doll"]["hair_style"] == "Waves" and look["opts"]["neckline"] == "Sweetheart"
+    assert look["opts"]["glitter"] == 60 and isinstance(look["opts"]["glitter"], int)
+
+def test_bad_lines_are_recorded_and_the_batch_goes_on(tmp_path):
+    lines = [json.dumps({"id": "typo", "head_scale": "big"}),
+             json.dumps({"id": "choice", "opts": {"neckline": "Bogus"}}),
+             json.dumps({"id": "good", "quality": "draft"})]
+    manifest = run_batch(lines, tmp_path, workers=1)
+    assert [m.get("error", "").split(" must")[0] for m in manifest] == ["head_scale", "opts.neckline", ""]
+    assert manifest[2]["file"] == "good.png" and (tmp_path / "good.png").is_file()
+    assert json.loads((tmp_path / "manifest.json").read_text()) == manifest
+
+def test_defaults_are_the_studio_sidebar_defaults():
+    look = resolve_spec({}, 0)
+    assert (look["palette"], look["doll"], look["opts"]) == (DEFAULT_PALETTE, DEFAULT_DOLL, DEFAULT_OPTS)
+    assert look["bg"] == DEFAULT_BG
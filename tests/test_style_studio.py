@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from components.style_studio import (DEFAULT_BG, DEFAULT_OPTS, DEFAULT_PALETTE, _body_shape_hi, body_tone, draw_body, draw_dress,
+                                     dress_geometry, fabric, pattern_coverage, quality_ss, soft_bg)
+
+
+@pytest.mark.parametrize("size, scale", [((300, 200), 14), ((97, 53), 22), ((14, 14), 40)])
+def test_check_covers_what_the_drawn_squares_covered(size, scale):
+    w, h = size
+    step = max(14, scale)
+    drawn = Image.new("L", size, 0)
+    d = ImageDraw.Draw(drawn)
+    for y in range(0, h, step):
+        for x in range(0, w, step):
+            if ((x//step) + (y//step)) % 2 == 0:
+                d.rectangle((x, y, x+step, y+step), fill=255)
+    assert np.array_equal(pattern_coverage(size, "Check", 0, scale), np.asarray(drawn) / 255)
+
+@pytest.mark.parametrize("pattern", ["Stripes", "Polka", "Check", "Gradient"])
+def test_each_dress_piece_starts_its_own_pattern(pattern):
+    opts = dict(DEFAULT_OPTS, pattern=pattern, glitter=0, gloss=False, belt=False)
+    layer = np.asarray(draw_dress(0.95, DEFAULT_PALETTE, opts))
+    geo = dress_geometry(0.95, opts["neckline"], opts["sleeve"], opts["skirt_cut"], opts["flare"])
+    mask, (x, y) = geo["skirt"]   # drawn last; only the hem arc goes over it
+    cloth = np.asarray(fabric(mask.size, pattern, DEFAULT_PALETTE["primary"], DEFAULT_PALETTE["secondary"],
+                              opts["angle"], opts["scale"], 0))
+    solid = np.asarray(mask) == 255
+    solid[-40:] = False
+    assert solid.any()
+    assert np.array_equal(layer[y:y+mask.height, x:x+mask.width][solid], cloth[solid])
+
+def full_resolution_body(skin_hex, head_scale, quality):
+    """The body as it used to be drawn for every skin change: filled supersampled, then reduced."""
+    mask_hi, clav_hi, box = _body_shape_hi(head_scale, quality_ss(quality))
+    rgb = tuple(int(skin_hex[i:i+2], 16) for i in (1, 3, 5))
+    body_hi = Image.composite(Image.new("RGBA", mask_hi.size, rgb + (255,)), Image.new("RGBA", mask_hi.size, (0, 0, 0, 0)), mask_hi)
+    body_hi.paste((0, 0, 0, 22), mask=clav_hi)
+    layer = Image.new("RGBA", soft_bg().size, (0, 0, 0, 0))
+    layer.paste(body_hi.resize((box[2]-box[0], box[3]-box[1]), Image.LANCZOS), box[:2])
+    return layer
+
+@pytest.mark.parametrize("quality", ["draft", "final"])
+def test_skin_recolor_matches_the_full_resolution_body(quality):
+    body_tone.cache_clear()
+    bg = soft_bg(DEFAULT_BG)
+    for skin in ("#f0d5c4", "#8d5524", "#3d2314", "#ffffff", "#000000", "#ff0000"):
+        got, want = draw_body(skin, 1.05, quality), full_resolution_body(skin, 1.05, quality)
+        assert np.array_equal(np.asarray(got)[..., 3], np.asarray(want)[..., 3])
+        diff = np.abs(np.asarray(Image.alpha_composite(bg, got), int) - np.asarray(Image.alpha_composite(bg, want), int))
+        assert diff.max() <= 10 and diff.mean() < 0.01, skin   # rounding on a few faint edge pixels
+    assert body_tone.cache_info().misses == 1   # the shape is reduced once for all the skins